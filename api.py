@@ -3,11 +3,12 @@
 import os, sys
 import uvicorn
 import configparser
+from contextlib import asynccontextmanager
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from celery import Celery
 from dotenv import load_dotenv
 
 # Import route modules
@@ -21,6 +22,9 @@ from sources.interaction import Interaction
 from sources.browser import Browser, create_driver
 from sources.utility import pretty_print
 from sources.logger import Logger
+from sources.celery_app import celery_app
+from sources.knowledge.knowledge import start_knowledge_embedding_listener
+from sources.user.passport import start_certificate_prefetch
 
 load_dotenv()
 
@@ -98,12 +102,22 @@ def initialize_system():
     logger.info("Interaction initialized")
     return interaction, config
 
-# Initialize FastAPI app
-api = FastAPI(title="AgenticSeek API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 知识库和工具路由是同步处理函数，FastAPI 在 AnyIO 线程池中执行它们，
+    # 线程池大小决定了同时进行的阻塞 MySQL/Redis/OpenAI 调用数量
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("API_THREADPOOL_SIZE", 40))
+    # 后台任务写入知识 embedding 后通过 Redis 通知本进程更新常驻索引
+    embedding_listener = start_knowledge_embedding_listener()
+    # 在证书缓存过期前后台刷新，验证 token 的请求不必同步下载证书
+    certificate_prefetch = start_certificate_prefetch()
+    yield
+    embedding_listener.set()
+    if certificate_prefetch is not None:
+        certificate_prefetch.set()
 
-# Initialize Celery
-celery_app = Celery("tasks", broker="redis://localhost:6379/0", backend="redis://localhost:6379/0")
-celery_app.conf.update(task_track_started=True)
+# Initialize FastAPI app
+api = FastAPI(title="AgenticSeek API", version="0.1.0", lifespan=lifespan)
 
 # Initialize logger
 logger = Logger("backend.log")
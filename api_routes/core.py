@@ -1,21 +1,29 @@
 #!/usr/bin/env python3
 
 from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 import os
 import uuid
 import json
+import time
 import asyncio
 
 from sources.schemas import QueryResponse
 from sources.logger import Logger
 from api_routes.models import QueryRequest, QuestionRequest
 from sources.knowledge.knowledge import get_knowledge_tool
-from sources.user.passport import verify_firebase_token, check_and_increase_usage
+from sources.user.passport import verify_firebase_token, admit_query
 from sources.callback.sse_callback import SSECallbackHandler
+from sources.callback.stream_metrics import stream_metrics
 
 router = APIRouter()
 
+# /query_stream 发送队列的容量（事件数），队列满时 token 回调等待消费端
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 256))
+# 检测客户端断开的间隔秒数
+SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", 1))
+
 def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, config_ref, is_generating_flag, think_wrapper_func, create_agent_func):
     """注册核心路由并传递所需的依赖"""
 
@@ -52,11 +60,11 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
         app_logger.info("Processing start begin")
 
         auth_header = http_request.headers.get("Authorization")
-        user = verify_firebase_token(auth_header)
+        # token 验证和当日额度检查合并为一次 Redis 往返
+        user, allowed = await admit_query(auth_header)
 
         user_id = user['uid']
 
-        allowed = check_and_increase_usage(user_id)
         if not allowed:
             return JSONResponse(status_code=429, content="Daily API usage limit exceeded (100/day)")
 
@@ -145,7 +153,7 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
     async def find_knowledge_tool(request: QuestionRequest, http_request: Request):
         """根据用户问题查找最相关的知识及其对应的工具"""
         auth_header = http_request.headers.get("Authorization")
-        user = verify_firebase_token(auth_header)
+        user = await run_in_threadpool(verify_firebase_token, auth_header)
 
         user_id = user['uid']
 
@@ -164,7 +172,9 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
                 )
 
             # 调用knowledge.py中的方法获取知识项和工具信息
-            knowledge_item, tool_info = get_knowledge_tool(
+            # embedding 请求和索引检索都是阻塞调用，放到线程池中执行
+            knowledge_item, tool_info = await run_in_threadpool(
+                get_knowledge_tool,
                 user_id,
                 request.question,
                 request.top_k,
@@ -229,11 +239,11 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
         app_logger.info(f"Processing query_stream: {request.query}")
 
         auth_header = http_request.headers.get("Authorization")
-        user = verify_firebase_token(auth_header)
+        # token 验证和当日额度检查合并为一次 Redis 往返
+        user, allowed = await admit_query(auth_header)
 
         user_id = user['uid']
 
-        allowed = check_and_increase_usage(user_id)
         if not allowed:
             return JSONResponse(status_code=429, content="Daily API usage limit exceeded (100/day)")
 
@@ -253,22 +263,53 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
 
         async def generate():
             general_agent = await create_agent_func()
-            queue = asyncio.Queue()
+            queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
             handler = SSECallbackHandler(queue)
             openai_agent = await general_agent.create_agent(user_id, request.query, request.query_id, handler)
+            stream_metrics.stream_started()
+            started = time.monotonic()
+            disconnected = False
 
             async def run_agent():
                 try:
                     await general_agent.invoke_agent(openai_agent, handler)
-                    await queue.put({'type': 'end', 'content': '[DONE]'})
+                    # 经过 handler 放入结束事件，先发送合并缓冲区中剩余的 token
+                    await handler.put_event({'type': 'end', 'content': '[DONE]'})
+                    stream_metrics.record("completed")
                 except Exception as e:
                     app_logger.error(f"invoke agent fail. An error occurred: {str(e)}")
-                    await queue.put({'type': 'error', 'message': str(e)})
+                    stream_metrics.record("failed")
+                    await handler.put_event({'type': 'error', 'message': str(e)})
                     await queue.put({'type': 'end'})
                 finally:
-                    handler.queue.put_nowait({'type': 'done'})
+                    # 被取消时消费端仍在等待队列，放入结束事件让 generate 退出
+                    try:
+                        queue.put_nowait({'type': 'end'})
+                    except asyncio.QueueFull:
+                        pass
+
+            def cancel_agent():
+                # 取消任务会中断进行中的模型流式请求，工具等待运行在线程池中，通过事件通知其结束
+                general_agent.cancel()
+                if not task.done():
+                    stream_metrics.agent_cancelled(time.monotonic() - started)
+                    task.cancel()
+
+            async def watch_disconnect():
+                # 等待工具响应等没有输出的阶段写出不会失败，需要主动检测客户端断开
+                nonlocal disconnected
+                while not task.done():
+                    if await http_request.is_disconnected():
+                        app_logger.info(f"Client disconnected, cancelling query {request.query_id}")
+                        disconnected = True
+                        stream_metrics.record("disconnected")
+                        cancel_agent()
+                        return
+                    await asyncio.sleep(SSE_DISCONNECT_POLL_SECONDS)
 
             task = asyncio.create_task(run_agent())
+            watcher = asyncio.create_task(watch_disconnect())
+            finished = False
 
             try:
                 while True:
@@ -279,10 +320,20 @@ def register_core_routes(app_logger, interaction_ref, query_resp_history_ref, co
                         yield f"data:{token_json}\n\n"
 
                     if event['type'] == 'end':
+                        finished = True
                         break
             finally:
-                if not task.done():
+                watcher.cancel()
+                if not finished:
+                    # 写出失败或服务器在客户端断开后关闭了响应
+                    if not disconnected:
+                        stream_metrics.record("disconnected")
+                    cancel_agent()
+                elif not task.done():
+                    # 已收到结束事件但任务还没退出（例如出错后仍在收尾），同样取消，不计入断开统计
                     task.cancel()
+                stream_metrics.record("backpressure_waits", handler.backpressure_waits)
+                stream_metrics.stream_finished()
 
         return StreamingResponse(
             generate(),
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
+import os
+import re
+import uuid
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Optional
 
 from .models import (
     KnowledgeCreateRequest, KnowledgeCreateResponse,
@@ -11,15 +15,29 @@ from .models import (
     KnowledgeQueryResponse, KnowledgeItem,
     KnowledgeCopyRequest, KnowledgeCopyResponse
 )
-from sources.knowledge.knowledge import get_embedding, get_db_connection, get_redis_connection, create_tool_and_knowledge_records, get_tool_by_id
+from sources.knowledge.knowledge import get_embedding, get_db_connection, get_redis_connection, create_tool_and_knowledge_records, get_tools_by_ids, \
+    row_to_knowledge_item, vector_index_manager, knowledge_embedding_key, \
+    public_knowledge_index, sync_public_knowledge, PUBLIC_KNOWLEDGE, count_cache, knowledge_count_scope, share_count_scope, \
+    invalidate_knowledge_counts, knowledge_text_search, schedule_knowledge_embedding, import_knowledge_batch, \
+    create_db_connection, load_knowledge_embeddings
+from sources.knowledge.embedding_pipeline import EMBEDDING_PENDING
+from sources.knowledge.bulk_import import IMPORT_FORMATS, ImportParser, validate_import_record
+from sources.knowledge.knowledge_export import EXPORT_EMBEDDING_MODES, iter_knowledge_export
+from sources.pagination import InvalidCursorError, decode_cursor, keyset_condition, keyset_params, next_page_cursor
+from sources.text_search import SEARCH_MODES, DEFAULT_SEARCH_MODE
 from sources.logger import Logger
-from sources.user.passport import verify_firebase_token, get_user_by_id
+from sources.user.passport import verify_firebase_token, get_user_emails
 
 logger = Logger("backend.log")
 router = APIRouter()
 
+# 批量导入：每个事务写入的行数、响应中最多返回的错误行数、Redis 中进度的保留时间
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 1000))
+IMPORT_PROGRESS_TTL = 86400
+
 @router.post("/create_knowledge", response_model=KnowledgeCreateResponse)
-async def create_knowledge_record(request: KnowledgeCreateRequest, http_request: Request):
+def create_knowledge_record(request: KnowledgeCreateRequest, http_request: Request):
     """
     创建知识记录接口
     """
@@ -85,8 +103,9 @@ async def create_knowledge_record(request: KnowledgeCreateRequest, http_request:
             # 插入数据
             sql = """
                   INSERT INTO knowledge
-                  (user_id, question, description, answer, public, model_name, tool_id, params, status, embedding_id)
-                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                  (user_id, question, description, answer, public, model_name, tool_id, params, status, embedding_id,
+                   embedding_status)
+                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                   """
             cursor.execute(sql, (
                 user_id,
@@ -98,26 +117,18 @@ async def create_knowledge_record(request: KnowledgeCreateRequest, http_request:
                 request.toolId,
                 request.params,
                 1,
-                0
+                0,
+                EMBEDDING_PENDING
             ))
             connection.commit()
+            invalidate_knowledge_counts(user_id, request.public == PUBLIC_KNOWLEDGE)
 
             # 获取插入的记录ID
             record_id = cursor.lastrowid
             logger.info(f"Knowledge record created successfully with ID: {record_id}")
 
-            query_embedding = get_embedding(request.question + request.answer)
-
-            # 将 embedding 写入 Redis
-            try:
-                redis_conn = get_redis_connection()
-                # 使用记录ID作为键，将embedding存储到Redis中
-                redis_key = f"knowledge_embedding_{record_id}"
-                redis_conn.set(redis_key, str(query_embedding))
-                logger.info(f"Embedding stored in Redis with key: {redis_key}")
-            except Exception as redis_error:
-                logger.error(f"Failed to store embedding in Redis: {str(redis_error)}")
-                # 注意：即使Redis存储失败，我们也不会中断主流程
+            # embedding 由后台任务计算并写入 Redis，完成后通知各进程把知识加入常驻索引
+            schedule_knowledge_embedding(record_id, request.question, request.answer)
 
             return JSONResponse(
                 status_code=200,
@@ -144,8 +155,214 @@ async def create_knowledge_record(request: KnowledgeCreateRequest, http_request:
             connection.close()
 
 
+def import_progress_key(user_id: str, import_id: str) -> str:
+    return f"knowledge_import:{user_id}:{import_id}"
+
+
+def record_import_progress(user_id: str, import_id: str, progress: Dict) -> None:
+    """把导入进度写入 Redis，写入失败不影响导入"""
+    try:
+        key = import_progress_key(user_id, import_id)
+        pipe = get_redis_connection().pipeline(transaction=False)
+        pipe.hset(key, mapping=progress)
+        pipe.expire(key, IMPORT_PROGRESS_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record progress of knowledge import {import_id}: {str(e)}")
+
+
+@router.post("/import_knowledge")
+async def import_knowledge(http_request: Request, format: str = "ndjson", importId: Optional[str] = None):
+    """
+    批量导入知识接口
+
+    请求体为 NDJSON（每行一个 JSON 对象）或 CSV（首行为表头），字段与 create_knowledge 相同：
+    question、description、answer、public、modelName、toolId、params。
+    请求体边接收边解析，每 IMPORT_BATCH_SIZE 行批量计算 embedding 并在一个事务中写入；
+    进度写入 Redis，导入过程中可以用 importId 通过 /knowledge_import_status 查询。
+    """
+    auth_header = http_request.headers.get("Authorization")
+    user = await run_in_threadpool(verify_firebase_token, auth_header)
+
+    user_id = user['uid']
+
+    errors = []
+    if format not in IMPORT_FORMATS:
+        errors.append(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    if importId is not None and not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", importId):
+        errors.append("importId must be 1-64 letters, digits, '-' or '_'")
+    if errors:
+        logger.error(f"Validation errors: {errors}")
+        return JSONResponse(
+            status_code=400,
+            content={
+                "success": False,
+                "message": "Validation failed",
+                "errors": errors
+            }
+        )
+
+    import_id = importId or uuid.uuid4().hex
+    logger.info(f"Importing knowledge for user {user_id}, import ID: {import_id}")
+
+    parser = ImportParser(format)
+    # 工具归属的校验结果跨批次复用
+    owned_tools: Dict[int, bool] = {}
+    progress = {"status": "running", "rows": 0, "imported": 0, "failed": 0}
+    row_errors = []
+    batch = []
+
+    def record_errors(new_errors: List[Dict]) -> None:
+        progress["failed"] += len(new_errors)
+        row_errors.extend(new_errors[:max(IMPORT_MAX_ERRORS - len(row_errors), 0)])
+
+    def collect(rows) -> None:
+        for row, record, error in rows:
+            progress["rows"] += 1
+            if error:
+                record_errors([{"row": row, "errors": [error]}])
+                continue
+            data, validation_errors = validate_import_record(record)
+            if validation_errors:
+                record_errors([{"row": row, "errors": validation_errors}])
+            else:
+                batch.append((row, data))
+
+    async def flush() -> None:
+        records = batch[:IMPORT_BATCH_SIZE]
+        del batch[:IMPORT_BATCH_SIZE]
+        result = await run_in_threadpool(import_knowledge_batch, user_id, records, owned_tools)
+        progress["imported"] += len(result["imported"])
+        record_errors(result["errors"])
+        await run_in_threadpool(record_import_progress, user_id, import_id, progress)
+
+    try:
+        async for chunk in http_request.stream():
+            collect(parser.feed(chunk))
+            while len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        collect(parser.close())
+        while batch:
+            await flush()
+    except Exception as e:
+        logger.error(f"Error importing knowledge {import_id}: {str(e)}")
+        progress["status"] = "failed"
+        await run_in_threadpool(record_import_progress, user_id, import_id, progress)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "message": f"Internal server error: {str(e)}",
+                "importId": import_id,
+                **{field: progress[field] for field in ("rows", "imported", "failed")},
+                "errors": row_errors
+            }
+        )
+
+    progress["status"] = "done"
+    await run_in_threadpool(record_import_progress, user_id, import_id, progress)
+    logger.info(f"Knowledge import {import_id} finished: {progress}")
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": "Knowledge import finished",
+            "importId": import_id,
+            **{field: progress[field] for field in ("rows", "imported", "failed")},
+            "errors": row_errors
+        }
+    )
+
+
+@router.get("/knowledge_import_status")
+def knowledge_import_status(importId: str, http_request: Request):
+    """
+    查询批量导入进度接口
+    """
+    auth_header = http_request.headers.get("Authorization")
+    user = verify_firebase_token(auth_header)
+
+    user_id = user['uid']
+
+    try:
+        progress = get_redis_connection().hgetall(import_progress_key(user_id, importId))
+    except Exception as e:
+        logger.error(f"Error querying knowledge import progress: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "message": f"Internal server error: {str(e)}"
+            }
+        )
+
+    if not progress:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "success": False,
+                "message": "Import not found"
+            }
+        )
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": "Import progress retrieved successfully",
+            "importId": importId,
+            "status": progress["status"],
+            **{field: int(progress[field]) for field in ("rows", "imported", "failed")}
+        }
+    )
+
+
+@router.get("/export_knowledge")
+def export_knowledge(http_request: Request, scope: str = "user", embeddings: str = "none"):
+    """
+    流式导出知识接口（NDJSON）
+
+    scope 为 user 时导出当前用户的知识，为 public 时导出全部公开知识；
+    embeddings 为 base64 或 float 时每行附带 embedding。
+    """
+    auth_header = http_request.headers.get("Authorization")
+    user = verify_firebase_token(auth_header)
+
+    user_id = user['uid']
+
+    errors = []
+    if scope not in ("user", "public"):
+        errors.append("scope must be user or public")
+    if embeddings not in EXPORT_EMBEDDING_MODES:
+        errors.append(f"embeddings must be one of {', '.join(EXPORT_EMBEDDING_MODES)}")
+    if errors:
+        logger.error(f"Validation errors: {errors}")
+        return JSONResponse(
+            status_code=400,
+            content={
+                "success": False,
+                "message": "Validation failed",
+                "errors": errors
+            }
+        )
+
+    logger.info(f"Exporting {scope} knowledge for user {user_id} (embeddings={embeddings})")
+    redis_conn = get_redis_connection(decode_responses=False)
+    return StreamingResponse(
+        iter_knowledge_export(
+            create_db_connection,
+            lambda knowledge_ids: load_knowledge_embeddings(redis_conn, knowledge_ids),
+            user_id=user_id if scope == "user" else None,
+            public=PUBLIC_KNOWLEDGE if scope == "public" else None,
+            embeddings=embeddings
+        ),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="knowledge-{scope}.ndjson"'}
+    )
+
+
 @router.post("/delete_knowledge", response_model=KnowledgeDeleteResponse)
-async def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request: Request):
+def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request: Request):
     """
     删除知识记录接口
     """
@@ -179,7 +396,7 @@ async def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request:
         connection = get_db_connection()
         with connection.cursor() as cursor:
             # 首先检查记录是否存在以及用户ID是否匹配
-            check_sql = "SELECT user_id FROM knowledge WHERE id = %s"
+            check_sql = "SELECT user_id, public FROM knowledge WHERE id = %s"
             cursor.execute(check_sql, (request.knowledgeId,))
             result = cursor.fetchone()
 
@@ -209,11 +426,12 @@ async def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request:
             delete_sql = "UPDATE knowledge SET status = %s WHERE id = %s"
             cursor.execute(delete_sql, (2, request.knowledgeId))
             connection.commit()
+            invalidate_knowledge_counts(user_id, result["public"] == PUBLIC_KNOWLEDGE)
 
             # 删除Redis中的embedding
             try:
                 redis_conn = get_redis_connection()
-                redis_key = f"knowledge_embedding_{request.knowledgeId}"
+                redis_key = knowledge_embedding_key(request.knowledgeId)
                 redis_result = redis_conn.delete(redis_key)
                 if redis_result:
                     logger.info(f"Embedding deleted from Redis with key: {redis_key}")
@@ -223,6 +441,9 @@ async def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request:
                 logger.error(f"Failed to delete embedding from Redis: {str(redis_error)}")
                 # 即使Redis删除失败，我们也不会中断主流程
 
+            vector_index_manager.remove(user_id, request.knowledgeId)
+            public_knowledge_index.remove(request.knowledgeId)
+
             logger.info(f"Knowledge record {request.knowledgeId} deleted successfully")
             return JSONResponse(
                 status_code=200,
@@ -248,7 +469,7 @@ async def delete_knowledge_record(request: KnowledgeDeleteRequest, http_request:
             connection.close()
 
 @router.post("/update_knowledge", response_model=KnowledgeUpdateResponse)
-async def update_knowledge_record(request: KnowledgeUpdateRequest, http_request: Request):
+def update_knowledge_record(request: KnowledgeUpdateRequest, http_request: Request):
     """
     修改知识记录接口
     """
@@ -300,7 +521,7 @@ async def update_knowledge_record(request: KnowledgeUpdateRequest, http_request:
         connection = get_db_connection()
         with connection.cursor() as cursor:
             # 首先检查记录是否存在以及用户ID是否匹配
-            check_sql = "SELECT user_id, question, answer FROM knowledge WHERE id = %s AND status = %s"
+            check_sql = "SELECT user_id, question, answer, public FROM knowledge WHERE id = %s AND status = %s"
             cursor.execute(check_sql, (request.knowledgeId, 1))
             result = cursor.fetchone()
 
@@ -369,14 +590,6 @@ async def update_knowledge_record(request: KnowledgeUpdateRequest, http_request:
                     }
                 )
 
-            # 添加记录ID到参数列表
-            update_params.append(request.knowledgeId)
-
-            # 更新数据库记录
-            update_sql = f"UPDATE knowledge SET {', '.join(update_fields)} WHERE id = %s"
-            cursor.execute(update_sql, update_params)
-            connection.commit()
-
             # 检查是否需要重新计算embedding (question或answer有变更)
             need_recalculate_embedding = False
             original_question = result["question"]
@@ -385,24 +598,44 @@ async def update_knowledge_record(request: KnowledgeUpdateRequest, http_request:
             if ((request.question is not None and request.question != original_question) or
                     (request.answer is not None and request.answer != original_answer)):
                 need_recalculate_embedding = True
+                update_fields.append("embedding_status = %s")
+                update_params.append(EMBEDDING_PENDING)
+
+            # 添加记录ID到参数列表
+            update_params.append(request.knowledgeId)
+
+            # 更新数据库记录
+            update_sql = f"UPDATE knowledge SET {', '.join(update_fields)} WHERE id = %s"
+            cursor.execute(update_sql, update_params)
+            connection.commit()
+            # 内容变化会影响搜索词的匹配数，公开状态变化会影响公开知识的总数
+            invalidate_knowledge_counts(user_id, PUBLIC_KNOWLEDGE in (result["public"], request.public))
 
             if need_recalculate_embedding:
-                # 获取更新后的question和answer
-                new_question = request.question if request.question is not None else original_question
-                new_answer = request.answer if request.answer is not None else original_answer
-
-                # 重新计算embedding
-                query_embedding = get_embedding(new_question + new_answer)
-
-                # 更新Redis中的embedding
-                try:
-                    redis_conn = get_redis_connection()
-                    redis_key = f"knowledge_embedding_{request.knowledgeId}"
-                    redis_conn.set(redis_key, str(query_embedding))
-                    logger.info(f"Embedding updated in Redis with key: {redis_key}")
-                except Exception as redis_error:
-                    logger.error(f"Failed to update embedding in Redis: {str(redis_error)}")
-                    # 即使Redis更新失败，我们也不会中断主流程
+                # 新的 embedding 由后台任务计算，写入前检索仍使用旧向量
+                schedule_knowledge_embedding(
+                    request.knowledgeId,
+                    request.question if request.question is not None else original_question,
+                    request.answer if request.answer is not None else original_answer
+                )
+
+            # 同步更新常驻向量索引和关键词倒排索引的元数据，向量在 embedding 写入后由通知更新
+            if vector_index_manager.is_loaded(user_id) or public_knowledge_index.is_loaded():
+                cursor.execute(
+                    """
+                    SELECT id, user_id, question, description, answer, public, model_name, tool_id, params, create_time, update_time
+                    FROM knowledge
+                    WHERE id = %s
+                    """,
+                    (request.knowledgeId,)
+                )
+                updated_row = cursor.fetchone()
+                if updated_row:
+                    vector_index_manager.upsert(user_id, row_to_knowledge_item(updated_row))
+                    sync_public_knowledge(request.knowledgeId, updated_row['public'], 1)
+            else:
+                # 用户不在内存中：丢弃磁盘段，避免换入时带回修改前的元数据和向量
+                vector_index_manager.invalidate(user_id)
 
             logger.info(f"Knowledge record {request.knowledgeId} updated successfully")
             return JSONResponse(
@@ -429,9 +662,14 @@ async def update_knowledge_record(request: KnowledgeUpdateRequest, http_request:
             connection.close()
 
 @router.get("/query_knowledge", response_model=KnowledgeQueryResponse)
-async def query_knowledge_records(http_request: Request, query: str, limit: int = 10, offset: int = 0):
+def query_knowledge_records(http_request: Request, query: str, limit: int = 10, offset: int = 0, next_cursor: Optional[str] = None,
+                            search_mode: Optional[str] = None):
     """
     查询知识记录接口
+
+    按 (update_time, id) 倒序分页：传入上一页返回的 next_cursor 获取下一页（游标分页），
+    offset 分页保留用于兼容，两者不能同时使用。
+    search_mode=fulltext（默认）使用全文索引并按相关度排序，此时不返回 next_cursor，使用 offset 分页；search_mode=like 使用 LIKE 模糊匹配
     """
     # logger.info(f"Querying knowledge records for user: {userId} with query: {query}")
 
@@ -450,6 +688,19 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    search_mode = search_mode or DEFAULT_SEARCH_MODE
+    if search_mode not in SEARCH_MODES:
+        errors.append("search_mode must be fulltext or like")
+
+    after = None
+    if next_cursor:
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -472,26 +723,25 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
             # 构建查询条件
             # 1. 用户ID匹配
             # 2. 公开的知识 或者 用户自己的知识
-            # 3. question、description、answer字段模糊匹配
-            if query:
-                search_pattern = f"%{query}%"
-                where_condition = "AND (question LIKE %s OR description LIKE %s OR answer LIKE %s)"
-                params = [1, user_id, search_pattern, search_pattern, search_pattern]
-            else:
-                where_condition = ""
-                params = [1, user_id]
-
-            count_sql = f"""
-                        SELECT COUNT(*) as total
-                        FROM knowledge
-                        WHERE status = %s
-                          AND  user_id = %s
-                          {where_condition}
-                        """
+            # 3. question、description、answer字段全文检索（或 LIKE 模糊匹配）
+            mode = knowledge_text_search.resolve_mode(cursor, query, search_mode) if query else None
+            where_condition, search_params = knowledge_text_search.condition(query, mode) if query else ("", [])
+            params = [1, user_id] + search_params
+
+            def count_records():
+                count_sql = f"""
+                            SELECT COUNT(*) as total
+                            FROM knowledge
+                            WHERE status = %s
+                              AND  user_id = %s
+                              {where_condition}
+                            """
+                cursor.execute(count_sql, params)
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
 
-            cursor.execute(count_sql, params)
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            # 总数走缓存，知识写入时失效
+            total = count_cache.get_or_compute(knowledge_count_scope(user_id), [mode, query], count_records)
 
             if total == 0:
                 # logger.info(f"No knowledge records found for user: {userId} with query: {query}")
@@ -505,38 +755,28 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
                     }
                 )
 
-            # 查询数据
-            if query:
-                query_sql = f"""
-                            SELECT id,
-                                   user_id,
-                                   question,
-                                   description,
-                                   answer, public, model_name, tool_id, params, create_time, update_time
-                            FROM knowledge
-                            WHERE status = %s
-                               AND user_id = %s
-                              {where_condition}
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, user_id, search_pattern, search_pattern, search_pattern, limit, offset]
-            else:
-                query_sql = """
-                            SELECT id,
-                                   user_id,
-                                   question,
-                                   description,
-                                   answer, public, model_name, tool_id, params, create_time, update_time
-                            FROM knowledge
-                            WHERE status = %s
-                               AND user_id = %s
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, user_id, limit, offset]
+            # 查询数据，游标分页时从上一页最后一行之后继续
+            keyset = keyset_condition("update_time") if after else ""
+            # 全文检索按相关度排序（仅 offset 分页）；其余情况以及游标分页按更新时间排序
+            by_relevance = mode == "fulltext" and not after
+            order_by, order_params = knowledge_text_search.relevance_order(query) if by_relevance \
+                else ("update_time DESC, id DESC", [])
+            query_sql = f"""
+                        SELECT id,
+                               user_id,
+                               question,
+                               description,
+                               answer, public, model_name, tool_id, params, create_time, update_time
+                        FROM knowledge
+                        WHERE status = %s
+                           AND user_id = %s
+                          {where_condition}
+                          {keyset}
+                        ORDER BY {order_by}
+                            LIMIT %s
+                        OFFSET %s
+                        """
+            params = params + (keyset_params(after) if after else []) + order_params + [limit, offset]
 
             cursor.execute(query_sql, params)
             results = cursor.fetchall()
@@ -572,14 +812,8 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
                 if row['tool_id']:
                     tool_ids.add(row['tool_id'])
 
-            # 查询对应的工具记录
-            tool_items = []
-            if tool_ids:
-
-                for tool_id in tool_ids:
-                    tool_item = get_tool_by_id(tool_id)
-                    if tool_item:
-                        tool_items.append(tool_item)
+            # 查询对应的工具记录：在当前连接上一次 IN 查询，不再为每个工具借出连接
+            tool_items = get_tools_by_ids(cursor, tool_ids)
 
             combined_data = {
                 "knowledge": [item.dict() for item in knowledge_items],
@@ -592,7 +826,8 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
                     "success": True,
                     "message": "Knowledge records retrieved successfully",
                     "data": combined_data,
-                    "total": total
+                    "total": total,
+                    "next_cursor": None if by_relevance else next_page_cursor(results, limit, "update_time")
                 }
             )
 
@@ -611,12 +846,111 @@ async def query_knowledge_records(http_request: Request, query: str, limit: int
         if connection:
             connection.close()
 
+def build_public_knowledge_item(row, email: Optional[str] = None, similarity: float = None) -> KnowledgeItem:
+    """把公开知识的数据库行转换为 KnowledgeItem，附带作者邮箱（以及语义检索的相似度）"""
+    knowledge_item = KnowledgeItem(
+        id=row['id'],
+        user_id=str(row['user_id']),
+        question=row['question'],
+        description=row['description'],
+        answer=row['answer'],
+        public=row['public'],
+        model_name=row['model_name'] or "",
+        tool_id=row['tool_id'] or 0,
+        params=row['params'] or ""
+    )
+
+    # 添加用户邮箱到extra_info字段
+    extra_info = {}
+    if email:
+        extra_info["email"] = email
+    if similarity is not None:
+        extra_info["similarity"] = similarity
+    if extra_info:
+        knowledge_item.extra_info = extra_info
+
+    # 处理时间字段
+    if row['create_time']:
+        knowledge_item.create_time = row['create_time'].isoformat() if hasattr(row['create_time'],
+                                                                             'isoformat') else str(
+            row['create_time'])
+    if row['update_time']:
+        knowledge_item.update_time = row['update_time'].isoformat() if hasattr(row['update_time'],
+                                                                             'isoformat') else str(
+            row['update_time'])
+    return knowledge_item
+
+
+def query_public_knowledge_semantic(query: str, limit: int, offset: int) -> JSONResponse:
+    """
+    通过全局 ANN 索引语义检索公开知识
+
+    索引只保存知识ID和向量，命中的记录再按主键回表读取，并过滤掉回表时已删除或不再公开的记录。
+    ANN 检索没有总命中数，total 为本次实际返回的记录数。
+    """
+    query_embedding = get_embedding(query)
+    hits = public_knowledge_index.search(query_embedding, offset + limit)
+    page = hits[offset:offset + limit]
+    if not page:
+        logger.info(f"No public knowledge with semantic query: {query}")
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "No records found",
+                "data": [],
+                "total": 0
+            }
+        )
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(page))
+            cursor.execute(
+                f"""
+                SELECT id,
+                       user_id,
+                       question,
+                       description,
+                       answer, public, model_name, tool_id, params, create_time, update_time
+                FROM knowledge
+                WHERE id IN ({placeholders})
+                  AND status = %s
+                  AND public = %s
+                """,
+                [knowledge_id for knowledge_id, _ in page] + [1, 2]
+            )
+            rows = {row['id']: row for row in cursor.fetchall()}
+            emails = get_user_emails(cursor, [row['user_id'] for row in rows.values()])
+    finally:
+        connection.close()
+
+    knowledge_items = [build_public_knowledge_item(rows[knowledge_id], emails.get(rows[knowledge_id]['user_id']), similarity)
+                       for knowledge_id, similarity in page if knowledge_id in rows]
+
+    logger.info(f"Found {len(knowledge_items)} public knowledge with semantic query: {query}")
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": "Knowledge records retrieved successfully",
+            "data": [item.dict() for item in knowledge_items],
+            "total": len(knowledge_items)
+        }
+    )
+
+
 @router.get("/query_public_knowledge", response_model=KnowledgeQueryResponse)
-async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
+def query_public_knowledge(query: str, limit: int = 10, offset: int = 0, mode: str = "keyword", next_cursor: Optional[str] = None,
+                           search_mode: Optional[str] = None):
     """
     查询公开知识记录接口
+
+    mode=keyword 按 question/description/answer 匹配，search_mode 与 next_cursor 的含义同 query_knowledge_records；
+    mode=semantic 通过全局 ANN 索引做语义检索，按相似度排序，只支持 offset 分页
     """
-    logger.info(f"Querying public knowledge with query: {query}")
+    logger.info(f"Querying public knowledge with query: {query}, mode: {mode}")
 
     # 参数校验
     errors = []
@@ -627,6 +961,27 @@ async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    if mode not in ("keyword", "semantic"):
+        errors.append("mode must be keyword or semantic")
+
+    if mode == "semantic" and not (query and query.strip()):
+        errors.append("query is required in semantic mode")
+
+    search_mode = search_mode or DEFAULT_SEARCH_MODE
+    if search_mode not in SEARCH_MODES:
+        errors.append("search_mode must be fulltext or like")
+
+    after = None
+    if next_cursor:
+        if mode == "semantic":
+            errors.append("next_cursor is not supported in semantic mode")
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -642,32 +997,33 @@ async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
 
     connection = None
     try:
+        if mode == "semantic":
+            return query_public_knowledge_semantic(query, limit, offset)
+
         # 获取数据库连接
         connection = get_db_connection()
         with connection.cursor() as cursor:
             # 构建查询条件
             # 1. 用户ID匹配
             # 2. 公开的知识 或者 用户自己的知识
-            # 3. question、description、answer字段模糊匹配
-            if query:
-                search_pattern = f"%{query}%"
-                where_condition = "AND (question LIKE %s OR description LIKE %s OR answer LIKE %s)"
-                params = [1, 2, search_pattern, search_pattern, search_pattern]
-            else:
-                where_condition = ""
-                params = [1, 2]
-
-            count_sql = f"""
-                        SELECT COUNT(*) as total
-                        FROM knowledge
-                        WHERE status = %s
-                          AND  public = %s
-                          {where_condition}
-                        """
+            # 3. question、description、answer字段全文检索（或 LIKE 模糊匹配）
+            text_mode = knowledge_text_search.resolve_mode(cursor, query, search_mode) if query else None
+            where_condition, search_params = knowledge_text_search.condition(query, text_mode) if query else ("", [])
+            params = [1, 2] + search_params
+
+            def count_records():
+                count_sql = f"""
+                            SELECT COUNT(*) as total
+                            FROM knowledge
+                            WHERE status = %s
+                              AND  public = %s
+                              {where_condition}
+                            """
+                cursor.execute(count_sql, params)
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
 
-            cursor.execute(count_sql, params)
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            total = count_cache.get_or_compute(knowledge_count_scope(), [text_mode, query], count_records)
 
             if total == 0:
                 logger.info(f"No public knowledge with query: {query}")
@@ -681,75 +1037,36 @@ async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
                     }
                 )
 
-            # 查询数据
-            if query:
-                query_sql = f"""
-                            SELECT id,
-                                   user_id,
-                                   question,
-                                   description,
-                                   answer, public, model_name, tool_id, params, create_time, update_time
-                            FROM knowledge
-                            WHERE status = %s
-                               AND public = %s
-                              {where_condition}
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, 2, search_pattern, search_pattern, search_pattern, limit, offset]
-            else:
-                query_sql = """
-                            SELECT id,
-                                   user_id,
-                                   question,
-                                   description,
-                                   answer, public, model_name, tool_id, params, create_time, update_time
-                            FROM knowledge
-                            WHERE status = %s
-                               AND public = %s
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, 2, limit, offset]
+            # 查询数据，游标分页时从上一页最后一行之后继续
+            keyset = keyset_condition("update_time") if after else ""
+            # 全文检索按相关度排序（仅 offset 分页）；其余情况以及游标分页按更新时间排序
+            by_relevance = text_mode == "fulltext" and not after
+            order_by, order_params = knowledge_text_search.relevance_order(query) if by_relevance \
+                else ("update_time DESC, id DESC", [])
+            query_sql = f"""
+                        SELECT id,
+                               user_id,
+                               question,
+                               description,
+                               answer, public, model_name, tool_id, params, create_time, update_time
+                        FROM knowledge
+                        WHERE status = %s
+                           AND public = %s
+                          {where_condition}
+                          {keyset}
+                        ORDER BY {order_by}
+                            LIMIT %s
+                        OFFSET %s
+                        """
+            params = params + (keyset_params(after) if after else []) + order_params + [limit, offset]
 
             cursor.execute(query_sql, params)
             results = cursor.fetchall()
 
             # 转换为KnowledgeItem对象列表
-            knowledge_items = []
-            for row in results:
-                knowledge_item = KnowledgeItem(
-                    id=row['id'],
-                    user_id=str(row['user_id']),
-                    question=row['question'],
-                    description=row['description'],
-                    answer=row['answer'],
-                    public=row['public'],
-                    model_name=row['model_name'] or "",
-                    tool_id=row['tool_id'] or 0,
-                    params=row['params'] or ""
-                )
-
-                # 添加用户邮箱到extra_info字段
-                user_info = get_user_by_id(row['user_id'])
-                if user_info:
-                    knowledge_item.extra_info = {
-                        "email": user_info['email']
-                    }
-
-                # 处理时间字段
-                if row['create_time']:
-                    knowledge_item.create_time = row['create_time'].isoformat() if hasattr(row['create_time'],
-                                                                                         'isoformat') else str(
-                        row['create_time'])
-                if row['update_time']:
-                    knowledge_item.update_time = row['update_time'].isoformat() if hasattr(row['update_time'],
-                                                                                         'isoformat') else str(
-                        row['update_time'])
-
-                knowledge_items.append(knowledge_item)
+            # 作者邮箱在当前连接上一次查询，不再为每行借出连接
+            emails = get_user_emails(cursor, [row['user_id'] for row in results])
+            knowledge_items = [build_public_knowledge_item(row, emails.get(row['user_id'])) for row in results]
 
             logger.info(f"Found {len(knowledge_items)} public knowledge with query: {query}")
             return JSONResponse(
@@ -758,7 +1075,8 @@ async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
                     "success": True,
                     "message": "Knowledge records retrieved successfully",
                     "data": [item.dict() for item in knowledge_items],
-                    "total": total
+                    "total": total,
+                    "next_cursor": None if by_relevance else next_page_cursor(results, limit, "update_time")
                 }
             )
 
@@ -779,7 +1097,7 @@ async def query_public_knowledge(query: str, limit: int = 10, offset: int = 0):
 
 
 @router.post("/copy_knowledge", response_model=KnowledgeCopyResponse)
-async def copy_knowledge(request: KnowledgeCopyRequest, http_request: Request):
+def copy_knowledge(request: KnowledgeCopyRequest, http_request: Request):
     """
     复制知识记录接口（包括关联的工具）
     """
@@ -874,8 +1192,8 @@ async def copy_knowledge(request: KnowledgeCopyRequest, http_request: Request):
                         'params': tool_result['params']
                     }
 
-            # 调用核心方法创建工具和知识记录
-            result = create_tool_and_knowledge_records(tool_data, knowledge_data)
+            # 调用核心方法创建工具和知识记录，复用当前连接
+            result = create_tool_and_knowledge_records(tool_data, knowledge_data, connection=connection)
 
             if not result["success"]:
                 raise Exception(result["message"])
@@ -908,7 +1226,7 @@ async def copy_knowledge(request: KnowledgeCopyRequest, http_request: Request):
 
 
 @router.post("/authorize_knowledge_access")
-async def authorize_knowledge_access(request: Request, auth_request: dict):
+def authorize_knowledge_access(request: Request, auth_request: dict):
     """
     知识授权接口
     """
@@ -1019,6 +1337,7 @@ async def authorize_knowledge_access(request: Request, auth_request: dict):
             """
             cursor.execute(insert_auth_sql, (target_email, knowledge_id, user_id, email, 1))
             connection.commit()
+            count_cache.invalidate(share_count_scope(to_user_email=target_email), share_count_scope(from_user_id=user_id))
 
             logger.info(
                 f"Granted access to user {target_email} (from user_id: {user_id}) for knowledge {knowledge_id}")
@@ -1046,7 +1365,7 @@ async def authorize_knowledge_access(request: Request, auth_request: dict):
             connection.close()
 
 @router.post("/handle_knowledge_share")
-async def handle_knowledge_share(request: Request, handle_request: dict):
+def handle_knowledge_share(request: Request, handle_request: dict):
     """
     处理知识分享请求（接受或拒绝）
     """
@@ -1113,6 +1432,7 @@ async def handle_knowledge_share(request: Request, handle_request: dict):
                 update_share_sql = "UPDATE knowledge_share SET status = 2 WHERE id = %s"
                 cursor.execute(update_share_sql, (knowledge_share_id,))
                 connection.commit()
+                count_cache.invalidate(share_count_scope(to_user_email=email))
 
                 logger.info(f"User {user_id} rejected knowledge share {knowledge_share_id}")
                 return JSONResponse(
@@ -1178,8 +1498,8 @@ async def handle_knowledge_share(request: Request, handle_request: dict):
                             'params': tool_result['params']
                         }
 
-                # 调用核心方法创建工具和知识记录
-                result = create_tool_and_knowledge_records(tool_data, knowledge_data)
+                # 调用核心方法创建工具和知识记录，复用当前连接
+                result = create_tool_and_knowledge_records(tool_data, knowledge_data, connection=connection)
 
                 if not result["success"]:
                     raise Exception(result["message"])
@@ -1190,6 +1510,7 @@ async def handle_knowledge_share(request: Request, handle_request: dict):
                 update_share_sql = "UPDATE knowledge_share SET status = 3 WHERE id = %s"
                 cursor.execute(update_share_sql, (knowledge_share_id,))
                 connection.commit()
+                count_cache.invalidate(share_count_scope(to_user_email=email))
 
                 logger.info(
                     f"User {user_id} accepted knowledge share {knowledge_share_id}, created knowledge {new_knowledge_id}")
@@ -1218,9 +1539,11 @@ async def handle_knowledge_share(request: Request, handle_request: dict):
             connection.close()
 
 @router.get("/query_knowledge_shares", response_model=KnowledgeQueryResponse)
-async def query_knowledge_shares(http_request: Request, limit: int = 10, offset: int = 0):
+def query_knowledge_shares(http_request: Request, limit: int = 10, offset: int = 0, next_cursor: Optional[str] = None):
     """
     查询用户收到的知识分享请求
+
+    按 (create_time, id) 倒序，支持 next_cursor 游标分页，offset 分页保留用于兼容
     """
     # 验证用户登录态
     auth_header = http_request.headers.get("Authorization")
@@ -1238,6 +1561,15 @@ async def query_knowledge_shares(http_request: Request, limit: int = 10, offset:
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    after = None
+    if next_cursor:
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -1256,15 +1588,18 @@ async def query_knowledge_shares(http_request: Request, limit: int = 10, offset:
         # 获取数据库连接
         connection = get_db_connection()
         with connection.cursor() as cursor:
-            # 先查询knowledge_share表获取分享记录总数
-            count_sql = """
-                SELECT COUNT(*) as total
-                FROM knowledge_share 
-                WHERE to_user_email = %s AND status = 1
-            """
-            cursor.execute(count_sql, (email,))
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            # 先查询knowledge_share表获取分享记录总数（缓存，分享状态变化时失效）
+            def count_shares():
+                count_sql = """
+                    SELECT COUNT(*) as total
+                    FROM knowledge_share 
+                    WHERE to_user_email = %s AND status = 1
+                """
+                cursor.execute(count_sql, (email,))
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
+
+            total = count_cache.get_or_compute(share_count_scope(to_user_email=email), None, count_shares)
 
             if total == 0:
                 logger.info(f"No knowledge shares found for user: {email}")
@@ -1279,14 +1614,16 @@ async def query_knowledge_shares(http_request: Request, limit: int = 10, offset:
                 )
 
             # 查询knowledge_share表获取分享记录
-            share_query_sql = """
+            keyset = keyset_condition("create_time") if after else ""
+            share_query_sql = f"""
                 SELECT id, knowledge_id, from_user_id, from_user_email, to_user_email, status, create_time, update_time
                 FROM knowledge_share 
                 WHERE to_user_email = %s AND status = 1
-                ORDER BY create_time DESC
+                {keyset}
+                ORDER BY create_time DESC, id DESC
                 LIMIT %s OFFSET %s
             """
-            cursor.execute(share_query_sql, (email, limit, offset))
+            cursor.execute(share_query_sql, [email] + (keyset_params(after) if after else []) + [limit, offset])
             share_results = cursor.fetchall()
 
             # 收集所有knowledge_id用于查询知识详情
@@ -1353,7 +1690,8 @@ async def query_knowledge_shares(http_request: Request, limit: int = 10, offset:
                     "success": True,
                     "message": "Knowledge shares retrieved successfully",
                     "data": [item.dict() for item in knowledge_items],
-                    "total": total
+                    "total": total,
+                    "next_cursor": next_page_cursor(share_results, limit, "create_time")
                 }
             )
 
@@ -1373,9 +1711,11 @@ async def query_knowledge_shares(http_request: Request, limit: int = 10, offset:
             connection.close()
 
 @router.get("/get_user_shared_knowledge", response_model=KnowledgeQueryResponse)
-async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offset: int = 0):
+def get_user_shared_knowledge(http_request: Request, limit: int = 10, offset: int = 0, next_cursor: Optional[str] = None):
     """
     根据分享人查询知识分享记录
+
+    按 (create_time, id) 倒序，支持 next_cursor 游标分页，offset 分页保留用于兼容
     """
     # 验证用户登录态
     auth_header = http_request.headers.get("Authorization")
@@ -1392,6 +1732,15 @@ async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offs
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    after = None
+    if next_cursor:
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -1410,15 +1759,18 @@ async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offs
         # 获取数据库连接
         connection = get_db_connection()
         with connection.cursor() as cursor:
-            # 先查询knowledge_share表获取分享记录总数
-            count_sql = """
-                SELECT COUNT(*) as total
-                FROM knowledge_share 
-                WHERE from_user_id = %s
-            """
-            cursor.execute(count_sql, (user_id,))
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            # 先查询knowledge_share表获取分享记录总数（缓存，新建分享时失效）
+            def count_shares():
+                count_sql = """
+                    SELECT COUNT(*) as total
+                    FROM knowledge_share 
+                    WHERE from_user_id = %s
+                """
+                cursor.execute(count_sql, (user_id,))
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
+
+            total = count_cache.get_or_compute(share_count_scope(from_user_id=user_id), None, count_shares)
 
             if total == 0:
                 logger.info(f"No knowledge shares found from user: {user_id}")
@@ -1433,14 +1785,16 @@ async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offs
                 )
 
             # 查询knowledge_share表获取分享记录
-            share_query_sql = """
+            keyset = keyset_condition("create_time") if after else ""
+            share_query_sql = f"""
                 SELECT id, knowledge_id, to_user_email, status, create_time, update_time
                 FROM knowledge_share 
                 WHERE from_user_id = %s
-                ORDER BY create_time DESC
+                {keyset}
+                ORDER BY create_time DESC, id DESC
                 LIMIT %s OFFSET %s
             """
-            cursor.execute(share_query_sql, (user_id, limit, offset))
+            cursor.execute(share_query_sql, [user_id] + (keyset_params(after) if after else []) + [limit, offset])
             share_results = cursor.fetchall()
 
             # 收集所有knowledge_id用于查询知识详情
@@ -1506,7 +1860,8 @@ async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offs
                     "success": True,
                     "message": "Knowledge shares retrieved successfully",
                     "data": [item.dict() for item in knowledge_items],
-                    "total": total
+                    "total": total,
+                    "next_cursor": next_page_cursor(share_results, limit, "create_time")
                 }
             )
 
@@ -1526,7 +1881,7 @@ async def get_user_shared_knowledge(http_request: Request, limit: int = 10, offs
             connection.close()
 
 @router.post("/cancel_knowledge_share")
-async def cancel_knowledge_share(request: Request, cancel_request: dict):
+def cancel_knowledge_share(request: Request, cancel_request: dict):
     """
     取消知识分享接口
     根据登录用户的user_id和share_id查询knowledge_share表的from_user_id和id，
@@ -1566,7 +1921,7 @@ async def cancel_knowledge_share(request: Request, cancel_request: dict):
         with connection.cursor() as cursor:
             # 查询分享记录，验证from_user_id是否为当前用户
             check_share_sql = """
-                SELECT id, from_user_id, status
+                SELECT id, from_user_id, to_user_email, status
                 FROM knowledge_share
                 WHERE id = %s AND from_user_id = %s
             """
@@ -1599,6 +1954,7 @@ async def cancel_knowledge_share(request: Request, cancel_request: dict):
             update_share_sql = "UPDATE knowledge_share SET status = 4 WHERE id = %s"
             cursor.execute(update_share_sql, (share_id,))
             connection.commit()
+            count_cache.invalidate(share_count_scope(to_user_email=share_result["to_user_email"]))
 
             logger.info(f"User {user_id} canceled knowledge share {share_id}")
             return JSONResponse(
@@ -46,6 +46,7 @@ class KnowledgeQueryResponse(BaseModel):
     message: str
     data: List[KnowledgeItem]
     total: int
+    next_cursor: Optional[str] = None
 
 class KnowledgeCopyRequest(BaseModel):
     knowledgeId: int
@@ -102,6 +103,7 @@ class ToolQueryResponse(BaseModel):
     message: str
     data: List[ToolItem]
     total: int
+    next_cursor: Optional[str] = None
 
 # Query Models
 class QuestionRequest(BaseModel):
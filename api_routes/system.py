@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 
+import anyio.to_thread
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
+from sources.redis_pool import redis_pool_stats
+from sources.knowledge.knowledge import embedding_cache, embedding_batcher, vector_index_manager, public_knowledge_index, \
+    exact_embedding_store, db_pool, count_cache, embedding_pipeline
+from sources.user.passport import token_cache_stats
+from sources.callback.stream_metrics import stream_metrics
+
 router = APIRouter()
 
 def register_system_routes(app_logger, interaction_ref, query_resp_history_ref, config_ref):
@@ -13,6 +20,27 @@ def register_system_routes(app_logger, interaction_ref, query_resp_history_ref,
         app_logger.info("Health check endpoint called")
         return {"status": "healthy", "version": "0.1.0"}
 
+    @router.get("/metrics")
+    async def metrics():
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        return {
+            "embedding_cache": embedding_cache.stats(),
+            "embedding_batcher": embedding_batcher.stats(),
+            "vector_index": vector_index_manager.stats(),
+            "public_ann_index": public_knowledge_index.stats(),
+            "exact_embedding_store": exact_embedding_store.stats() if exact_embedding_store is not None else None,
+            "mysql_pool": db_pool.stats(),
+            "redis_pool": redis_pool_stats(),
+            "count_cache": count_cache.stats(),
+            "embedding_pipeline": embedding_pipeline.stats(),
+            "auth": token_cache_stats(),
+            "query_stream": stream_metrics.stats(),
+            "threadpool": {
+                "total": limiter.total_tokens,
+                "busy": limiter.borrowed_tokens
+            }
+        }
+
     @router.get("/is_active")
     async def is_active():
         app_logger.info("Is active endpoint called")
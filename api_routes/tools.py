@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 from bs4 import BeautifulSoup
 import json
 import yaml
@@ -18,7 +18,10 @@ from .models import (
     OpenAPISpecRequest, OpenAPISpecResponse,
     ToolCreateRequest, ToolCreateResponse
 )
-from sources.knowledge.knowledge import get_db_connection, get_redis_connection, create_tool_and_knowledge_records, get_tool_by_id
+from sources.knowledge.knowledge import get_db_connection, get_redis_connection, create_tool_and_knowledge_records, get_tool_by_id, \
+    vector_index_manager, count_cache, tool_count_scope, invalidate_tool_counts, tool_text_search
+from sources.pagination import InvalidCursorError, decode_cursor, keyset_condition, keyset_params, next_page_cursor
+from sources.text_search import SEARCH_MODES, DEFAULT_SEARCH_MODE
 from sources.logger import Logger
 from sources.user.passport import verify_firebase_token
 
@@ -26,7 +29,7 @@ logger = Logger("backend.log")
 router = APIRouter()
 
 @router.post("/create_tool_and_knowledge", response_model=ToolAndKnowledgeCreateResponse)
-async def create_tool_and_knowledge(request: ToolAndKnowledgeCreateRequest, http_request:  Request):
+def create_tool_and_knowledge(request: ToolAndKnowledgeCreateRequest, http_request:  Request):
     """
     创建tool和knowledge记录接口
     首先创建tool，然后使用tool的id创建knowledge
@@ -146,7 +149,7 @@ async def create_tool_and_knowledge(request: ToolAndKnowledgeCreateRequest, http
 
 
 @router.post("/update_tool", response_model=ToolUpdateResponse)
-async def update_tool(request: ToolUpdateRequest,  http_request:  Request):
+def update_tool(request: ToolUpdateRequest,  http_request:  Request):
     """
     更新工具接口（仅允许更新title、description、url和params字段）
     """
@@ -255,6 +258,10 @@ async def update_tool(request: ToolUpdateRequest,  http_request:  Request):
             cursor.execute(update_sql, update_params)
             connection.commit()
 
+            # 丢弃常驻索引中缓存的工具元数据
+            vector_index_manager.invalidate_tool(user_id, request.toolId)
+            invalidate_tool_counts(user_id)
+
             logger.info(f"Tool record {request.toolId} updated successfully")
             return JSONResponse(
                 status_code=200,
@@ -280,7 +287,7 @@ async def update_tool(request: ToolUpdateRequest,  http_request:  Request):
             connection.close()
 
 @router.post("/delete_tool", response_model=ToolDeleteResponse)
-async def delete_tool(request: ToolDeleteRequest, http_request:  Request):
+def delete_tool(request: ToolDeleteRequest, http_request:  Request):
     """
     删除工具接口（通过修改status字段实现软删除）
     """
@@ -345,6 +352,10 @@ async def delete_tool(request: ToolDeleteRequest, http_request:  Request):
             cursor.execute(delete_sql, (2, request.toolId))
             connection.commit()
 
+            # 丢弃常驻索引中缓存的工具元数据
+            vector_index_manager.invalidate_tool(user_id, request.toolId)
+            invalidate_tool_counts(user_id)
+
             logger.info(f"Tool record {request.toolId} deleted successfully (status set to 0)")
             return JSONResponse(
                 status_code=200,
@@ -370,9 +381,14 @@ async def delete_tool(request: ToolDeleteRequest, http_request:  Request):
             connection.close()
 
 @router.get("/query_tools", response_model=ToolQueryResponse)
-async def query_tool_records(http_request: Request, query: str = "", limit: int = 10, offset: int = 0):
+def query_tool_records(http_request: Request, query: str = "", limit: int = 10, offset: int = 0, next_cursor: Optional[str] = None,
+                       search_mode: Optional[str] = None):
     """
     查询工具记录接口
+
+    按 (update_time, id) 倒序分页：传入上一页返回的 next_cursor 获取下一页（游标分页），
+    offset 分页保留用于兼容，两者不能同时使用。
+    search_mode=fulltext（默认）使用全文索引并按相关度排序，此时不返回 next_cursor，使用 offset 分页；search_mode=like 使用 LIKE 模糊匹配
     """
     auth_header = http_request.headers.get("Authorization")
     user = verify_firebase_token(auth_header)
@@ -390,6 +406,19 @@ async def query_tool_records(http_request: Request, query: str = "", limit: int
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    search_mode = search_mode or DEFAULT_SEARCH_MODE
+    if search_mode not in SEARCH_MODES:
+        errors.append("search_mode must be fulltext or like")
+
+    after = None
+    if next_cursor:
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -411,26 +440,25 @@ async def query_tool_records(http_request: Request, query: str = "", limit: int
             # 构建查询条件
             # 1. 用户ID匹配
             # 2. 公开的工具 或者 用户自己的工具
-            # 3. 如果query不为空，则进行title或description模糊匹配
-            if query:
-                search_pattern = f"%{query}%"
-                where_condition = "AND (title LIKE %s OR description LIKE %s)"
-                params = [1, user_id, search_pattern, search_pattern]
-            else:
-                where_condition = ""
-                params = [1, user_id]
-
-            count_sql = f"""
-                        SELECT COUNT(*) as total
-                        FROM tools
-                        WHERE status = %s
-                          AND user_id = %s
-                          {where_condition}
-                        """
+            # 3. 如果query不为空，则对title或description做全文检索（或 LIKE 模糊匹配）
+            mode = tool_text_search.resolve_mode(cursor, query, search_mode) if query else None
+            where_condition, search_params = tool_text_search.condition(query, mode) if query else ("", [])
+            params = [1, user_id] + search_params
+
+            def count_records():
+                count_sql = f"""
+                            SELECT COUNT(*) as total
+                            FROM tools
+                            WHERE status = %s
+                              AND user_id = %s
+                              {where_condition}
+                            """
+                cursor.execute(count_sql, params)
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
 
-            cursor.execute(count_sql, params)
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            # 总数走缓存，工具写入时失效
+            total = count_cache.get_or_compute(tool_count_scope(user_id), [mode, query], count_records)
 
             if total == 0:
                 # logger.info(f"No tool records found for user: {userId}" + (f" with query: {query}" if query else ""))
@@ -444,38 +472,28 @@ async def query_tool_records(http_request: Request, query: str = "", limit: int
                     }
                 )
 
-            # 查询数据
-            if query:
-                query_sql = f"""
-                            SELECT id,
-                                   user_id,
-                                   title,
-                                   description,
-                                   url, push, public, status, timeout, params, create_time, update_time
-                            FROM tools
-                            WHERE status = %s
-                               AND user_id = %s
-                              {where_condition}
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, user_id, search_pattern, search_pattern, limit, offset]
-            else:
-                query_sql = """
-                            SELECT id,
-                                   user_id,
-                                   title,
-                                   description,
-                                   url, push, public, status, timeout, params, create_time, update_time
-                            FROM tools
-                            WHERE status = %s
-                               AND user_id = %s
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, user_id, limit, offset]
+            # 查询数据，游标分页时从上一页最后一行之后继续
+            keyset = keyset_condition("update_time") if after else ""
+            # 全文检索按相关度排序（仅 offset 分页）；其余情况以及游标分页按更新时间排序
+            by_relevance = mode == "fulltext" and not after
+            order_by, order_params = tool_text_search.relevance_order(query) if by_relevance \
+                else ("update_time DESC, id DESC", [])
+            query_sql = f"""
+                        SELECT id,
+                               user_id,
+                               title,
+                               description,
+                               url, push, public, status, timeout, params, create_time, update_time
+                        FROM tools
+                        WHERE status = %s
+                           AND user_id = %s
+                          {where_condition}
+                          {keyset}
+                        ORDER BY {order_by}
+                            LIMIT %s
+                        OFFSET %s
+                        """
+            params = params + (keyset_params(after) if after else []) + order_params + [limit, offset]
 
             cursor.execute(query_sql, params)
             results = cursor.fetchall()
@@ -504,7 +522,8 @@ async def query_tool_records(http_request: Request, query: str = "", limit: int
                     "success": True,
                     "message": "Tool records retrieved successfully",
                     "data": [item.dict() for item in tool_items],
-                    "total": total
+                    "total": total,
+                    "next_cursor": None if by_relevance else next_page_cursor(results, limit, "update_time")
                 }
             )
 
@@ -524,9 +543,12 @@ async def query_tool_records(http_request: Request, query: str = "", limit: int
             connection.close()
 
 @router.get("/query_public_tools", response_model=ToolQueryResponse)
-async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
+def query_public_tools(query: str = "", limit: int = 10, offset: int = 0, next_cursor: Optional[str] = None,
+                       search_mode: Optional[str] = None):
     """
     查询公开工具记录接口
+
+    分页方式同 query_tool_records
     """
     logger.info(f"Querying public tool" + (f" with query: {query}" if query else ""))
 
@@ -539,6 +561,19 @@ async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
     if offset < 0:
         errors.append("offset must be greater than or equal to 0")
 
+    search_mode = search_mode or DEFAULT_SEARCH_MODE
+    if search_mode not in SEARCH_MODES:
+        errors.append("search_mode must be fulltext or like")
+
+    after = None
+    if next_cursor:
+        if offset:
+            errors.append("next_cursor and offset cannot be used together")
+        try:
+            after = decode_cursor(next_cursor)
+        except InvalidCursorError:
+            errors.append("invalid next_cursor")
+
     if errors:
         logger.error(f"Validation errors: {errors}")
         return JSONResponse(
@@ -560,26 +595,25 @@ async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
             # 构建查询条件
             # 1. 用户ID匹配
             # 2. 公开的工具 或者 用户自己的工具
-            # 3. 如果query不为空，则进行title或description模糊匹配
-            if query:
-                search_pattern = f"%{query}%"
-                where_condition = "AND (title LIKE %s OR description LIKE %s)"
-                params = [1, 2, search_pattern, search_pattern]
-            else:
-                where_condition = ""
-                params = [1, 2]
-
-            count_sql = f"""
-                        SELECT COUNT(*) as total
-                        FROM tools
-                        WHERE status = %s
-                          AND public = %s
-                          {where_condition}
-                        """
+            # 3. 如果query不为空，则对title或description做全文检索（或 LIKE 模糊匹配）
+            mode = tool_text_search.resolve_mode(cursor, query, search_mode) if query else None
+            where_condition, search_params = tool_text_search.condition(query, mode) if query else ("", [])
+            params = [1, 2] + search_params
+
+            def count_records():
+                count_sql = f"""
+                            SELECT COUNT(*) as total
+                            FROM tools
+                            WHERE status = %s
+                              AND public = %s
+                              {where_condition}
+                            """
+                cursor.execute(count_sql, params)
+                count_result = cursor.fetchone()
+                return count_result['total'] if count_result else 0
 
-            cursor.execute(count_sql, params)
-            count_result = cursor.fetchone()
-            total = count_result['total'] if count_result else 0
+            # 总数走缓存，工具写入时失效
+            total = count_cache.get_or_compute(tool_count_scope(), [mode, query], count_records)
 
             if total == 0:
                 logger.info(f"No public tool" + (f" with query: {query}" if query else ""))
@@ -593,38 +627,28 @@ async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
                     }
                 )
 
-            # 查询数据
-            if query:
-                query_sql = f"""
-                            SELECT id,
-                                   user_id,
-                                   title,
-                                   description,
-                                   url, push, public, status, timeout, params, create_time, update_time
-                            FROM tools
-                            WHERE status = %s
-                               AND public = %s
-                              {where_condition}
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, 2, search_pattern, search_pattern, limit, offset]
-            else:
-                query_sql = """
-                            SELECT id,
-                                   user_id,
-                                   title,
-                                   description,
-                                   url, push, public, status, timeout, params, create_time, update_time
-                            FROM tools
-                            WHERE status = %s
-                               AND public = %s
-                            ORDER BY update_time DESC
-                                LIMIT %s
-                            OFFSET %s
-                            """
-                params = [1, 2, limit, offset]
+            # 查询数据，游标分页时从上一页最后一行之后继续
+            keyset = keyset_condition("update_time") if after else ""
+            # 全文检索按相关度排序（仅 offset 分页）；其余情况以及游标分页按更新时间排序
+            by_relevance = mode == "fulltext" and not after
+            order_by, order_params = tool_text_search.relevance_order(query) if by_relevance \
+                else ("update_time DESC, id DESC", [])
+            query_sql = f"""
+                        SELECT id,
+                               user_id,
+                               title,
+                               description,
+                               url, push, public, status, timeout, params, create_time, update_time
+                        FROM tools
+                        WHERE status = %s
+                           AND public = %s
+                          {where_condition}
+                          {keyset}
+                        ORDER BY {order_by}
+                            LIMIT %s
+                        OFFSET %s
+                        """
+            params = params + (keyset_params(after) if after else []) + order_params + [limit, offset]
 
             cursor.execute(query_sql, params)
             results = cursor.fetchall()
@@ -653,7 +677,8 @@ async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
                     "success": True,
                     "message": "Tool records retrieved successfully",
                     "data": [item.dict() for item in tool_items],
-                    "total": total
+                    "total": total,
+                    "next_cursor": None if by_relevance else next_page_cursor(results, limit, "update_time")
                 }
             )
 
@@ -673,7 +698,7 @@ async def query_public_tools(query: str = "", limit: int = 10, offset: int = 0):
             connection.close()
 
 @router.post("/get_tool_request", response_model=ToolFetchResponse)
-async def get_tool_request(request: ToolFetchRequest, http_request: Request):
+def get_tool_request(request: ToolFetchRequest, http_request: Request):
     """
     根据query_id和user_id从Redis获取工具对象
 
@@ -775,7 +800,7 @@ async def get_tool_request(request: ToolFetchRequest, http_request: Request):
         )
 
 @router.post("/save_tool_response", response_model=ToolResponseResponse)
-async def save_tool_response(request: ToolResponseRequest, http_request: Request):
+def save_tool_response(request: ToolResponseRequest, http_request: Request):
     """
     保存工具响应到Redis
 
@@ -883,7 +908,7 @@ async def save_tool_response(request: ToolResponseRequest, http_request: Request
 
 
 @router.get("/query_tool_by_id", response_model=ToolQueryResponse)
-async def query_tool_by_id(http_request: Request, tool_id: int):
+def query_tool_by_id(http_request: Request, tool_id: int):
     """
     根据tool_id查询工具详情接口
     """
@@ -975,7 +1000,7 @@ async def query_tool_by_id(http_request: Request, tool_id: int):
         )
 
 @router.post("/create_tool_from_openapi", response_model=OpenAPISpecResponse)
-async def create_tool_from_openapi(request: OpenAPISpecRequest, http_request: Request):
+def create_tool_from_openapi(request: OpenAPISpecRequest, http_request: Request):
     """
     从OpenAPI规范创建工具接口
 
@@ -1125,6 +1150,7 @@ async def create_tool_from_openapi(request: OpenAPISpecRequest, http_request: Re
                     params  # 使用提取的参数信息
                 ))
                 connection.commit()
+                invalidate_tool_counts(user_id, public=False)
 
                 # 获取插入的记录ID
                 tool_id = cursor.lastrowid
@@ -1166,7 +1192,7 @@ async def create_tool_from_openapi(request: OpenAPISpecRequest, http_request: Re
             connection.close()
 
 @router.post("/create_tool", response_model=ToolCreateResponse)
-async def create_tool(request: ToolCreateRequest, http_request: Request):
+def create_tool(request: ToolCreateRequest, http_request: Request):
     """
     创建工具接口
     直接创建工具记录到tools表
@@ -1228,6 +1254,7 @@ async def create_tool(request: ToolCreateRequest, http_request: Request):
                 request.tool_params
             ))
             connection.commit()
+            invalidate_tool_counts(user_id, public=False)
 
             # 获取插入的记录ID
             tool_id = cursor.lastrowid
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+MySQL 连接池负载测试：每次请求新建连接 vs 从连接池借出
+
+    MYSQL_HOST=127.0.0.1 MYSQL_USER=... MYSQL_PASSWORD=... MYSQL_DATABASE=... \
+        python benchmarks/bench_db_pool.py [--threads 32] [--requests 2000] [--pool-size 10]
+
+每个模拟请求执行一次与 get_user_by_id 相同形状的主键查询，报告两种方式的吞吐、
+p50/p99 延迟以及连接池的等待时间统计。需要可访问的 MySQL。
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+from sources.db_pool import ConnectionPool
+from sources.knowledge.knowledge import create_db_connection
+
+QUERY = "SELECT user_id, email FROM users WHERE user_id = %s"
+
+
+def direct_request(_):
+    start = time.perf_counter()
+    connection = create_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(QUERY, (1,))
+            cursor.fetchone()
+    finally:
+        connection.close()
+    return time.perf_counter() - start
+
+
+def pooled_request(pool):
+    def request(_):
+        start = time.perf_counter()
+        with pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(QUERY, (1,))
+                cursor.fetchone()
+        return time.perf_counter() - start
+    return request
+
+
+def run(name, fn, threads, requests):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = np.asarray(list(executor.map(fn, range(requests)))) * 1000
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {requests / elapsed:8.1f} req/s  p50={np.percentile(latencies, 50):6.2f}ms  "
+          f"p99={np.percentile(latencies, 99):6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    run("direct", direct_request, args.threads, args.requests)
+    pool = ConnectionPool(create_db_connection, max_size=args.pool_size, checkout_timeout=30)
+    run("pooled", pooled_request(pool), args.threads, args.requests)
+    print(f"pool stats: {pool.stats()}")
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+知识 embedding 读取延迟基准：逐键 GET vs 分块 MGET
+
+    python benchmarks/bench_embedding_fetch.py [--sizes 100,500,2000] [--redis-url redis://localhost:6379/15]
+
+不指定 --redis-url 时会在本机启动 fakeredis 的 TCP 服务作为 Redis 替身（需要 pip install fakeredis），
+仍然走真实的 socket 往返。
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+from sources.knowledge.knowledge import load_knowledge_embedding, load_knowledge_embeddings, knowledge_embedding_key, EMBEDDING_MODEL
+from sources.knowledge.embedding_codec import encode_embedding
+
+
+def start_fake_redis() -> str:
+    from fakeredis import TcpFakeServer
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = TcpFakeServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+def measure(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50), percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,500,2000,5000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    url = args.redis_url or start_fake_redis()
+    text_conn = redis.Redis.from_url(url, decode_responses=True)
+    binary_conn = redis.Redis.from_url(url, decode_responses=False)
+    rng = np.random.default_rng(0)
+
+    print(f"redis: {url}  dim: {args.dim}  iterations: {args.iterations}")
+    print(f"{'items':>7} | {'legacy GET+eval p50/p99 ms':>28} | {'binary GET p50/p99 ms':>23} | {'chunked MGET p50/p99 ms':>25}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        ids = list(range(1, size + 1))
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+
+        pipe = binary_conn.pipeline(transaction=False)
+        for knowledge_id, vector in zip(ids, vectors):
+            pipe.set(f"legacy_{knowledge_embedding_key(knowledge_id)}", str(vector.tolist()))
+            pipe.set(knowledge_embedding_key(knowledge_id), encode_embedding(vector, EMBEDDING_MODEL))
+        pipe.execute()
+
+        legacy = measure(lambda: [eval(text_conn.get(f"legacy_{knowledge_embedding_key(i)}")) for i in ids], args.iterations)
+        per_key = measure(lambda: [load_knowledge_embedding(binary_conn, i) for i in ids], args.iterations)
+        bulk = measure(lambda: load_knowledge_embeddings(binary_conn, ids), args.iterations)
+        print(f"{size:>7} | {legacy[0]:>13.2f} / {legacy[1]:>12.2f} | {per_key[0]:>10.2f} / {per_key[1]:>10.2f} | {bulk[0]:>11.2f} / {bulk[1]:>11.2f}")
+
+        binary_conn.delete(*[knowledge_embedding_key(i) for i in ids], *[f"legacy_{knowledge_embedding_key(i)}" for i in ids])
+
+
+if __name__ == "__main__":
+    main()
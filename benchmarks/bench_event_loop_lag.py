@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟测试：阻塞调用写在 async def 路由中 vs 同步路由（在线程池中执行）
+
+    python benchmarks/bench_event_loop_lag.py [--requests 200] [--query-ms 20] [--streams 20]
+
+模拟 /query_knowledge 的形状：每个请求做一次耗时 --query-ms 的阻塞调用（代表 PyMySQL 查询和
+embedding 请求）。同时运行 --streams 个模拟 SSE 流，每个流每 10ms 产出一个 token，
+记录相邻 token 的实际间隔；另有一个探针任务每 10ms 唤醒一次，记录事件循环的延迟。
+不需要 MySQL/Redis/OpenAI。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+TICK = 0.01
+
+
+def build_app(query_seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/blocking_async")
+    async def blocking_async(query: str):
+        time.sleep(query_seconds)
+        return {"success": True, "query": query}
+
+    @app.get("/threadpool_sync")
+    def threadpool_sync(query: str):
+        time.sleep(query_seconds)
+        return {"success": True, "query": query}
+
+    return app
+
+
+async def probe(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def stream(stop: asyncio.Event, gaps: list) -> None:
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(TICK)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def run(path: str, app: FastAPI, requests: int, streams: int) -> None:
+    stop = asyncio.Event()
+    lags, gaps = [], []
+    background = [asyncio.create_task(probe(stop, lags))]
+    background += [asyncio.create_task(stream(stop, gaps)) for _ in range(streams)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(path, params={"query": str(i)}) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*background)
+
+    assert all(response.status_code == 200 for response in responses)
+    lags = np.asarray(lags) * 1000
+    gaps = np.asarray(gaps) * 1000
+    print(f"{path:>16}: {requests / elapsed:7.1f} req/s  loop lag p50={np.percentile(lags, 50):7.2f}ms "
+          f"p99={np.percentile(lags, 99):7.2f}ms max={lags.max():7.2f}ms  "
+          f"token gap p99={np.percentile(gaps, 99):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--query-ms", type=float, default=20)
+    parser.add_argument("--streams", type=int, default=20)
+    args = parser.parse_args()
+
+    app = build_app(args.query_ms / 1000)
+    print(f"{args.requests} parallel requests, {args.query_ms}ms blocking work each, {args.streams} live streams")
+    asyncio.run(run("/blocking_async", app, args.requests, args.streams))
+    asyncio.run(run("/threadpool_sync", app, args.requests, args.streams))
+
+
+if __name__ == "__main__":
+    main()
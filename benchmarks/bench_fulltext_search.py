@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+知识搜索测试：LIKE '%q%' 扫描 vs FULLTEXT(ngram) 索引
+
+    MYSQL_HOST=127.0.0.1 MYSQL_USER=... MYSQL_PASSWORD=... MYSQL_DATABASE=... \
+        python benchmarks/bench_fulltext_search.py [--rows 1000000] [--repeat 5] [--keep]
+
+在独立的 knowledge_search_bench 表中写入 --rows 行中英文混合的模拟知识（结构与 knowledge 表相同），
+写入完成后再建 FULLTEXT ngram 索引，然后对不同选择度的查询词分别用两种方式执行列表接口的
+COUNT(*) + 第一页查询，报告延迟。需要可访问的 MySQL，默认结束后删除测试表。
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+from sources.knowledge.knowledge import create_db_connection
+from sources.text_search import TextSearch
+
+TABLE = "knowledge_search_bench"
+COMMON = ["数据", "用户", "查询", "接口", "配置", "服务", "文件", "系统", "订单", "支付", "登录", "消息",
+          "order", "user", "config", "service", "request", "token", "report", "export"]
+RARE = ["向量索引", "灰度发布", "幂等", "熔断", "webhook", "kubernetes", "snowflake", "ngram"]
+QUERIES = ["数据", "订单", "灰度发布", "kubernetes", "熔断 降级"]
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    parts = [rng.choice(RARE) if rng.random() < 0.002 else rng.choice(COMMON) for _ in range(words)]
+    return "".join(part if rng.random() < 0.6 else f" {part} " for part in parts).strip()
+
+
+def seed(connection, rows: int, batch: int = 5000) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {TABLE} (
+                id BIGINT UNSIGNED AUTO_INCREMENT,
+                user_id BIGINT UNSIGNED NOT NULL,
+                question VARCHAR(128) NOT NULL,
+                description VARCHAR(4096) NOT NULL DEFAULT '',
+                answer VARCHAR(4096) NOT NULL,
+                public TINYINT UNSIGNED NOT NULL DEFAULT 1,
+                status TINYINT UNSIGNED NOT NULL DEFAULT 1,
+                update_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id),
+                KEY idx_public_status_update_time (public, status, update_time)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        rng = random.Random(0)
+        sql = f"INSERT INTO {TABLE} (user_id, question, description, answer, public) VALUES (%s, %s, %s, %s, %s)"
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            values = [(rng.randrange(10000), random_text(rng, 8)[:120], random_text(rng, 30),
+                       random_text(rng, 120), 2) for _ in range(min(batch, rows - offset))]
+            cursor.executemany(sql, values)
+            connection.commit()
+        print(f"seeded {rows} rows in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        cursor.execute(f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX ft_question_description_answer "
+                       f"(question, description, answer) WITH PARSER ngram")
+        print(f"built FULLTEXT index in {time.perf_counter() - start:.1f}s")
+
+
+def run_query(cursor, search: TextSearch, query: str, mode: str) -> float:
+    condition, params = search.condition(query, mode)
+    if mode == "fulltext":
+        order_by, order_params = search.relevance_order(query)
+    else:
+        order_by, order_params = "update_time DESC, id DESC", []
+    start = time.perf_counter()
+    cursor.execute(f"SELECT COUNT(*) AS total FROM {TABLE} WHERE status = 1 AND public = 2 {condition}", params)
+    cursor.fetchone()
+    cursor.execute(f"SELECT id, question FROM {TABLE} WHERE status = 1 AND public = 2 {condition} "
+                   f"ORDER BY {order_by} LIMIT 10", params + order_params)
+    cursor.fetchall()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded table for later runs")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse a table kept by --keep")
+    args = parser.parse_args()
+
+    connection = create_db_connection()
+    search = TextSearch(TABLE, ("question", "description", "answer"))
+    try:
+        if not args.skip_seed:
+            seed(connection, args.rows)
+        with connection.cursor() as cursor:
+            for query in QUERIES:
+                for mode in ("like", "fulltext"):
+                    latencies = np.asarray([run_query(cursor, search, query, mode) for _ in range(args.repeat)]) * 1000
+                    print(f"{query:>12} {mode:>8}: p50={np.percentile(latencies, 50):9.1f}ms  max={latencies.max():9.1f}ms")
+    finally:
+        if not args.keep:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
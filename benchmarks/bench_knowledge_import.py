@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+知识导入吞吐测试：逐条创建（一次 INSERT + commit + 一次 embedding + 一次 SET）vs 批量导入
+
+    MYSQL_HOST=127.0.0.1 MYSQL_USER=... MYSQL_PASSWORD=... MYSQL_DATABASE=... REDIS_HOST=127.0.0.1 \
+        python benchmarks/bench_knowledge_import.py [--rows 5000] [--user-id 900000001] [--openai]
+
+默认使用本地生成的伪 embedding（固定延迟模拟一次接口往返，--embed-latency-ms），只衡量 MySQL/Redis
+写入路径；--openai 时两条路径都调用真实的 embedding 接口。需要可访问的 MySQL 和 Redis，
+测试数据写入 --user-id 指定的用户，结束后删除。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_TASK_MODE", "inline")
+from sources.knowledge.knowledge import EMBEDDING_MODEL, db_connection, get_redis_connection, import_knowledge_batch, \
+    knowledge_embedding_key, request_embeddings, request_embedding, store_knowledge_embedding
+from sources.knowledge.embedding_pipeline import EMBEDDING_READY, knowledge_content_hash
+from sources.redis_pool import delete_many
+
+
+def make_records(rows: int, tool_id: int):
+    return [(i + 1, {"question": f"问题 {i} 如何查询订单状态", "description": "", "answer": f"调用 getOrderStatus 接口 {i}",
+                     "public": 1, "model_name": "gpt-4o-mini", "tool_id": tool_id, "params": ""}) for i in range(rows)]
+
+
+def fake_embed_many(latency: float):
+    def embed(texts):
+        time.sleep(latency)
+        return list(np.random.default_rng(len(texts)).standard_normal((len(texts), 1536), dtype=np.float32))
+    return embed
+
+
+def single_row(user_id: str, records, embed_one) -> list:
+    ids = []
+    redis_conn = get_redis_connection()
+    for _, data in records:
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                embedding = embed_one(data['question'] + data['answer'])
+                cursor.execute(
+                    """
+                    INSERT INTO knowledge
+                    (user_id, question, description, answer, public, model_name, tool_id, params, status, embedding_id,
+                     embedding_status, embedding_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (user_id, data['question'], data['description'], data['answer'], data['public'], data['model_name'],
+                     data['tool_id'], data['params'], 1, 0, EMBEDDING_READY,
+                     knowledge_content_hash(data['question'], data['answer']))
+                )
+                connection.commit()
+                ids.append(cursor.lastrowid)
+                store_knowledge_embedding(redis_conn, cursor.lastrowid, embedding)
+    return ids
+
+
+def cleanup(user_id: str, tool_id: int, ids) -> None:
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM knowledge WHERE user_id = %s", (user_id,))
+            cursor.execute("DELETE FROM tools WHERE id = %s", (tool_id,))
+        connection.commit()
+    delete_many(get_redis_connection(), [knowledge_embedding_key(knowledge_id) for knowledge_id in ids])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--user-id", default="900000001")
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--openai", action="store_true", help=f"call the real {EMBEDDING_MODEL} API")
+    args = parser.parse_args()
+
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO tools (user_id, title, description, url, timeout) VALUES (%s, %s, %s, %s, %s)",
+                           (args.user_id, "bench", "", "http://localhost", 10))
+            tool_id = cursor.lastrowid
+        connection.commit()
+
+    latency = args.embed_latency_ms / 1000
+    embed_one = request_embedding if args.openai else (lambda text: (time.sleep(latency), np.ones(1536, np.float32))[1])
+    embed_many = request_embeddings if args.openai else fake_embed_many(latency)
+    records = make_records(args.rows, tool_id)
+    ids = []
+    try:
+        # 逐条路径太慢，只跑一部分按比例计算
+        sample = records[:min(len(records), 500)]
+        start = time.perf_counter()
+        ids.extend(single_row(args.user_id, sample, embed_one))
+        single_rate = len(sample) / (time.perf_counter() - start)
+        print(f"single-row: {single_rate:8.1f} rows/s ({len(sample)} rows)")
+
+        start = time.perf_counter()
+        owned_tools = {}
+        for offset in range(0, len(records), args.batch):
+            result = import_knowledge_batch(args.user_id, records[offset:offset + args.batch], owned_tools, embed=embed_many)
+            ids.extend(knowledge_id for _, knowledge_id in result["imported"])
+            if result["errors"]:
+                print(f"errors: {result['errors'][:3]}")
+        bulk_rate = len(records) / (time.perf_counter() - start)
+        print(f"bulk:       {bulk_rate:8.1f} rows/s ({len(records)} rows, batch {args.batch})")
+        print(f"speedup:    {bulk_rate / single_rate:8.1f}x")
+    finally:
+        cleanup(args.user_id, tool_id, ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SSE token 合并测试：每个 token 一帧 vs 按时间窗口/字节数/句末合并
+
+    python benchmarks/bench_sse_coalescing.py [--streams 200] [--tokens-per-second 100] [--seconds 5]
+
+模拟 /query_stream 的形状：--streams 个流各自以 --tokens-per-second 的速率调用
+SSECallbackHandler.on_llm_new_token，消费端与 generate() 相同（json.dumps 后拼成 SSE 帧），
+每帧通过本地 socketpair 发送一次（对应一次 send 系统调用）。对每种模式输出每秒帧数、每流每秒帧数、
+每流 CPU 占用（进程 CPU 时间 / 墙钟时间 / 流数），以及 token 从生成到发出的延迟。
+不需要 MySQL/Redis/OpenAI。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.callback.sse_callback import SSECallbackHandler
+
+TEXT = ("根据你的问题，我先查询了订单接口。The order service returned status=shipped, tracking id 7731. "
+        "接下来会调用物流查询工具获取最新位置，预计两天内送达！如果需要修改地址，请告诉我。\n")
+
+
+def split_tokens(text: str, size: int = 3):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def producer(handler: SSECallbackHandler, tokens, rate: float, seconds: float, sent: list) -> None:
+    interval = 1 / rate
+    start = time.perf_counter()
+    index = 0
+    while time.perf_counter() - start < seconds:
+        sent.append(time.perf_counter())
+        await handler.on_llm_new_token(tokens[index % len(tokens)])
+        index += 1
+        await asyncio.sleep(interval)
+    await handler.put_event({'type': 'end', 'content': '[DONE]'})
+
+
+async def consumer(queue: asyncio.Queue, writer: socket.socket, stats: dict) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        event = await queue.get()
+        if event['type'] == 'token':
+            frame = f"data:{json.dumps(event['content'])}\n\n".encode("utf-8")
+            await loop.sock_sendall(writer, frame)
+            stats["frames"] += 1
+        if event['type'] == 'end':
+            break
+
+
+async def drain(reader: socket.socket) -> None:
+    loop = asyncio.get_running_loop()
+    while await loop.sock_recv(reader, 65536):
+        pass
+
+
+async def run_mode(label: str, streams: int, rate: float, seconds: float, **options) -> None:
+    tokens = split_tokens(TEXT)
+    stats = {"frames": 0}
+    tasks, sockets, latencies = [], [], []
+
+    for _ in range(streams):
+        reader, writer = socket.socketpair()
+        reader.setblocking(False)
+        writer.setblocking(False)
+        sockets.append((reader, writer))
+        queue = asyncio.Queue()
+        handler = SSECallbackHandler(queue, **options)
+        sent = []
+        original_put = queue.put_nowait
+
+        def put_nowait(event, sent=sent, original_put=original_put):
+            # 记录每个 token 从生成到进入发送队列的延迟
+            if event['type'] == 'token' and sent:
+                now = time.perf_counter()
+                latencies.extend(now - created for created in sent)
+                sent.clear()
+            original_put(event)
+
+        queue.put_nowait = put_nowait
+        tasks.append(asyncio.create_task(producer(handler, tokens, rate, seconds, sent)))
+        tasks.append(asyncio.create_task(consumer(queue, writer, stats)))
+        tasks.append(asyncio.create_task(drain(reader)))
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*tasks[0::3], *tasks[1::3])
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    for reader, writer in sockets:
+        writer.close()
+    await asyncio.gather(*tasks[2::3])
+    for reader, _ in sockets:
+        reader.close()
+
+    latencies = np.asarray(latencies or [0.0]) * 1000
+    print(f"{label:>22}: {stats['frames'] / wall:9.0f} frames/s  {stats['frames'] / wall / streams:6.1f} frames/s/stream  "
+          f"cpu/stream={cpu / wall / streams * 100:6.3f}%  token delay p50={np.percentile(latencies, 50):5.1f}ms "
+          f"p99={np.percentile(latencies, 99):5.1f}ms")
+
+
+async def main(args) -> None:
+    print(f"{args.streams} streams x {args.tokens_per_second} tokens/s for {args.seconds}s")
+    await run_mode("per-token", args.streams, args.tokens_per_second, args.seconds, coalesce_ms=0)
+    for window in args.windows:
+        await run_mode(f"coalesce {window:g}ms/{args.bytes}B", args.streams, args.tokens_per_second, args.seconds,
+                       coalesce_ms=window, coalesce_bytes=args.bytes, flush_on_sentence=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--windows", type=float, nargs="+", default=[20, 50])
+    parser.add_argument("--bytes", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
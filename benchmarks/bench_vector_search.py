@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+向量检索延迟基准：sklearn cosine_similarity + 全量排序 vs 预归一化矩阵点积 + argpartition
+
+    python benchmarks/bench_vector_search.py [--sizes 1000,10000,100000] [--dim 1536] [--top-k 3]
+
+旧实现的对照组需要 scikit-learn；未安装时只测新实现。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.vector_index import UserVectorIndex
+
+
+class Item:
+    def __init__(self, id):
+        self.id = id
+
+    def dict(self):
+        return {"id": self.id}
+
+
+def legacy_search(query, embeddings, items, top_k, threshold=0):
+    """改造前 search_knowledge_base 的做法：每次检索都 cosine_similarity 并为所有行构建字典"""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    similarities = cosine_similarity([query], embeddings)[0]
+    results = []
+    for i, similarity in enumerate(similarities):
+        if similarity >= threshold:
+            result_item = items[i].dict()
+            result_item["similarity"] = float(similarity)
+            results.append(result_item)
+    results.sort(key=lambda x: x["similarity"], reverse=True)
+    return results[:top_k]
+
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples = np.asarray(samples) * 1000
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    try:
+        import sklearn  # noqa: F401
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+        print("scikit-learn not installed, skipping legacy path")
+
+    rng = np.random.default_rng(42)
+    print(f"{'rows':>8} {'legacy p50':>11} {'legacy p99':>11} {'new p50':>9} {'new p99':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        embeddings = rng.standard_normal((size, args.dim)).astype(np.float32)
+        items = [Item(i) for i in range(size)]
+        index = UserVectorIndex(dim=args.dim, capacity=size)
+        for item, embedding in zip(items, embeddings):
+            index.upsert(item, embedding)
+        query = rng.standard_normal(args.dim).astype(np.float32)
+
+        new_p50, new_p99 = timeit(lambda: index.search(query, args.top_k), args.repeat)
+        if has_sklearn:
+            legacy_rows = embeddings.tolist()  # 旧实现从 Redis 解析出的是 Python list
+            assert [r["id"] for r in legacy_search(query, legacy_rows, items, args.top_k)] == \
+                [r["id"] for r in index.search(query, args.top_k)]
+            old_p50, old_p99 = timeit(lambda: legacy_search(query, legacy_rows, items, args.top_k), max(3, args.repeat // 5))
+            print(f"{size:>8} {old_p50:>9.2f}ms {old_p99:>9.2f}ms {new_p50:>7.2f}ms {new_p99:>7.2f}ms {old_p50 / new_p50:>7.1f}x")
+        else:
+            print(f"{size:>8} {'-':>11} {'-':>11} {new_p50:>7.2f}ms {new_p99:>7.2f}ms {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,18 @@ CREATE TABLE  knowledge (
 	public tinyint UNSIGNED NOT NULL DEFAULT 1,
     status tinyint UNSIGNED NOT NULL DEFAULT 1,
 	embedding_id BIGINT(64) UNSIGNED NOT NULL,
+	embedding_status tinyint UNSIGNED NOT NULL DEFAULT 1,
+	embedding_hash CHAR(40) NOT NULL DEFAULT '',
 	model_name VARCHAR(200) NOT NULL DEFAULT '',
 	tool_id BIGINT(64) UNSIGNED NOT NULL,
 	params VARCHAR(4096) NOT NULL DEFAULT '',
     create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (id),
-    KEY idx_user_id_status (user_id,status)
+    KEY idx_user_status_update_time (user_id, status, update_time),
+    KEY idx_public_status_update_time (public, status, update_time),
+    KEY idx_embedding_status_id (embedding_status, id),
+    FULLTEXT KEY ft_question_description_answer (question, description, answer) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 创建工具表
@@ -36,7 +41,9 @@ CREATE TABLE  tools (
     create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 	PRIMARY KEY (id),
-    KEY idx_user_id_status (user_id,status)
+    KEY idx_user_status_update_time (user_id, status, update_time),
+    KEY idx_public_status_update_time (public, status, update_time),
+    FULLTEXT KEY ft_title_description (title, description) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 创建用户表
@@ -64,5 +71,6 @@ CREATE TABLE knowledge_share (
     status TINYINT UNSIGNED DEFAULT TRUE,
     create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-	KEY idx_to_user_email (to_user_email)
+	KEY idx_to_user_status_create_time (to_user_email, status, create_time),
+	KEY idx_from_user_create_time (from_user_id, create_time)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
\ No newline at end of file
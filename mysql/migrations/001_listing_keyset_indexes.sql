@@ -0,0 +1,20 @@
+-- 列表接口的游标分页索引
+-- 列表按 (update_time, id) 或 (create_time, id) 倒序翻页，InnoDB 二级索引隐含主键 id，
+-- 因此以下索引可以直接定位游标位置并按序读取 LIMIT 行，不再扫描 OFFSET 行。
+-- 新索引以原 idx_user_id_status 为前缀，原索引随之删除。
+USE langsistance_db;
+
+ALTER TABLE knowledge
+    DROP INDEX idx_user_id_status,
+    ADD KEY idx_user_status_update_time (user_id, status, update_time),
+    ADD KEY idx_public_status_update_time (public, status, update_time);
+
+ALTER TABLE tools
+    DROP INDEX idx_user_id_status,
+    ADD KEY idx_user_status_update_time (user_id, status, update_time),
+    ADD KEY idx_public_status_update_time (public, status, update_time);
+
+ALTER TABLE knowledge_share
+    DROP INDEX idx_to_user_email,
+    ADD KEY idx_to_user_status_create_time (to_user_email, status, create_time),
+    ADD KEY idx_from_user_create_time (from_user_id, create_time);
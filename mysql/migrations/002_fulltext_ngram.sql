@@ -0,0 +1,10 @@
+-- 列表接口搜索使用的全文索引
+-- ngram 解析器按 ngram_token_size（默认 2）切分中英文文本，MATCH ... AGAINST 可以走索引，
+-- 替代 LIKE '%q%' 对 4KB 文本列的逐行扫描。在大表上建索引耗时较长，建议在低峰期执行。
+USE langsistance_db;
+
+ALTER TABLE knowledge
+    ADD FULLTEXT INDEX ft_question_description_answer (question, description, answer) WITH PARSER ngram;
+
+ALTER TABLE tools
+    ADD FULLTEXT INDEX ft_title_description (title, description) WITH PARSER ngram;
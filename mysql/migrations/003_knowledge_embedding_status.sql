@@ -0,0 +1,9 @@
+-- 知识 embedding 改为后台任务计算后，每条知识记录自己的 embedding 状态
+-- embedding_status：0 待计算，1 已写入 Redis，2 重试后仍失败；已有数据的 embedding 均已写入，默认值为 1
+-- embedding_hash：最近一次写入的 embedding 对应的 SHA1(question + answer)，用于任务幂等和过期判断
+USE langsistance_db;
+
+ALTER TABLE knowledge
+    ADD COLUMN embedding_status TINYINT UNSIGNED NOT NULL DEFAULT 1 AFTER embedding_id,
+    ADD COLUMN embedding_hash CHAR(40) NOT NULL DEFAULT '' AFTER embedding_status,
+    ADD KEY idx_embedding_status_id (embedding_status, id);
@@ -1,5 +1,6 @@
 from typing import Dict, Any
 import json
+import asyncio
 from pydantic import BaseModel, Field
 
 from sources.knowledge.knowledge import get_redis_connection, get_knowledge_tool
@@ -8,10 +9,12 @@ from sources.agents.agent import Agent
 from sources.tools.mcpFinder import MCP_finder
 from sources.memory import Memory
 from sources.logger import Logger
+from sources.callback.stream_metrics import stream_metrics
 
 from langchain_core.tools import StructuredTool
 
 import os
+import threading
 import time
 
 # 定义参数模型
@@ -42,6 +45,8 @@ class GeneralAgent(Agent):
         self.enabled = True
         self.knowledgeTool = {}
         self.logger = Logger("general_agent.log")
+        # 请求被放弃（客户端断开）时设置，让在线程池中等待工具响应的调用立即结束
+        self.cancel_event = threading.Event()
 
     def get_api_keys(self) -> dict:
         """
@@ -55,6 +60,10 @@ class GeneralAgent(Agent):
             "mcp_finder": api_key_mcp_finder
         }
     
+    def cancel(self) -> None:
+        """停止正在等待的工具调用"""
+        self.cancel_event.set()
+
     def set_knowledge_tool(self, knowledge_tool: Dict[str, Any]) -> None:
         """
         设置知识工具字典
@@ -211,8 +220,11 @@ class GeneralAgent(Agent):
                                 if response_value is not None:
                                     # 成功获取到响应值
                                     return response_value
-                                # 等待1秒后再次尝试
-                                time.sleep(interval)
+                                # 等待1秒后再次尝试，请求被取消时立即结束
+                                if self.cancel_event.wait(interval):
+                                    self.logger.info(f"Tool wait cancelled - query id is {query_id}")
+                                    stream_metrics.record("tool_waits_cancelled")
+                                    return None
                                 elapsed += interval
 
                             # 超时未获取到响应值
@@ -246,7 +258,7 @@ class GeneralAgent(Agent):
     async def process(self,user_id, prompt, query_id, speech_module) -> str | tuple[str, str]:
         if not self.enabled:
             return "general Agent is disabled."
-        self.knowledgeTool = get_knowledge_tool(user_id,  prompt)
+        self.knowledgeTool = await asyncio.to_thread(get_knowledge_tool, user_id, prompt)
         # user_prompt = self.expand_prompt(prompt)
         user_prompt = self.generate_user_prompt(prompt, user_id, query_id)
         system_prompt = self.generate_system_prompt()
@@ -270,7 +282,7 @@ class GeneralAgent(Agent):
         return answer, reasoning
 
     async def create_agent(self, user_id, prompt, query_id, callback_handler):
-        self.knowledgeTool = get_knowledge_tool(user_id,  prompt)
+        self.knowledgeTool = await asyncio.to_thread(get_knowledge_tool, user_id, prompt)
         user_prompt = self.generate_user_prompt(prompt, user_id, query_id)
         system_prompt = self.generate_system_prompt()
         self.memory.reset([])
@@ -1,21 +1,99 @@
 from langchain_core.callbacks.base import AsyncCallbackHandler
 import asyncio
+import os
+from typing import Optional
+
+# 以这些字符结尾的 token 立即发送，句子不会被时间窗口拖住
+SENTENCE_ENDINGS = frozenset("。！？；…\n.!?;")
+
+# token 合并的默认配置：时间窗口（毫秒，0 表示不合并，每个 token 一帧）、字节上限、是否在句末立即发送
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", 30))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", 256))
+SSE_FLUSH_ON_SENTENCE = os.getenv("SSE_FLUSH_ON_SENTENCE", "true").lower() in ("1", "true", "yes")
 
 
 class SSECallbackHandler(AsyncCallbackHandler):
-    """自定义异步回调处理器"""
+    """
+    自定义异步回调处理器
+
+    合并模式下 token 先写入缓冲区，满足任一条件时作为一个 token 事件放入队列：
+    第一个 token 进入缓冲区后经过 coalesce_ms、缓冲区达到 coalesce_bytes 字节、或 token 以句末标点结尾。
+    每个事件对应一个 SSE 帧，合并后帧数和写入次数按合并的 token 数成比例下降，拼接后的文本不变。
+    其他事件（结束、错误）放入队列前先发送缓冲区，保证顺序。
 
-    def __init__(self, queue: asyncio.Queue):
+    队列有界时，消费端（SSE 写出）跟不上会让 token 回调在 put 上等待，从而放慢对模型流式响应的读取；
+    定时器触发时队列已满则推迟到下一个时间窗口。
+    """
+
+    def __init__(self, queue: asyncio.Queue, coalesce_ms: Optional[float] = None,
+                 coalesce_bytes: Optional[int] = None, flush_on_sentence: Optional[bool] = None):
         super().__init__()
         self.queue = queue
+        self.coalesce_seconds = (SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms) / 1000
+        self.coalesce_bytes = SSE_COALESCE_BYTES if coalesce_bytes is None else coalesce_bytes
+        self.flush_on_sentence = SSE_FLUSH_ON_SENTENCE if flush_on_sentence is None else flush_on_sentence
+        self.pending = []
+        self.pending_bytes = 0
+        self.flush_timer: Optional[asyncio.TimerHandle] = None
+        self.backpressure_waits = 0
+
+    def _take_pending(self) -> Optional[dict]:
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if not self.pending:
+            return None
+        content = "".join(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+        return {
+            'type': 'token',
+            'content': content
+        }
+
+    def _flush_on_timer(self) -> None:
+        self.flush_timer = None
+        if not self.pending:
+            return
+        if self.queue.full():
+            self.flush_timer = asyncio.get_running_loop().call_later(self.coalesce_seconds, self._flush_on_timer)
+            return
+        self.queue.put_nowait(self._take_pending())
+
+    async def _put(self, event: dict) -> None:
+        if self.queue.full():
+            self.backpressure_waits += 1
+        await self.queue.put(event)
+
+    async def flush(self) -> None:
+        """立即发送缓冲区中的 token"""
+        event = self._take_pending()
+        if event is not None:
+            await self._put(event)
+
+    async def put_event(self, event: dict) -> None:
+        """先发送缓冲区再放入非 token 事件"""
+        await self.flush()
+        await self._put(event)
 
     async def on_llm_new_token(self, token: str, **kwargs) -> None:
         """每个 token 生成时触发 - 最重要！"""
-        if token:
-            await self.queue.put({
+        if not token:
+            return
+        if self.coalesce_seconds <= 0:
+            await self._put({
                 'type': 'token',
                 'content': token
             })
+            return
+
+        self.pending.append(token)
+        self.pending_bytes += len(token.encode("utf-8"))
+        if self.pending_bytes >= self.coalesce_bytes or (
+                self.flush_on_sentence and token.rstrip(" ")[-1:] in SENTENCE_ENDINGS):
+            await self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = asyncio.get_running_loop().call_later(self.coalesce_seconds, self._flush_on_timer)
 
     async def on_tool_start(
             self,
@@ -72,7 +150,7 @@ class SSECallbackHandler(AsyncCallbackHandler):
         # })
 
     async def on_agent_finish(self, finish, **kwargs):
-        await self.queue.put({
+        await self.put_event({
             'type': 'end',
             'content': ''
         })
\ No newline at end of file
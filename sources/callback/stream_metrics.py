@@ -0,0 +1,48 @@
+import threading
+from typing import Dict
+
+
+class StreamMetrics:
+    """
+    /query_stream 的流统计，线程安全（工具等待在线程池中上报）
+
+    disconnected：生成过程中客户端断开的流；cancelled_agents：因断开被取消、仍在运行的 agent 任务；
+    cancelled_agent_seconds：被取消的 agent 已运行的总秒数；tool_waits_cancelled：提前结束的工具轮询；
+    backpressure_waits：发送队列已满、token 回调等待消费端的次数。
+    """
+
+    COUNTERS = ("started", "completed", "failed", "disconnected", "cancelled_agents", "tool_waits_cancelled",
+                "backpressure_waits")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self.cancelled_agent_seconds = 0.0
+        self.active = 0
+
+    def record(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def stream_started(self) -> None:
+        with self.lock:
+            self.counters["started"] += 1
+            self.active += 1
+
+    def stream_finished(self) -> None:
+        with self.lock:
+            self.active -= 1
+
+    def agent_cancelled(self, seconds: float) -> None:
+        with self.lock:
+            self.counters["cancelled_agents"] += 1
+            self.cancelled_agent_seconds += seconds
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counters, active=self.active,
+                        cancelled_agent_seconds=round(self.cancelled_agent_seconds, 3))
+
+
+# 进程内共享的统计
+stream_metrics = StreamMetrics()
@@ -0,0 +1,29 @@
+import os
+
+from celery import Celery
+
+
+def default_broker_url() -> str:
+    """与 sources.redis_pool 使用同一个 Redis，CELERY_BROKER_URL 可以覆盖"""
+    host = os.getenv("REDIS_HOST") or "localhost"
+    port = os.getenv("REDIS_PORT") or 6379
+    return f"redis://{host}:{port}/{os.getenv('CELERY_REDIS_DB', 0)}"
+
+
+# 后台任务应用；worker 启动方式：celery -A sources.celery_app worker
+# 任务模块只在 worker 中通过 include 导入，API 进程按任务名称 send_task，不依赖任务实现
+celery_app = Celery(
+    "tasks",
+    broker=os.getenv("CELERY_BROKER_URL", default_broker_url()),
+    backend=os.getenv("CELERY_RESULT_BACKEND", default_broker_url()),
+    include=["sources.knowledge.embedding_tasks"],
+)
+celery_app.conf.update(
+    task_track_started=True,
+    # 任务执行完成后才确认，worker 崩溃时任务会重新投递（任务本身是幂等的）
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", 4)),
+    result_expires=3600,
+    broker_connection_retry_on_startup=True,
+)
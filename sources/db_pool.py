@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from pymysql.constants import SERVER_STATUS
+
+from sources.logger import Logger
+
+logger = Logger("db_pool.log")
+
+
+class PoolTimeoutError(Exception):
+    """在 checkout_timeout 内没有可用连接"""
+
+
+class PooledConnection:
+    """
+    连接池中的一个 PyMySQL 连接
+
+    除 close() 以外的属性和方法都直接转发给底层连接，因此原有的
+    conn = get_db_connection() ... conn.close() 写法不需要修改，close() 只是把连接还回连接池。
+    也可以作为上下文管理器使用，退出时自动归还。
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = time.monotonic()
+        self._last_used = self._created_at
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self) -> None:
+        """归还连接；重复调用是安全的"""
+        if self._checked_out:
+            self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # 调用方忘记 close() 时也不要让连接池泄漏
+        if getattr(self, "_checked_out", False):
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """
+    有界、线程安全的数据库连接池
+
+    - 最多 max_size 个连接，没有空闲连接时等待 checkout_timeout 秒后抛出 PoolTimeoutError
+    - 连接存活超过 max_lifetime 秒后关闭重建，避免被 MySQL 的 wait_timeout 或代理断开
+    - 空闲超过 health_check_interval 秒的连接在借出前先 ping 一次，失效的连接直接丢弃
+    - 归还时回滚未结束的事务，保证下一个使用者不会读到旧的 REPEATABLE READ 快照
+    """
+
+    def __init__(self, factory: Callable, max_size: int = 10, max_lifetime: float = 3600,
+                 checkout_timeout: float = 10, health_check_interval: float = 30):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.idle: List[PooledConnection] = []
+        self.total = 0
+        self.in_use = 0
+        self.waiters = 0
+        self.condition = threading.Condition()
+        self.checkouts = 0
+        self.created = 0
+        self.closed = 0
+        self.timeouts = 0
+        self.wait_times = deque(maxlen=1000)
+        self.total_wait = 0.0
+
+    def _close_raw(self, connection: PooledConnection) -> None:
+        try:
+            connection._raw.close()
+        except Exception:
+            pass
+
+    def _discard(self, connection: PooledConnection) -> None:
+        self._close_raw(connection)
+        with self.condition:
+            self.total -= 1
+            self.closed += 1
+            self.condition.notify()
+
+    def _is_healthy(self, connection: PooledConnection, now: float) -> bool:
+        if now - connection._created_at > self.max_lifetime:
+            return False
+        if now - connection._last_used > self.health_check_interval:
+            try:
+                connection._raw.ping(reconnect=False)
+            except Exception as e:
+                logger.error(f"Discarding broken pooled connection: {str(e)}")
+                return False
+        return True
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        """借出一个连接，超时抛出 PoolTimeoutError"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            create = False
+            with self.condition:
+                while not self.idle and self.total >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(f"no database connection available within {timeout}s "
+                                               f"(pool size {self.max_size})")
+                    self.waiters += 1
+                    try:
+                        self.condition.wait(remaining)
+                    finally:
+                        self.waiters -= 1
+                if self.idle:
+                    connection = self.idle.pop()
+                else:
+                    self.total += 1
+                    create = True
+
+            if create:
+                try:
+                    connection = PooledConnection(self, self.factory())
+                except Exception:
+                    with self.condition:
+                        self.total -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.created += 1
+            elif not self._is_healthy(connection, time.monotonic()):
+                self._discard(connection)
+                continue
+
+            waited = time.monotonic() - start
+            with self.condition:
+                self.in_use += 1
+                self.checkouts += 1
+                self.total_wait += waited
+                self.wait_times.append(waited)
+            connection._checked_out = True
+            return connection
+
+    def release(self, connection: PooledConnection) -> None:
+        """归还连接；连接已断开或仍有未读完的流式结果时直接关闭"""
+        connection._checked_out = False
+        with self.condition:
+            self.in_use -= 1
+        raw = connection._raw
+        try:
+            result = getattr(raw, "_result", None)
+            if not raw.open or (result is not None and getattr(result, "unbuffered_active", False)):
+                self._discard(connection)
+                return
+            if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                raw.rollback()
+        except Exception as e:
+            logger.error(f"Discarding pooled connection on release: {str(e)}")
+            self._discard(connection)
+            return
+        connection._last_used = time.monotonic()
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """with pool.connection() as conn: ... 退出时自动归还"""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def close_all(self) -> None:
+        """关闭所有空闲连接（借出中的连接归还后正常回到池中）"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.total -= len(idle)
+            self.closed += len(idle)
+        for connection in idle:
+            self._close_raw(connection)
+
+    def stats(self) -> Dict:
+        with self.condition:
+            waits = sorted(self.wait_times)
+            return {
+                "max_size": self.max_size,
+                "size": self.total,
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+                "waiters": self.waiters,
+                "checkouts": self.checkouts,
+                "created": self.created,
+                "closed": self.closed,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": self.total_wait / self.checkouts * 1000 if self.checkouts else 0,
+                "wait_ms_p99": waits[int(len(waits) * 0.99)] * 1000 if waits else 0,
+            }
@@ -0,0 +1,430 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from sources.knowledge.vector_index import normalize_rows, top_k_indices
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+SNAPSHOT_VERSION = 1
+
+
+class _InvertedList:
+    """IVF 的一个倒排桶：连续的归一化向量矩阵 + 对应的知识ID"""
+
+    __slots__ = ("vectors", "ids", "size")
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, knowledge_ids: np.ndarray, vectors: np.ndarray) -> int:
+        """追加一批向量，返回第一条的行号"""
+        needed = self.size + len(knowledge_ids)
+        if needed > self.vectors.shape[0]:
+            capacity = max(needed, self.vectors.shape[0] * 2)
+            grown_vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown_ids = np.zeros(capacity, dtype=np.int64)
+            grown_vectors[:self.size] = self.vectors[:self.size]
+            grown_ids[:self.size] = self.ids[:self.size]
+            self.vectors, self.ids = grown_vectors, grown_ids
+        start = self.size
+        self.vectors[start:needed] = vectors
+        self.ids[start:needed] = knowledge_ids
+        self.size = needed
+        return start
+
+    def remove_row(self, row: int) -> Optional[int]:
+        """删除一行，用最后一行填补空位；返回被移动的知识ID"""
+        last = self.size - 1
+        moved_id = None
+        if row != last:
+            moved_id = int(self.ids[last])
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = moved_id
+        self.size = last
+        return moved_id
+
+
+class IVFFlatIndex:
+    """
+    基于 numpy 的 IVF-Flat 近似最近邻索引（余弦相似度）
+
+    向量归一化后按球面 k-means 的质心分到 nlist 个倒排桶中，检索时只扫描与问题最接近的
+    nprobe 个桶。桶内保存原始 float32 向量，得分是精确的点积，召回损失只来自没有探测到的桶。
+    训练前（或数据量太少时）只有一个桶，等价于暴力检索。
+    """
+
+    def __init__(self, dim: Optional[int] = None, nprobe: int = 8):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[_InvertedList] = []
+        self.locations: Dict[int, Tuple[int, int]] = {}
+        self.trained_size = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __contains__(self, knowledge_id) -> bool:
+        return knowledge_id in self.locations
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else self.centroids.shape[0]
+
+    def _assign(self, vectors: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(vectors.shape[0], dtype=np.int64)
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ self.centroids.T, axis=1)
+        return assignments
+
+    def _check_dim(self, vectors: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = vectors.shape[-1]
+        if vectors.shape[-1] != self.dim:
+            raise ValueError(f"embedding dim {vectors.shape[-1]} does not match index dim {self.dim}")
+        if not self.lists:
+            self.lists = [_InvertedList(self.dim)]
+
+    def add(self, knowledge_id: int, embedding) -> None:
+        """新增或替换一条向量"""
+        self.add_many([knowledge_id], np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+
+    def add_many(self, knowledge_ids: List[int], embeddings) -> None:
+        """批量新增或替换向量，质心分配用一次矩阵乘法完成，同一个桶的向量一次性追加"""
+        ids = np.asarray(knowledge_ids, dtype=np.int64).reshape(-1)
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        # 同一批次里重复的ID只保留最后一条
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        ids, vectors = ids[keep], vectors[keep]
+        with self.lock:
+            self._check_dim(vectors)
+            for knowledge_id in ids.tolist():
+                if knowledge_id in self.locations:
+                    self._remove(knowledge_id)
+            assignments = self._assign(vectors)
+            order = np.argsort(assignments, kind="stable")
+            list_nos, starts = np.unique(assignments[order], return_index=True)
+            for list_no, begin, end in zip(list_nos.tolist(), starts.tolist(), starts[1:].tolist() + [len(order)]):
+                rows = order[begin:end]
+                first_row = self.lists[list_no].extend(ids[rows], vectors[rows])
+                for offset, knowledge_id in enumerate(ids[rows].tolist()):
+                    self.locations[knowledge_id] = (list_no, first_row + offset)
+
+    def _remove(self, knowledge_id: int) -> bool:
+        location = self.locations.pop(knowledge_id, None)
+        if location is None:
+            return False
+        list_no, row = location
+        moved_id = self.lists[list_no].remove_row(row)
+        if moved_id is not None:
+            self.locations[moved_id] = (list_no, row)
+        return True
+
+    def remove(self, knowledge_id: int) -> bool:
+        with self.lock:
+            return self._remove(int(knowledge_id))
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """按桶顺序返回所有 (ids, 归一化向量) 的拷贝"""
+        with self.lock:
+            if not self.lists:
+                return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+            ids = np.concatenate([inverted.ids[:inverted.size] for inverted in self.lists])
+            vectors = np.concatenate([inverted.vectors[:inverted.size] for inverted in self.lists])
+            return ids, vectors
+
+    def needs_training(self, min_train_size: int = 1024, growth: float = 4.0) -> bool:
+        """数据量足够但尚未训练，或相比上次训练增长了 growth 倍时需要（重新）训练"""
+        size = len(self)
+        if self.centroids is None:
+            return size >= min_train_size
+        return size >= self.trained_size * growth
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, sample_size: int = 32, seed: int = 0) -> None:
+        """
+        用当前所有向量训练质心并重新分桶
+
+        Args:
+            nlist: 桶数量，默认 4*sqrt(n)
+            iterations: k-means 迭代次数
+            sample_size: 每个桶最多抽样多少向量参与训练
+            seed: 随机种子
+        """
+        ids, vectors = self.vectors()
+        if len(ids) == 0:
+            return
+        nlist = nlist or int(4 * np.sqrt(len(ids)))
+        nlist = max(1, min(nlist, len(ids)))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(ids), size=min(len(ids), nlist * sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind="stable")
+            list_nos, starts = np.unique(assignments[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[list_nos] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = ~sums.any(axis=1)
+            # 空桶重新随机取一个样本作为质心
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        with self.lock:
+            # k-means 在锁外进行，期间的增删已经写入旧的桶，这里取最新数据重新分桶
+            ids, vectors = self.vectors()
+            self.centroids = centroids
+            self.lists = [_InvertedList(self.dim) for _ in range(nlist)]
+            self.locations = {}
+            self.trained_size = len(ids)
+            self.add_many(ids.tolist(), vectors)
+
+    def search(self, query_embedding, top_k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        检索最相似的知识
+
+        Returns:
+            List[Tuple[int, float]]: 按相似度降序排列的 (知识ID, 相似度)
+        """
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        with self.lock:
+            if not self.locations or query.shape[0] != self.dim or not query.any():
+                return []
+            if self.centroids is None:
+                probes = [0]
+            else:
+                probes = top_k_indices(self.centroids @ query, nprobe or self.nprobe)
+            candidate_ids = []
+            candidate_scores = []
+            for list_no in probes:
+                inverted = self.lists[list_no]
+                if inverted.size:
+                    candidate_ids.append(inverted.ids[:inverted.size])
+                    candidate_scores.append(inverted.vectors[:inverted.size] @ query)
+            if not candidate_ids:
+                return []
+            ids = np.concatenate(candidate_ids)
+            scores = np.concatenate(candidate_scores)
+            return [(int(ids[i]), float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    def save(self, path: str, **metadata) -> None:
+        """以 npz 快照保存到磁盘（先写临时文件再原子替换）"""
+        with self.lock:
+            ids, vectors = self.vectors()
+            list_sizes = np.asarray([inverted.size for inverted in self.lists], dtype=np.int64)
+            centroids = self.centroids if self.centroids is not None else np.empty((0, self.dim or 0), dtype=np.float32)
+            trained_size = self.trained_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 多个 worker 可能同时重建并保存同一个快照，临时文件按进程区分，避免互相覆盖
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.{os.getpid()}.", suffix=".tmp",
+                                        dir=directory or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    version=SNAPSHOT_VERSION,
+                    centroids=centroids,
+                    ids=ids,
+                    vectors=vectors,
+                    list_sizes=list_sizes,
+                    trained_size=trained_size,
+                    nprobe=self.nprobe,
+                    **{f"meta_{key}": value for key, value in metadata.items()}
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["IVFFlatIndex", Dict]:
+        """从 npz 快照恢复索引，返回 (索引, 保存时附带的 metadata)"""
+        with np.load(path) as snapshot:
+            if int(snapshot["version"]) != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {int(snapshot['version'])}")
+            vectors = snapshot["vectors"]
+            centroids = snapshot["centroids"]
+            index = cls(dim=vectors.shape[1] if vectors.ndim == 2 and vectors.shape[1] else None, nprobe=int(snapshot["nprobe"]))
+            index.trained_size = int(snapshot["trained_size"])
+            metadata = {key[len("meta_"):]: snapshot[key].item() for key in snapshot.files if key.startswith("meta_")}
+            ids = snapshot["ids"]
+            list_sizes = snapshot["list_sizes"]
+        if index.dim is None:
+            return index, metadata
+        if len(centroids):
+            index.centroids = centroids
+        index.lists = []
+        offset = 0
+        for list_no, size in enumerate(list_sizes):
+            inverted = _InvertedList(index.dim, capacity=max(16, int(size)))
+            inverted.vectors[:size] = vectors[offset:offset + size]
+            inverted.ids[:size] = ids[offset:offset + size]
+            inverted.size = int(size)
+            index.lists.append(inverted)
+            for row, knowledge_id in enumerate(ids[offset:offset + size].tolist()):
+                index.locations[knowledge_id] = (list_no, row)
+            offset += size
+        return index, metadata
+
+
+class PublicKnowledgeIndex:
+    """
+    公开知识的全局 ANN 索引管理器
+
+    第一次检索时优先从磁盘快照恢复，再通过 delta_loader 追平快照之后的变更；
+    没有可用快照时通过 loader 全量构建。之后由知识的增删改接口增量维护，
+    变更积累到一定时间后在后台重新训练（数据量明显增长时）并写新的快照。
+    """
+
+    def __init__(self,
+                 loader: Callable[[], Iterable[Tuple[List[int], np.ndarray]]],
+                 delta_loader: Callable[[float], Tuple[Dict[int, np.ndarray], List[int]]],
+                 clock: Callable[[], float] = time.time,
+                 snapshot_path: Optional[str] = None,
+                 nprobe: int = 16,
+                 snapshot_interval: float = 300,
+                 min_train_size: int = 1024):
+        self.loader = loader
+        self.delta_loader = delta_loader
+        self.clock = clock
+        self.snapshot_path = snapshot_path
+        self.nprobe = nprobe
+        self.snapshot_interval = snapshot_interval
+        self.min_train_size = min_train_size
+        self.index: Optional[IVFFlatIndex] = None
+        self.lock = threading.Lock()
+        self.maintenance_lock = threading.Lock()
+        self.dirty = 0
+        self.last_snapshot = 0.0
+        self.built_at = 0.0
+
+    def is_loaded(self) -> bool:
+        return self.index is not None
+
+    def get(self) -> IVFFlatIndex:
+        index = self.index
+        if index is not None:
+            return index
+        with self.lock:
+            if self.index is None:
+                self.index = self._restore() or self._build()
+            return self.index
+
+    def _restore(self) -> Optional[IVFFlatIndex]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            start = time.perf_counter()
+            index, metadata = IVFFlatIndex.load(self.snapshot_path)
+            index.nprobe = self.nprobe
+            # 快照时间来自数据库时钟，多减一分钟覆盖写入与快照之间的竞争
+            since = float(metadata.get("built_at", 0)) - 60
+            built_at = self.clock()
+            upserts, removed = self.delta_loader(since)
+            for knowledge_id in removed:
+                index.remove(knowledge_id)
+            if upserts:
+                index.add_many(list(upserts.keys()), np.stack(list(upserts.values())))
+            self.built_at = built_at
+            self.last_snapshot = time.monotonic()
+            logger.info(f"Restored public ANN index from {self.snapshot_path} with {len(index)} vectors "
+                        f"({len(upserts)} upserts, {len(removed)} removals) in {time.perf_counter() - start:.2f}s")
+            return index
+        except Exception as e:
+            logger.error(f"Failed to restore public ANN index snapshot: {str(e)}")
+            return None
+
+    def _build(self) -> IVFFlatIndex:
+        start = time.perf_counter()
+        built_at = self.clock()
+        index = IVFFlatIndex(nprobe=self.nprobe)
+        for ids, embeddings in self.loader():
+            if len(ids):
+                index.add_many(ids, embeddings)
+        if index.needs_training(self.min_train_size):
+            index.train()
+        self.built_at = built_at
+        logger.info(f"Built public ANN index with {len(index)} vectors, nlist={index.nlist} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        self._save(index)
+        return index
+
+    def _save(self, index: IVFFlatIndex) -> None:
+        if not self.snapshot_path:
+            return
+        try:
+            index.save(self.snapshot_path, built_at=self.built_at)
+            self.last_snapshot = time.monotonic()
+        except Exception as e:
+            logger.error(f"Failed to save public ANN index snapshot: {str(e)}")
+
+    def search(self, query_embedding, top_k: int = 10) -> List[Tuple[int, float]]:
+        return self.get().search(query_embedding, top_k)
+
+    def upsert(self, knowledge_id: int, embedding) -> None:
+        """增量写入；索引尚未加载时忽略，加载时会从数据库或快照追平"""
+        index = self.index
+        if index is None:
+            return
+        index.add(knowledge_id, embedding)
+        self._changed()
+
+    def remove(self, knowledge_id: int) -> None:
+        index = self.index
+        if index is None:
+            return
+        if index.remove(knowledge_id):
+            self._changed()
+
+    def contains(self, knowledge_id: int) -> bool:
+        index = self.index
+        return index is not None and knowledge_id in index
+
+    def _changed(self) -> None:
+        self.dirty += 1
+        if time.monotonic() - self.last_snapshot >= self.snapshot_interval and not self.maintenance_lock.locked():
+            threading.Thread(target=self.maintain, name="public-ann-maintenance", daemon=True).start()
+
+    def maintain(self) -> None:
+        """按需重新训练并保存快照，在后台线程中执行"""
+        index = self.index
+        if index is None or not self.maintenance_lock.acquire(blocking=False):
+            return
+        try:
+            built_at = self.clock()
+            self.dirty = 0
+            if index.needs_training(self.min_train_size):
+                index.train()
+                logger.info(f"Retrained public ANN index with {len(index)} vectors, nlist={index.nlist}")
+            self.built_at = built_at
+            self._save(index)
+        except Exception as e:
+            logger.error(f"Error maintaining public ANN index: {str(e)}")
+        finally:
+            self.maintenance_lock.release()
+
+    def stats(self) -> Dict:
+        index = self.index
+        if index is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "vectors": len(index),
+            "nlist": index.nlist,
+            "nprobe": index.nprobe,
+            "pending_changes": self.dirty,
+        }
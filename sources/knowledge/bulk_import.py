@@ -0,0 +1,152 @@
+import codecs
+import csv
+import json
+from typing import Dict, List, Optional, Tuple
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+# 导入记录的字段名与 create_knowledge 请求一致，同时接受下划线写法
+FIELD_ALIASES = {
+    "question": "question",
+    "description": "description",
+    "answer": "answer",
+    "public": "public",
+    "modelName": "model_name",
+    "model_name": "model_name",
+    "toolId": "tool_id",
+    "tool_id": "tool_id",
+    "params": "params",
+}
+
+# 解析结果：(数据行号, 记录, 错误)，记录和错误只有一个不为空
+ParsedRow = Tuple[int, Optional[Dict], Optional[str]]
+
+
+class ImportParser:
+    """
+    NDJSON / CSV 的增量解析器
+
+    请求体按块 feed 进来，只缓存最后一个不完整的行（CSV 为不完整的带引号字段），
+    内存占用与文件大小无关。CSV 第一行为表头。
+    """
+
+    def __init__(self, fmt: str):
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"unsupported import format {fmt}")
+        self.fmt = fmt
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self.buffer = ""
+        # CSV 中跨行的记录（引号内包含换行）
+        self.pending = ""
+        self.header: Optional[List[str]] = None
+        self.row = 0
+
+    def feed(self, chunk: bytes) -> List[ParsedRow]:
+        self.buffer += self.decoder.decode(chunk)
+        return self._drain(final=False)
+
+    def close(self) -> List[ParsedRow]:
+        self.buffer += self.decoder.decode(b"", final=True)
+        rows = self._drain(final=True)
+        if self.pending.strip():
+            rows.append(self._parse_csv(self.pending))
+            self.pending = ""
+        return rows
+
+    def _drain(self, final: bool) -> List[ParsedRow]:
+        lines = self.buffer.split("\n")
+        self.buffer = "" if final else lines.pop()
+        rows = []
+        for line in lines:
+            if self.fmt == "ndjson":
+                if line.strip():
+                    rows.append(self._parse_json(line))
+                continue
+            self.pending += line + "\n"
+            # 引号成对出现时记录才完整
+            if self.pending.count('"') % 2 == 0:
+                record, self.pending = self.pending, ""
+                if record.strip():
+                    parsed = self._parse_csv(record)
+                    if parsed is not None:
+                        rows.append(parsed)
+        return rows
+
+    def _parse_json(self, line: str) -> ParsedRow:
+        self.row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return self.row, None, f"invalid JSON: {str(e)}"
+        if not isinstance(record, dict):
+            return self.row, None, "each line must be a JSON object"
+        return self.row, record, None
+
+    def _parse_csv(self, record: str) -> Optional[ParsedRow]:
+        try:
+            values = next(csv.reader([record]))
+        except (csv.Error, StopIteration) as e:
+            self.row += 1
+            return self.row, None, f"invalid CSV: {str(e)}"
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        self.row += 1
+        if len(values) != len(self.header):
+            return self.row, None, f"expected {len(self.header)} columns, got {len(values)}"
+        return self.row, dict(zip(self.header, values)), None
+
+
+def validate_import_record(record: Dict) -> Tuple[Optional[Dict], List[str]]:
+    """
+    校验一条导入记录，规则与 create_knowledge 接口相同
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: (规范化后的知识数据, 错误列表)，有错误时数据为 None
+    """
+    data = {field: record[name] for name, field in FIELD_ALIASES.items() if record.get(name) not in (None, "")}
+    errors = []
+
+    question = str(data.get("question", ""))
+    description = str(data.get("description", ""))
+    answer = str(data.get("answer", ""))
+    model_name = str(data.get("model_name", "gpt-4o-mini"))
+    params = data.get("params", "")
+    if not isinstance(params, str):
+        params = json.dumps(params, ensure_ascii=False)
+
+    if not question or len(question) > 100:
+        errors.append("question is required and must be no more than 100 characters")
+    if len(description) > 5000:
+        errors.append("description is required and must be no more than 5000 characters")
+    if not answer or len(answer) > 5000:
+        errors.append("answer is required and must be no more than 5000 characters")
+    if len(model_name) > 200:
+        errors.append("modelName must be no more than 200 characters")
+    if len(params) > 5000:
+        errors.append("params must be no more than 5000 characters")
+
+    try:
+        tool_id = int(data["tool_id"])
+    except (KeyError, TypeError, ValueError):
+        tool_id = 0
+    if tool_id <= 0:
+        errors.append("toolId is required")
+    try:
+        public = int(data.get("public", 1))
+    except (TypeError, ValueError):
+        public = 0
+    if public not in (1, 2):
+        errors.append("public must be 1 or 2")
+
+    if errors:
+        return None, errors
+    return {
+        "question": question,
+        "description": description,
+        "answer": answer,
+        "public": public,
+        "model_name": model_name,
+        "tool_id": tool_id,
+        "params": params,
+    }, []
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from sources.knowledge.embedding_codec import encode_embedding, decode_embedding
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+
+def normalize_text(text: str) -> str:
+    """缓存键使用的文本归一化：NFKC、去掉首尾空白、合并连续空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """
+    两级 embedding 缓存：进程内有界 LRU + Redis（带 TTL）
+
+    缓存键为 (model, sha256(归一化文本))。本地未命中时查 Redis，Redis 也未命中
+    才调用 compute 请求 embedding 接口，并回填两级缓存。Redis 不可用时只使用本地缓存。
+    返回的向量是只读的 float32 数组，多个调用方共享同一份数据。
+    """
+
+    def __init__(self, compute: Callable[[str], object], model: str, max_size: int = 4096,
+                 redis_factory: Optional[Callable] = None, ttl: int = 604800):
+        self.compute = compute
+        self.model = model
+        self.max_size = max_size
+        self.redis_factory = redis_factory
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.redis_conn = None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    def cache_key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"embedding_cache:{self.model}:{digest}"
+
+    def _get_redis(self):
+        if self.redis_conn is None and self.redis_factory is not None:
+            self.redis_conn = self.redis_factory()
+        return self.redis_conn
+
+    def _get_local(self, key: str) -> Optional[np.ndarray]:
+        with self.lock:
+            embedding = self.entries.get(key)
+            if embedding is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return embedding
+
+    def _put_local(self, key: str, embedding: np.ndarray) -> None:
+        with self.lock:
+            self.entries[key] = embedding
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def _get_remote(self, key: str) -> Optional[np.ndarray]:
+        try:
+            redis_conn = self._get_redis()
+            raw = redis_conn.get(key) if redis_conn is not None else None
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Embedding cache Redis read failed: {str(e)}")
+            return None
+        if not raw:
+            return None
+        embedding, _ = decode_embedding(raw)
+        with self.lock:
+            self.redis_hits += 1
+        return embedding
+
+    def _put_remote(self, key: str, embedding: np.ndarray) -> None:
+        try:
+            redis_conn = self._get_redis()
+            if redis_conn is not None:
+                redis_conn.set(key, encode_embedding(embedding, self.model), ex=self.ttl)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Embedding cache Redis write failed: {str(e)}")
+
+    def get(self, text: str) -> np.ndarray:
+        """获取文本的 embedding，优先走缓存"""
+        key = self.cache_key(text)
+        embedding = self._get_local(key)
+        if embedding is not None:
+            return embedding
+
+        embedding = self._get_remote(key)
+        if embedding is None:
+            with self.lock:
+                self.misses += 1
+            embedding = np.asarray(self.compute(text), dtype=np.float32)
+            embedding.setflags(write=False)
+            self._put_remote(key, embedding)
+        self._put_local(key, embedding)
+        return embedding
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "redis_errors": self.redis_errors,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,63 @@
+import json
+import struct
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+# 二进制 embedding 格式（小端）：
+#   magic(4s) | version(uint8) | model_len(uint8) | dim(uint32) | model(utf-8) | float32 * dim
+EMBEDDING_MAGIC = b"LSEM"
+EMBEDDING_CODEC_VERSION = 1
+_HEADER = struct.Struct("<4sBBI")
+
+
+def encode_embedding(embedding, model: str) -> bytes:
+    """
+    将 embedding 编码为带版本头的小端 float32 二进制
+
+    Args:
+        embedding: embedding 向量（list 或 numpy 数组）
+        model: 生成该向量的 embedding 模型名称
+
+    Returns:
+        bytes: 可直接写入 Redis 的二进制数据
+    """
+    vector = np.asarray(embedding, dtype="<f4").reshape(-1)
+    model_bytes = model.encode("utf-8")
+    if len(model_bytes) > 255:
+        raise ValueError("embedding model name must be no more than 255 bytes")
+    header = _HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_CODEC_VERSION, len(model_bytes), vector.shape[0])
+    return header + model_bytes + vector.tobytes()
+
+
+def is_binary_embedding(raw: Union[bytes, str, None]) -> bool:
+    """判断 Redis 中的值是否已经是二进制格式"""
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:4]) == EMBEDDING_MAGIC
+
+
+def decode_embedding(raw: Union[bytes, str]) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    解码 Redis 中的 embedding，同时兼容迁移前的文本格式 str(list)
+
+    二进制格式通过 np.frombuffer 零拷贝解码，返回的数组是只读视图。
+
+    Args:
+        raw: Redis 中读取到的原始值
+
+    Returns:
+        Tuple[np.ndarray, Optional[str]]: float32 向量和模型名称（旧文本格式没有模型信息，返回 None）
+    """
+    if is_binary_embedding(raw):
+        magic, version, model_len, dim = _HEADER.unpack_from(raw, 0)
+        if version != EMBEDDING_CODEC_VERSION:
+            raise ValueError(f"Unsupported embedding codec version: {version}")
+        model_start = _HEADER.size
+        data_start = model_start + model_len
+        model = bytes(raw[model_start:data_start]).decode("utf-8")
+        vector = np.frombuffer(raw, dtype="<f4", count=dim, offset=data_start)
+        return vector, model
+
+    # 迁移前的文本格式：str(list) 形如 "[0.1, -0.2, ...]"，是合法的 JSON
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw).decode("utf-8")
+    return np.asarray(json.loads(raw), dtype=np.float32), None
@@ -0,0 +1,233 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+# knowledge.embedding_status 的取值
+EMBEDDING_PENDING = 0
+EMBEDDING_READY = 1
+EMBEDDING_FAILED = 2
+
+# Celery 任务名称，API 进程通过 send_task 按名称投递
+EMBED_KNOWLEDGE_TASK = "knowledge.embed_knowledge"
+
+# embedding 写入 Redis 后发布通知的频道，各 API 进程据此更新常驻索引
+EMBEDDING_READY_CHANNEL = "knowledge_embedding_ready"
+
+
+def knowledge_embedding_text(question: Optional[str], answer: Optional[str]) -> str:
+    """知识 embedding 的输入文本"""
+    return (question or "") + (answer or "")
+
+
+def knowledge_content_hash(question: Optional[str], answer: Optional[str]) -> str:
+    """知识内容的 SHA1，作为 embedding 任务的幂等键"""
+    return hashlib.sha1(knowledge_embedding_text(question, answer).encode("utf-8")).hexdigest()
+
+
+def embedding_lock_key(knowledge_id: int) -> str:
+    """计算同一条知识 embedding 的互斥锁"""
+    return f"embedding_lock:{knowledge_id}"
+
+
+class EmbeddingLockBusy(Exception):
+    """同一条知识的 embedding 正在由其他任务计算"""
+
+
+class EmbeddingPipeline:
+    """
+    知识 embedding 的后台计算流水线
+
+    写接口只负责把知识记录为 embedding_status=0 并调用 schedule，立即返回；
+    embedding 由 Celery worker（mode=celery）或进程内线程池（mode=inline，以及 broker 不可用时的兜底）计算。
+
+    幂等：任务以 (知识ID, 内容 SHA1) 标识。投递前用 Redis SET NX 记录幂等键，相同内容重复投递只执行一次；
+    执行时持有该知识的 Redis 锁，重新读取知识记录，内容已变化（有更新的任务）或 embedding 已是该内容的
+    则直接跳过，因此任务可以安全地重试和重复投递。
+    """
+
+    def __init__(self, redis_factory: Callable, load_row: Callable[[int], Optional[Dict]],
+                 embed: Callable[[str], object], store: Callable[[int, object], None],
+                 mark: Callable[[int, int, str], None], on_ready: Optional[Callable[[Dict], None]] = None,
+                 send_task: Optional[Callable] = None, mode: str = "celery", inline_workers: int = 2,
+                 max_retries: int = 5, idempotency_ttl: int = 3600, lock_timeout: int = 60,
+                 lock_wait_timeout: float = 600):
+        """
+        Args:
+            redis_factory: 返回 decode_responses=True 的 Redis 客户端
+            load_row: 按ID读取知识记录（question、answer、status、user_id、embedding_status、embedding_hash），不存在时返回 None
+            embed: 计算文本的 embedding
+            store: 把 embedding 写入 Redis
+            mark: 更新知识记录的 (embedding_status, embedding_hash)
+            on_ready: embedding 写入后的回调，参数为知识记录
+            send_task: celery_app.send_task；为空时只使用进程内线程池
+            max_retries: 计算失败（接口限流、Redis/MySQL 暂时不可用）的重试次数，等待锁的重试不计入
+            lock_wait_timeout: 同一知识的锁被其他任务持有时最多等待的秒数，超过后标记失败
+        """
+        self.redis_factory = redis_factory
+        self.load_row = load_row
+        self.embed = embed
+        self.store = store
+        self.mark = mark
+        self.on_ready = on_ready
+        self.send_task = send_task
+        self.mode = mode
+        self.max_retries = max_retries
+        self.idempotency_ttl = idempotency_ttl
+        self.lock_timeout = lock_timeout
+        self.lock_wait_timeout = lock_wait_timeout
+        self.inline_workers = inline_workers
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.counters = {"scheduled": 0, "deduplicated": 0, "inline": 0, "ready": 0, "skipped": 0, "failed": 0}
+
+    def _count(self, name: str) -> None:
+        with self.executor_lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def idempotency_key(knowledge_id: int, content_hash: str) -> str:
+        return f"embedding_task:{knowledge_id}:{content_hash}"
+
+    @staticmethod
+    def task_id(knowledge_id: int, content_hash: str) -> str:
+        return f"embed-knowledge-{knowledge_id}-{content_hash}"
+
+    def schedule(self, knowledge_id: int, question: Optional[str], answer: Optional[str]) -> bool:
+        """
+        投递一条知识的 embedding 任务
+
+        Returns:
+            bool: 是否投递；相同内容的任务已在队列中时返回 False
+        """
+        content_hash = knowledge_content_hash(question, answer)
+        try:
+            if not self.redis_factory().set(self.idempotency_key(knowledge_id, content_hash), 1,
+                                            nx=True, ex=self.idempotency_ttl):
+                self._count("deduplicated")
+                return False
+        except Exception as e:
+            # Redis 不可用时仍然投递，重复执行由任务内的内容校验保证幂等
+            logger.warning(f"Failed to record embedding task key for knowledge {knowledge_id}: {str(e)}")
+
+        self._count("scheduled")
+        if self.mode == "celery" and self.send_task is not None:
+            try:
+                self.send_task(EMBED_KNOWLEDGE_TASK, args=[knowledge_id, content_hash],
+                               task_id=self.task_id(knowledge_id, content_hash), retry=False)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to enqueue embedding task for knowledge {knowledge_id}, running inline: {str(e)}")
+        self._submit_inline(knowledge_id, content_hash)
+        return True
+
+    def _submit_inline(self, knowledge_id: int, content_hash: str) -> None:
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.inline_workers, thread_name_prefix="embedding-task")
+            self.counters["inline"] += 1
+        self.executor.submit(self.run_inline, knowledge_id, content_hash)
+
+    def lock_retry_delay(self, busy_seconds: float) -> Optional[float]:
+        """
+        锁被占用时下次重试前等待的秒数
+
+        旧内容的任务可能在整个 embedding 请求期间持有锁，等待锁不占用 max_retries，而是按总等待时间限制。
+
+        Args:
+            busy_seconds: 从第一次遇到锁被占用起已经等待的秒数
+
+        Returns:
+            Optional[float]: 等待秒数，超过 lock_wait_timeout 时返回 None
+        """
+        if busy_seconds >= self.lock_wait_timeout:
+            return None
+        return min(max(busy_seconds, 1), 10)
+
+    def run_inline(self, knowledge_id: int, content_hash: str) -> None:
+        """进程内执行任务，失败时按指数退避重试，锁被占用时按 lock_retry_delay 等待"""
+        failures = 0
+        busy_since = None
+        while True:
+            try:
+                self.process(knowledge_id, content_hash)
+                return
+            except EmbeddingLockBusy as e:
+                if busy_since is None:
+                    busy_since = time.monotonic()
+                delay = self.lock_retry_delay(time.monotonic() - busy_since)
+                if delay is None:
+                    self.fail(knowledge_id, content_hash, e)
+                    return
+                time.sleep(delay)
+            except Exception as e:
+                if failures == self.max_retries:
+                    self.fail(knowledge_id, content_hash, e)
+                    return
+                time.sleep(min(2 ** failures, 60))
+                failures += 1
+
+    def process(self, knowledge_id: int, content_hash: str) -> str:
+        """
+        计算并写入一条知识的 embedding，失败时抛出异常由调用方重试
+
+        Returns:
+            str: ready（已写入）、stale（内容已变化）、skipped（知识已删除或 embedding 已是最新）
+        """
+        redis_conn = self.redis_factory()
+        lock = redis_conn.lock(embedding_lock_key(knowledge_id), timeout=self.lock_timeout, blocking_timeout=1)
+        if not lock.acquire():
+            raise EmbeddingLockBusy(f"embedding of knowledge {knowledge_id} is being computed")
+        try:
+            row = self.load_row(knowledge_id)
+            if row is None or row["status"] != 1:
+                outcome = "skipped"
+            elif knowledge_content_hash(row["question"], row["answer"]) != content_hash:
+                outcome = "stale"
+            elif row["embedding_status"] == EMBEDDING_READY and row["embedding_hash"] == content_hash:
+                outcome = "skipped"
+            else:
+                embedding = self.embed(knowledge_embedding_text(row["question"], row["answer"]))
+                self.store(knowledge_id, embedding)
+                self.mark(knowledge_id, EMBEDDING_READY, content_hash)
+                outcome = "ready"
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                logger.warning(f"Failed to release embedding lock of knowledge {knowledge_id}: {str(e)}")
+
+        self._count("ready" if outcome == "ready" else "skipped")
+        self._finish(knowledge_id, content_hash)
+        if outcome == "ready" and self.on_ready is not None:
+            try:
+                self.on_ready(row)
+            except Exception as e:
+                logger.error(f"Embedding ready callback failed for knowledge {knowledge_id}: {str(e)}")
+        logger.info(f"Embedding task for knowledge {knowledge_id} finished: {outcome}")
+        return outcome
+
+    def fail(self, knowledge_id: int, content_hash: str, error: Exception) -> None:
+        """重试用尽后标记失败，读取方或重建索引任务可以再次投递"""
+        self._count("failed")
+        logger.error(f"Embedding task for knowledge {knowledge_id} failed: {str(error)}")
+        try:
+            self.mark(knowledge_id, EMBEDDING_FAILED, content_hash)
+        except Exception as e:
+            logger.error(f"Failed to mark embedding failure of knowledge {knowledge_id}: {str(e)}")
+        self._finish(knowledge_id, content_hash)
+
+    def _finish(self, knowledge_id: int, content_hash: str) -> None:
+        try:
+            self.redis_factory().delete(self.idempotency_key(knowledge_id, content_hash))
+        except Exception as e:
+            logger.warning(f"Failed to clear embedding task key for knowledge {knowledge_id}: {str(e)}")
+
+    def stats(self) -> Dict:
+        with self.executor_lock:
+            return dict(self.counters, mode=self.mode)
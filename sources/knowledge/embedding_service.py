@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+
+class EmbeddingBatcher:
+    """
+    合并并发 embedding 请求的微批处理客户端
+
+    调用方提交文本后等待 Future；后台线程在第一个请求到达后再等待 window_ms，
+    把这段时间内的所有文本合并成一次 embeddings.create(input=[...]) 请求，
+    再把结果分发回各个调用方。排队中或请求中的相同文本共享同一个 Future（single-flight）。
+    """
+
+    def __init__(self, client, model: str, window_ms: float = 5, max_batch_size: int = 256, max_concurrent_batches: int = 4):
+        self.client = client
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue: List[str] = []
+        self.pending: Dict[str, Future] = {}
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="embedding-batch")
+        self.worker = None
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.api_errors = 0
+        self.max_batch_seen = 0
+
+    def _ensure_worker(self) -> None:
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self.worker.start()
+
+    def submit(self, text: str) -> Future:
+        """提交一个文本，返回在批次完成后得到 embedding 的 Future"""
+        if not text or not text.strip():
+            # 空文本会让整批请求失败，直接拒绝
+            future = Future()
+            future.set_exception(ValueError("embedding input must not be empty"))
+            return future
+        with self.condition:
+            self.requests += 1
+            future = self.pending.get(text)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = Future()
+            self.pending[text] = future
+            self.queue.append(text)
+            self._ensure_worker()
+            self.condition.notify()
+            return future
+
+    def embed(self, text: str, timeout: float = None) -> List[float]:
+        """同步获取单个文本的 embedding"""
+        return self.submit(text).result(timeout)
+
+    async def aembed(self, text: str) -> List[float]:
+        """在事件循环中获取单个文本的 embedding，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_many(self, texts: List[str], timeout: float = None) -> List[List[float]]:
+        """批量获取多个文本的 embedding，结果顺序与输入一致"""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self.queue) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.queue[:self.max_batch_size]
+                del self.queue[:len(batch)]
+            self.executor.submit(self._flush, batch)
+
+    def _flush(self, batch: List[str]) -> None:
+        with self.condition:
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            futures = [self.pending[text] for text in batch]
+        try:
+            response = self.client.embeddings.create(model=self.model, input=batch)
+            embeddings = [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+            if len(embeddings) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(embeddings)}")
+        except Exception as e:
+            with self.condition:
+                self.api_errors += 1
+            logger.error(f"Error in embedding batch of {len(batch)}: {str(e)}")
+            if len(batch) > 1 and getattr(e, "status_code", None) == 400:
+                # 单个非法输入（如超长文本）不应拖累同批次的其他请求，拆成单条重试
+                for text in batch:
+                    self._flush([text])
+                return
+            self._release(batch)
+            for future in futures:
+                future.set_exception(e)
+            return
+        self._release(batch)
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(embedding)
+
+    def _release(self, batch: List[str]) -> None:
+        # 请求完成前到达的相同文本会复用进行中的 Future，完成后才移除
+        with self.condition:
+            for text in batch:
+                self.pending.pop(text, None)
+
+    def stats(self) -> Dict:
+        with self.condition:
+            return {
+                "requests": self.requests,
+                "deduplicated": self.deduplicated,
+                "batches": self.batches,
+                "api_errors": self.api_errors,
+                "max_batch": self.max_batch_seen,
+                "queued": len(self.queue),
+            }
@@ -0,0 +1,216 @@
+import atexit
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+
+class MmapEmbeddingStore:
+    """
+    冷用户向量矩阵的磁盘存储
+
+    所有用户的归一化 float32 矩阵按段追加写入同一个文件，内存中只保留每个用户的
+    段位置和知识ID，读取时通过 np.memmap 映射对应区间，由操作系统按需分页。
+    旧段在用户重新写入或失效后成为垃圾，垃圾达到一半时整体压缩。
+    这是内存索引的溢出层而不是数据源：进程启动时清空，数据始终可以从 MySQL/Redis 重建。
+    """
+
+    def __init__(self, path: str, compact_ratio: float = 0.5, min_compact_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+        # {user_id: (字节偏移, 行数, 维度, 知识ID数组)}
+        self.segments: Dict[str, Tuple[int, int, int, np.ndarray]] = {}
+        self.file_bytes = 0
+        self.live_bytes = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        open(path, "wb").close()
+        atexit.register(self.close)
+
+    def __contains__(self, user_id) -> bool:
+        return str(user_id) in self.segments
+
+    def write(self, user_id, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """追加写入用户的矩阵，替换该用户之前的段"""
+        user_id = str(user_id)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.array(ids, dtype=np.int64)
+        with self.lock:
+            self._drop(user_id)
+            if len(ids) == 0:
+                return
+            with open(self.path, "ab") as f:
+                f.write(vectors.tobytes())
+            self.segments[user_id] = (self.file_bytes, len(ids), vectors.shape[1], ids)
+            self.file_bytes += vectors.nbytes
+            self.live_bytes += vectors.nbytes
+            if self.file_bytes >= self.min_compact_bytes and self.live_bytes <= self.file_bytes * self.compact_ratio:
+                self._compact()
+
+    def read(self, user_id) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        读取用户的矩阵
+
+        Returns:
+            Optional[Tuple[np.ndarray, np.ndarray]]: (知识ID数组, 只读 memmap 矩阵)，没有段时返回 None
+        """
+        with self.lock:
+            segment = self.segments.get(str(user_id))
+            if segment is None:
+                return None
+            offset, rows, dim, ids = segment
+            vectors = np.memmap(self.path, dtype=np.float32, mode="r", offset=offset, shape=(rows, dim))
+            return ids, vectors
+
+    def discard(self, user_id) -> None:
+        """用户数据在冷态下发生变化时丢弃其段，下次加载时从 MySQL/Redis 重建"""
+        with self.lock:
+            self._drop(str(user_id))
+
+    def _drop(self, user_id: str) -> None:
+        segment = self.segments.pop(user_id, None)
+        if segment is not None:
+            _, rows, dim, _ = segment
+            self.live_bytes -= rows * dim * 4
+
+    def _compact(self) -> None:
+        tmp_path = f"{self.path}.compact"
+        segments = {}
+        offset = 0
+        with open(tmp_path, "wb") as f:
+            for user_id, (old_offset, rows, dim, ids) in self.segments.items():
+                vectors = np.memmap(self.path, dtype=np.float32, mode="r", offset=old_offset, shape=(rows, dim))
+                f.write(np.asarray(vectors).tobytes())
+                segments[user_id] = (offset, rows, dim, ids)
+                offset += rows * dim * 4
+        os.replace(tmp_path, self.path)
+        logger.info(f"Compacted embedding store from {self.file_bytes} to {offset} bytes")
+        self.segments = segments
+        self.file_bytes = offset
+        self.live_bytes = offset
+
+    def close(self) -> None:
+        """进程退出时删除存储文件"""
+        with self.lock:
+            self.segments.clear()
+            self.file_bytes = self.live_bytes = 0
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "users": len(self.segments),
+                "file_bytes": self.file_bytes,
+                "live_bytes": self.live_bytes,
+            }
+
+
+class MmapRowStore:
+    """
+    按知识ID存取 float32 原始向量的磁盘行存储，供量化索引精确重排使用
+
+    每次写入都追加到文件末尾，内存中只保留 ID 到行号的映射；读取时通过 np.memmap 随机访问
+    候选行，只有被访问的页会进入内存。被覆盖或删除的行成为垃圾，垃圾达到一半时整体压缩。
+    与 MmapEmbeddingStore 一样是进程内缓存层，启动时清空。
+    """
+
+    def __init__(self, path: str, compact_ratio: float = 0.5, min_compact_rows: int = 16384):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        self.dim: Optional[int] = None
+        self.rows: Dict[int, int] = {}
+        self.file_rows = 0
+        self.mapped = None
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb+")
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def put_many(self, keys, vectors: np.ndarray) -> None:
+        """追加写入一批向量，已存在的键指向新行"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"vector dim {vectors.shape[1]} does not match store dim {self.dim}")
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(vectors.tobytes())
+            for offset, key in enumerate(keys):
+                self.rows[int(key)] = self.file_rows + offset
+            self.file_rows += len(keys)
+            if self.file_rows >= self.min_compact_rows and len(self.rows) <= self.file_rows * self.compact_ratio:
+                self._compact()
+
+    def get_many(self, keys) -> Optional[np.ndarray]:
+        """读取一批向量，任何一个键不存在时返回 None"""
+        with self.lock:
+            try:
+                rows = [self.rows[int(key)] for key in keys]
+            except KeyError:
+                return None
+            if not rows:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            if self.mapped is None or self.mapped.shape[0] < max(rows, default=-1) + 1:
+                self.file.flush()
+                self.mapped = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.file_rows, self.dim))
+            return np.asarray(self.mapped[rows])
+
+    def delete(self, keys) -> None:
+        with self.lock:
+            for key in keys:
+                self.rows.pop(int(key), None)
+
+    def _compact(self) -> None:
+        self.file.flush()
+        current = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.file_rows, self.dim))
+        keys = list(self.rows)
+        live = np.asarray(current[[self.rows[key] for key in keys]]) if keys else np.zeros((0, self.dim), dtype=np.float32)
+        del current
+        self.file.close()
+        tmp_path = f"{self.path}.compact"
+        with open(tmp_path, "wb") as f:
+            f.write(live.tobytes())
+        os.replace(tmp_path, self.path)
+        logger.info(f"Compacted row store from {self.file_rows} to {len(keys)} rows")
+        self.file = open(self.path, "rb+")
+        self.rows = {key: row for row, key in enumerate(keys)}
+        self.file_rows = len(keys)
+        self.mapped = None
+
+    def close(self) -> None:
+        """进程退出时删除存储文件"""
+        with self.lock:
+            self.rows.clear()
+            self.mapped = None
+            if not self.file.closed:
+                self.file.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "rows": len(self.rows),
+                "file_rows": self.file_rows,
+                "file_bytes": self.file_rows * (self.dim or 0) * 4,
+            }
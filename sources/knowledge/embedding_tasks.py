@@ -0,0 +1,39 @@
+import time
+from typing import Optional
+
+from sources.celery_app import celery_app
+from sources.knowledge.embedding_pipeline import EMBED_KNOWLEDGE_TASK, EmbeddingLockBusy
+from sources.knowledge.knowledge import embedding_pipeline
+
+
+# 重试次数由任务自己计数：等待锁的重试不占用计算失败的 max_retries
+@celery_app.task(name=EMBED_KNOWLEDGE_TASK, bind=True, max_retries=None)
+def embed_knowledge(self, knowledge_id: int, content_hash: str, failures: int = 0,
+                    busy_since: Optional[float] = None) -> str:
+    """
+    计算并写入一条知识的 embedding（在 Celery worker 中执行）
+
+    同一知识正在计算时按 embedding_pipeline.lock_retry_delay 稍后重试，总等待超过 lock_wait_timeout 后标记失败；
+    其他异常（embedding 接口限流、Redis/MySQL 暂时不可用）按指数退避重试，重试 max_retries 次后把知识标记为
+    embedding_status=2。标记失败时同时清除幂等键，之后可以重新投递。
+
+    Args:
+        failures: 已经因计算失败重试的次数
+        busy_since: 第一次遇到锁被占用的时间戳
+    """
+    try:
+        return embedding_pipeline.process(knowledge_id, content_hash)
+    except EmbeddingLockBusy as e:
+        if busy_since is None:
+            busy_since = time.time()
+        delay = embedding_pipeline.lock_retry_delay(time.time() - busy_since)
+        if delay is None:
+            embedding_pipeline.fail(knowledge_id, content_hash, e)
+            raise
+        raise self.retry(exc=e, countdown=delay, kwargs={"failures": failures, "busy_since": busy_since})
+    except Exception as e:
+        if failures >= embedding_pipeline.max_retries:
+            embedding_pipeline.fail(knowledge_id, content_hash, e)
+            raise
+        raise self.retry(exc=e, countdown=min(2 ** failures, 60),
+                         kwargs={"failures": failures + 1, "busy_since": busy_since})
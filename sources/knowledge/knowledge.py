@@ -1,18 +1,32 @@
 import os
 import json
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 import numpy as np
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterable, List, Optional, Tuple, Any
 from pydantic import BaseModel
-from sklearn.metrics.pairwise import cosine_similarity
 
 from sources.logger import Logger
 import pymysql
 import pymysql.cursors
-import redis
 
 from sources.utility import pretty_print
+from sources.db_pool import ConnectionPool
+from sources.redis_pool import get_redis_client, set_many
+from sources.celery_app import celery_app
+from sources.pagination import CountCache
+from sources.text_search import TextSearch
+from sources.knowledge.vector_index import UserVectorIndex, VectorIndexManager
+from sources.knowledge.ann_index import PublicKnowledgeIndex
+from sources.knowledge.embedding_store import MmapEmbeddingStore, MmapRowStore
+from sources.knowledge.embedding_codec import encode_embedding, decode_embedding
+from sources.knowledge.embedding_cache import EmbeddingCache
+from sources.knowledge.embedding_service import EmbeddingBatcher
+from sources.knowledge.embedding_pipeline import EmbeddingPipeline, EMBEDDING_PENDING, EMBEDDING_READY, \
+    EMBEDDING_READY_CHANNEL, knowledge_content_hash, knowledge_embedding_text
 
 # 设置 OpenAI API 密钥
 client = OpenAI(
@@ -20,6 +34,15 @@ client = OpenAI(
     # base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com")  # 设置基础 URL
 )
 
+# 知识 embedding 使用的模型，写入 Redis 的二进制头中会记录该名称
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# 批量读取 embedding 时每次 MGET 的键数量
+EMBEDDING_FETCH_CHUNK_SIZE = int(os.getenv("EMBEDDING_FETCH_CHUNK_SIZE", 500))
+
+# 构建索引时与 MySQL 查询并行读取 Redis 的线程池
+embedding_fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embedding-fetch")
+
 # 存储用户知识库 {user_id: [{"id": str, "question": str, "answer": str, "embedding": list, "params": dict}]}
 user_knowledge_bases: Dict[str, List[Dict]] = {}
 
@@ -68,64 +91,59 @@ class ToolItem(BaseModel):
     update_time: Optional[str] = None
 
 
-def get_embedding(text: str) -> List[float]:
-    """使用 OpenAI 获取文本的嵌入向量"""
+# 合并并发的 embedding 请求，在短时间窗口内批量调用 OpenAI
+embedding_batcher = EmbeddingBatcher(
+    client,
+    EMBEDDING_MODEL,
+    window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 5)),
+    max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 256))
+)
+
+
+def request_embedding(text: str) -> List[float]:
+    """请求 OpenAI 获取文本的嵌入向量（不经过缓存，并发请求会被合并成批）"""
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return embedding_batcher.embed(text)
     except Exception as e:
         logger.error(f"Error in get_embedding: {str(e)}")
         raise e
 
-def get_user_vector_indices(user_id: str, embeddings_list: List, knowledge_items: List[Dict]):
 
-    user_vector_indices = {user_id: {
-        "embeddings": np.array(embeddings_list) if embeddings_list else np.array([]),
-        "items": knowledge_items
-    }}
-    return user_vector_indices
+# 问题/知识文本的 embedding 缓存：进程内 LRU + Redis
+embedding_cache = EmbeddingCache(
+    request_embedding,
+    EMBEDDING_MODEL,
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 4096)),
+    redis_factory=lambda: get_redis_connection(decode_responses=False),
+    ttl=int(os.getenv("EMBEDDING_CACHE_TTL", 604800))
+)
 
-def search_knowledge_base(user_id: str, query_embedding: List[float], user_vector_indices: Dict, top_k: int = 3, threshold: float = 0):
-    """在用户知识库中搜索最相关的内容"""
-    if user_id not in user_vector_indices or len(user_vector_indices[user_id]["embeddings"]) == 0:
-        return []
 
-    # 计算余弦相似度
-    similarities = cosine_similarity(
-        [query_embedding],
-        user_vector_indices[user_id]["embeddings"]
-    )[0]
-    logger.info(f"similarities: {similarities}")
-    # 获取最相似的结果
+def get_embedding(text: str) -> np.ndarray:
+    """使用 OpenAI 获取文本的嵌入向量，相同文本命中缓存时不再请求接口"""
+    return embedding_cache.get(text)
+
+def get_user_vector_indices(user_id: str, embeddings_list: List, knowledge_items: List) -> Dict[str, UserVectorIndex]:
+    """用一组 embedding 和知识构建临时的用户向量索引"""
+    index = UserVectorIndex()
+    for embedding, item in zip(embeddings_list, knowledge_items):
+        index.upsert(item, embedding)
+    return {user_id: index}
+
+def search_knowledge_base(user_id: str, query_embedding: List[float], user_vector_indices: Dict, top_k: int = 3,
+                          threshold: float = 0, query_text: Optional[str] = None):
+    """在用户知识库中搜索最相关的内容；提供问题原文时使用向量 + BM25 混合检索"""
+    if user_id not in user_vector_indices:
+        return []
+    index = user_vector_indices[user_id]
+    if not query_text:
+        return index.search(query_embedding, top_k, threshold)
     results = []
-    for i, similarity in enumerate(similarities):
-        if similarity >= threshold:
-            # 由于items中存储的是KnowledgeItem对象，我们需要创建一个新的字典来存储相似度
-            item = user_vector_indices[user_id]["items"][i]
-            # 创建一个包含KnowledgeItem字段和相似度的新字典
-            result_item = {
-                "id": item.id,
-                "user_id": item.user_id,
-                "question": item.question,
-                "description": item.description,
-                "answer": item.answer,
-                "public": item.public,
-                "model_name": item.model_name,
-                "tool_id": item.tool_id,
-                "params": item.params,
-                "create_time": item.create_time,
-                "update_time": item.update_time,
-                "similarity": float(similarity)
-            }
-            results.append(result_item)
-            logger.info(f"item:{result_item}")
-    logger.info(f"results: {results}")
-    # 按相似度排序并返回前top_k个结果
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:top_k]
+    for item, similarity in index.hybrid_search_items(query_embedding, query_text, top_k, threshold):
+        result_item = item.dict()
+        result_item["similarity"] = similarity
+        results.append(result_item)
+    return results
 
 
 def generate_answer_with_context(question: str, context: List[Dict]) -> str:
@@ -161,8 +179,8 @@ def generate_answer_with_context(question: str, context: List[Dict]) -> str:
     except Exception as e:
         return f"生成答案时出错: {str(e)}"
 
-def get_db_connection():
-    """创建并返回数据库连接"""
+def create_db_connection():
+    """创建一个新的数据库连接（只由连接池调用）"""
     db_config = {
         'host': os.getenv('MYSQL_HOST', 'langsistance_db'),
         'port' : int(os.getenv('MYSQL_PORT', 3306)),
@@ -174,19 +192,184 @@ def get_db_connection():
     }
     return pymysql.connect(**db_config)
 
-def get_redis_connection():
-    """创建并返回 Redis 连接"""
-    # 优先从环境变量获取 Redis 配置
-    redis_host = os.getenv('REDIS_HOST')
-    redis_port = int(os.getenv('REDIS_PORT'))
-    logger.info(f"redis_host: {redis_host}, redis_port: {redis_port}")
-    try:
-        return redis.Redis(host=redis_host, port=redis_port, decode_responses=True, socket_connect_timeout=10, socket_timeout=10)
-    except Exception as e:
-        logger.error(f"Failed to create Redis connection: {str(e)}")
-        raise e
+
+# 进程内共享的数据库连接池
+db_pool = ConnectionPool(
+    create_db_connection,
+    max_size=int(os.getenv('MYSQL_POOL_SIZE', 10)),
+    max_lifetime=float(os.getenv('MYSQL_POOL_MAX_LIFETIME', 3600)),
+    checkout_timeout=float(os.getenv('MYSQL_POOL_TIMEOUT', 10)),
+    health_check_interval=float(os.getenv('MYSQL_POOL_HEALTH_CHECK_INTERVAL', 30)),
+)
+
+
+def get_db_connection():
+    """从连接池借出数据库连接，调用 close() 归还"""
+    return db_pool.acquire()
+
+
+def db_connection():
+    """
+    借出数据库连接的上下文管理器
+
+    with db_connection() as connection:
+        ...
+    """
+    return db_pool.connection()
+
+def get_redis_connection(decode_responses: bool = True):
+    """
+    返回进程内共享的 Redis 客户端，底层连接由 sources.redis_pool 的连接池统一管理
+
+    Args:
+        decode_responses: 读取二进制 embedding 时需要传 False
+    """
+    return get_redis_client(decode_responses)
+
+
+# 列表接口的总数缓存，写入时按作用域失效
+count_cache = CountCache(get_redis_connection, ttl=int(os.getenv("COUNT_CACHE_TTL", 300)))
+
+
+# 列表接口的文本搜索（FULLTEXT ngram 索引，LIKE 兜底）
+knowledge_text_search = TextSearch("knowledge", ("question", "description", "answer"))
+tool_text_search = TextSearch("tools", ("title", "description"))
+
+
+def knowledge_count_scope(user_id=None) -> str:
+    """用户知识（或 user_id 为 None 时全部公开知识）的计数作用域"""
+    return f"knowledge:user:{user_id}" if user_id is not None else "knowledge:public"
+
+
+def tool_count_scope(user_id=None) -> str:
+    """用户工具（或 user_id 为 None 时全部公开工具）的计数作用域"""
+    return f"tools:user:{user_id}" if user_id is not None else "tools:public"
+
+
+def share_count_scope(to_user_email: str = None, from_user_id=None) -> str:
+    """收到的分享（按邮箱）或发出的分享（按用户ID）的计数作用域"""
+    return f"shares:to:{to_user_email}" if to_user_email is not None else f"shares:from:{from_user_id}"
+
+
+def invalidate_knowledge_counts(user_id, public: bool = True) -> None:
+    """
+    知识写入后失效列表总数缓存
+
+    Args:
+        user_id: 知识所属用户
+        public: 写入前后都确定不是公开知识时传 False，避免无谓地失效公开知识的计数
+    """
+    scopes = [knowledge_count_scope(user_id)]
+    if public:
+        scopes.append(knowledge_count_scope())
+    count_cache.invalidate(*scopes)
+
+
+def invalidate_tool_counts(user_id, public: bool = True) -> None:
+    """工具写入后失效列表总数缓存，参数含义同 invalidate_knowledge_counts"""
+    scopes = [tool_count_scope(user_id)]
+    if public:
+        scopes.append(tool_count_scope())
+    count_cache.invalidate(*scopes)
+
+
+def knowledge_embedding_key(knowledge_id) -> str:
+    """知识 embedding 在 Redis 中的键"""
+    return f"knowledge_embedding_{knowledge_id}"
 
 
+def store_knowledge_embedding(redis_conn, knowledge_id, embedding) -> str:
+    """以二进制 float32 格式将知识 embedding 写入 Redis，返回使用的键"""
+    redis_key = knowledge_embedding_key(knowledge_id)
+    redis_conn.set(redis_key, encode_embedding(embedding, EMBEDDING_MODEL))
+    return redis_key
+
+
+def load_knowledge_embedding(redis_conn, knowledge_id) -> Optional[np.ndarray]:
+    """
+    从 Redis 读取知识 embedding，兼容迁移前的文本格式
+
+    Args:
+        redis_conn: decode_responses=False 的 Redis 连接
+        knowledge_id: 知识ID
+
+    Returns:
+        Optional[np.ndarray]: float32 向量，不存在时返回 None
+    """
+    raw = redis_conn.get(knowledge_embedding_key(knowledge_id))
+    if not raw:
+        return None
+    embedding, _ = decode_embedding(raw)
+    return embedding
+
+
+def load_knowledge_embeddings(redis_conn, knowledge_ids: List[int], chunk_size: int = EMBEDDING_FETCH_CHUNK_SIZE) -> Dict[int, np.ndarray]:
+    """
+    批量读取知识 embedding，按 chunk_size 分块 MGET 并通过 pipeline 一次往返发送
+
+    Args:
+        redis_conn: decode_responses=False 的 Redis 连接
+        knowledge_ids: 知识ID列表
+        chunk_size: 每个 MGET 的键数量
+
+    Returns:
+        Dict[int, np.ndarray]: 知识ID到向量的映射，Redis 中不存在的ID不会出现在结果中
+    """
+    if not knowledge_ids:
+        return {}
+    pipe = redis_conn.pipeline(transaction=False)
+    for start in range(0, len(knowledge_ids), chunk_size):
+        pipe.mget([knowledge_embedding_key(knowledge_id) for knowledge_id in knowledge_ids[start:start + chunk_size]])
+
+    embeddings = {}
+    values = [value for chunk in pipe.execute() for value in chunk]
+    for knowledge_id, raw in zip(knowledge_ids, values):
+        if raw:
+            embeddings[knowledge_id], _ = decode_embedding(raw)
+    return embeddings
+
+
+def row_to_knowledge_item(row: Dict) -> KnowledgeItem:
+    """将 knowledge 表的一行记录转换为 KnowledgeItem 对象"""
+    return KnowledgeItem(
+        id=row['id'],
+        user_id=str(row['user_id']),
+        question=row['question'],
+        description=row['description'] or "",
+        answer=row['answer'],
+        public=row['public'] or False,
+        model_name=row['model_name'] or "",
+        tool_id=row['tool_id'] or 0,
+        params=row['params'] or "",
+        create_time=row['create_time'].isoformat() if row.get('create_time') else None,
+        update_time=row['update_time'].isoformat() if row.get('update_time') else None
+    )
+
+
+def query_user_knowledge(user_id: str) -> List[KnowledgeItem]:
+    """
+    根据用户ID从数据库查询有效的知识记录，查询失败时抛出异常
+
+    Args:
+        user_id (str): 用户ID
+
+    Returns:
+        List[KnowledgeItem]: 用户的知识记录列表
+    """
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            # 查询用户自己的知识记录 (status=1表示有效)
+            user_knowledge_sql = """
+                SELECT id, user_id, question, description, answer, public, model_name, tool_id, params, create_time, update_time
+                FROM knowledge
+                WHERE status = %s
+                   AND user_id = %s
+                ORDER BY update_time DESC
+            """
+
+            cursor.execute(user_knowledge_sql, (1, user_id))
+            return [row_to_knowledge_item(row) for row in cursor.fetchall()]
+
 
 def get_user_knowledge(user_id: str) -> List[KnowledgeItem]:
     """
@@ -199,47 +382,369 @@ def get_user_knowledge(user_id: str) -> List[KnowledgeItem]:
         List[KnowledgeItem]: 用户的知识记录列表
     """
     try:
-        connection = get_db_connection()
+        return query_user_knowledge(user_id)
+    except Exception as e:
+        pretty_print(f"Error querying user knowledge: {str(e)}", color="error")
+        return []
 
-        try:
-            with connection.cursor() as cursor:
-                # 查询用户自己的知识记录 (status=1表示有效)
-                user_knowledge_sql = """
-                    SELECT id, user_id, question, description, answer, public, model_name, tool_id, params, create_time, update_time
-                    FROM knowledge
-                    WHERE status = %s
-                       AND user_id = %s
-                    ORDER BY update_time DESC
+
+def row_to_tool_item(row: Dict, prefix: str = "") -> Optional[ToolItem]:
+    """将 tools 表的一行记录（或 JOIN 结果中带前缀的列）转换为 ToolItem，工具不存在时返回 None"""
+    if row.get(f'{prefix}id') is None:
+        return None
+    return ToolItem(
+        id=row[f'{prefix}id'],
+        user_id=str(row[f'{prefix}user_id']),
+        title=row[f'{prefix}title'],
+        description=row[f'{prefix}description'],
+        url=row[f'{prefix}url'],
+        status=row[f'{prefix}status'],
+        timeout=row[f'{prefix}timeout'],
+        params=row[f'{prefix}params']
+    )
+
+
+def iter_user_knowledge_chunks(user_id: str, chunk_size: int = EMBEDDING_FETCH_CHUNK_SIZE):
+    """
+    以非缓冲游标分块读取用户的有效知识记录及其关联的工具，查询失败时抛出异常
+
+    工具通过 LEFT JOIN 一并读出，常驻索引检索时不再需要单独查询 tools 表。
+
+    Yields:
+        Tuple[List[KnowledgeItem], Dict[int, Optional[ToolItem]]]: 每块最多 chunk_size 条知识记录，
+        以及这些知识引用的工具（工具不存在或已删除时为 None）
+    """
+    with db_connection() as connection:
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(
                 """
+                SELECT k.id, k.user_id, k.question, k.description, k.answer, k.public, k.model_name, k.tool_id, k.params,
+                       k.create_time, k.update_time,
+                       t.id AS tool_row_id, t.user_id AS tool_row_user_id, t.title AS tool_row_title,
+                       t.description AS tool_row_description, t.url AS tool_row_url, t.status AS tool_row_status,
+                       t.timeout AS tool_row_timeout, t.params AS tool_row_params
+                FROM knowledge k
+                LEFT JOIN tools t ON t.id = k.tool_id AND t.status = 1
+                WHERE k.status = %s
+                   AND k.user_id = %s
+                ORDER BY k.update_time DESC
+                """,
+                (1, user_id)
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                tools = {row['tool_id']: row_to_tool_item(row, "tool_row_") for row in rows if row['tool_id']}
+                yield [row_to_knowledge_item(row) for row in rows], tools
+
+
+# 知识检索是否融合 BM25 关键词检索（与向量检索做 RRF 融合）
+KNOWLEDGE_HYBRID_SEARCH = os.getenv("KNOWLEDGE_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+KNOWLEDGE_HYBRID_CANDIDATES = int(os.getenv("KNOWLEDGE_HYBRID_CANDIDATES", 50))
+
+# 用户索引矩阵的存储精度：float32（默认）、float16 或 int8；量化时原始向量保存在磁盘行存储中用于精确重排
+VECTOR_INDEX_PRECISION = os.getenv("VECTOR_INDEX_PRECISION", "float32")
+VECTOR_INDEX_STORE_DIR = os.getenv("VECTOR_INDEX_STORE_DIR", ".cache/vector_index")
+# 每个进程使用自己的存储文件，多 worker 部署时互不干扰
+exact_embedding_store = MmapRowStore(os.path.join(VECTOR_INDEX_STORE_DIR, f"exact-{os.getpid()}.f32")) \
+    if VECTOR_INDEX_PRECISION != "float32" else None
+
+
+def new_user_vector_index() -> UserVectorIndex:
+    """按配置的精度创建空的用户向量索引"""
+    return UserVectorIndex(
+        precision=VECTOR_INDEX_PRECISION,
+        exact_store=exact_embedding_store,
+        rerank_candidates=int(os.getenv("VECTOR_INDEX_RERANK_CANDIDATES", 32)),
+    )
+
+
+def build_user_vector_index(user_id: str) -> UserVectorIndex:
+    """
+    从 MySQL 和 Redis 完整构建用户的向量索引，供 VectorIndexManager 懒加载使用
+
+    MySQL 结果按块流式读取，每读到一块就把该块的 MGET 交给线程池，
+    Redis 读取与后续 MySQL 结果的传输并行进行。
+    查询失败时抛出异常，避免把空索引常驻到内存中。
+    """
+    redis_conn = get_redis_connection(decode_responses=False)
+    pending = []
+    index = new_user_vector_index()
+    for chunk, tools in iter_user_knowledge_chunks(user_id):
+        future = embedding_fetch_executor.submit(load_knowledge_embeddings, redis_conn, [knowledge.id for knowledge in chunk])
+        pending.append((chunk, future))
+        index.set_tools(tools)
+
+    total = 0
+    for chunk, future in pending:
+        embeddings = future.result()
+        total += len(chunk)
+        found = [knowledge for knowledge in chunk if knowledge.id in embeddings]
+        for knowledge in chunk:
+            if knowledge.id not in embeddings:
+                # embedding 还在后台计算或计算失败：先跳过，补投递任务，写入后由通知加入索引
+                logger.warning(f"No embedding found in Redis for knowledge ID: {knowledge.id}")
+                schedule_knowledge_embedding(knowledge.id, knowledge.question, knowledge.answer)
+        if found:
+            index.extend(found, np.stack([embeddings[knowledge.id] for knowledge in found]))
+
+    logger.info(f"Built vector index for user {user_id} with {len(index)}/{total} embeddings")
+    return index
+
+
+def page_in_user_vector_index(user_id: str, stored_ids: np.ndarray, stored_vectors: np.ndarray) -> UserVectorIndex:
+    """
+    把被驱逐到磁盘的用户索引换入内存
+
+    知识元数据重新从 MySQL 读取，向量从 memmap 段中取出；段中没有的知识（驱逐时 embedding
+    还在后台计算）回退到 Redis 读取。
+    """
+    rows = {knowledge_id: row for row, knowledge_id in enumerate(stored_ids.tolist())}
+    index = new_user_vector_index()
+    missing = []
+    for chunk, tools in iter_user_knowledge_chunks(user_id):
+        index.set_tools(tools)
+        stored = [knowledge for knowledge in chunk if knowledge.id in rows]
+        missing.extend(knowledge for knowledge in chunk if knowledge.id not in rows)
+        if stored:
+            index.extend(stored, stored_vectors[[rows[knowledge.id] for knowledge in stored]], normalized=True)
+
+    if missing:
+        embeddings = load_knowledge_embeddings(get_redis_connection(decode_responses=False), [knowledge.id for knowledge in missing])
+        found = [knowledge for knowledge in missing if knowledge.id in embeddings]
+        if found:
+            index.extend(found, np.stack([embeddings[knowledge.id] for knowledge in found]))
+    logger.info(f"Paged in vector index for user {user_id} with {len(index)} embeddings ({len(missing)} from Redis)")
+    return index
+
+
+# 常驻内存的用户向量索引，由知识增删改接口增量维护；超出内存预算的冷用户溢出到磁盘
+VECTOR_INDEX_MEMORY_BUDGET = int(float(os.getenv("VECTOR_INDEX_MEMORY_BUDGET_MB", 1024)) * 1024 * 1024)
+
+vector_index_manager = VectorIndexManager(
+    build_user_vector_index,
+    store=MmapEmbeddingStore(os.path.join(VECTOR_INDEX_STORE_DIR, f"embeddings-{os.getpid()}.f32")),
+    memory_budget=VECTOR_INDEX_MEMORY_BUDGET,
+    pager=page_in_user_vector_index,
+)
+
+
+# 公开知识的取值（knowledge.public = 2 表示公开）
+PUBLIC_KNOWLEDGE = 2
 
-                cursor.execute(user_knowledge_sql, (1, user_id))
-                user_knowledge_results = cursor.fetchall()
-
-                # 将查询结果转换为KnowledgeItem对象列表
-                knowledge_items = []
-                for row in user_knowledge_results:
-                    knowledge_item = KnowledgeItem(
-                        id=row['id'],
-                        user_id=str(row['user_id']),
-                        question=row['question'],
-                        description=row['description'] or "",
-                        answer=row['answer'],
-                        public=row['public'] or False,
-                        model_name=row['model_name'] or "",
-                        tool_id=row['tool_id'] or 0,
-                        params=row['params'] or "",
-                        create_time=row['create_time'].isoformat() if row['create_time'] else None,
-                        update_time=row['update_time'].isoformat() if row['update_time'] else None
-                    )
-                    knowledge_items.append(knowledge_item)
-
-                return knowledge_items
-        finally:
-            connection.close()
 
+def iter_public_knowledge_embeddings(chunk_size: int = EMBEDDING_FETCH_CHUNK_SIZE):
+    """
+    分块读取所有有效公开知识的ID及其 embedding，供全局 ANN 索引全量构建
+
+    Yields:
+        Tuple[List[int], np.ndarray]: 每块的知识ID和对应的 embedding 矩阵（缺失 embedding 的已跳过）
+    """
+    redis_conn = get_redis_connection(decode_responses=False)
+    with db_connection() as connection:
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute("SELECT id FROM knowledge WHERE status = %s AND public = %s", (1, PUBLIC_KNOWLEDGE))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                embeddings = load_knowledge_embeddings(redis_conn, [row['id'] for row in rows], chunk_size)
+                if embeddings:
+                    yield list(embeddings.keys()), np.stack(list(embeddings.values()))
+
+
+def load_public_knowledge_changes(since: float) -> Tuple[Dict[int, np.ndarray], List[int]]:
+    """
+    读取 since（数据库 UNIX 时间戳）之后变更过的知识，用于从快照恢复后追平
+
+    Returns:
+        Tuple[Dict[int, np.ndarray], List[int]]: 仍然公开的知识 embedding，以及已删除或不再公开的知识ID
+    """
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, status, public FROM knowledge WHERE update_time >= FROM_UNIXTIME(%s)",
+                (max(since, 0),)
+            )
+            rows = cursor.fetchall()
+
+    public_ids = [row['id'] for row in rows if row['status'] == 1 and row['public'] == PUBLIC_KNOWLEDGE]
+    removed = [row['id'] for row in rows if not (row['status'] == 1 and row['public'] == PUBLIC_KNOWLEDGE)]
+    upserts = load_knowledge_embeddings(get_redis_connection(decode_responses=False), public_ids) if public_ids else {}
+    return upserts, removed
+
+
+def database_clock() -> float:
+    """数据库当前的 UNIX 时间戳，快照时间和 update_time 使用同一个时钟比较"""
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT UNIX_TIMESTAMP() AS now")
+            return float(cursor.fetchone()['now'])
+
+
+# 公开知识的全局 ANN 索引，快照保存在本地磁盘，重启时从快照恢复
+public_knowledge_index = PublicKnowledgeIndex(
+    iter_public_knowledge_embeddings,
+    load_public_knowledge_changes,
+    clock=database_clock,
+    snapshot_path=os.getenv("PUBLIC_ANN_SNAPSHOT_PATH", ".cache/public_knowledge_ann.npz"),
+    nprobe=int(os.getenv("PUBLIC_ANN_NPROBE", 16)),
+    snapshot_interval=float(os.getenv("PUBLIC_ANN_SNAPSHOT_INTERVAL", 300)),
+)
+
+
+def sync_public_knowledge(knowledge_id: int, public: int, status: int = 1, embedding=None) -> None:
+    """
+    知识变更后同步全局 ANN 索引
+
+    Args:
+        knowledge_id: 知识ID
+        public: 变更后的 public 字段
+        status: 变更后的 status 字段
+        embedding: 新的 embedding；为空且知识已在索引中时保持原向量，不在索引中时从 Redis 读取
+    """
+    if not public_knowledge_index.is_loaded():
+        return
+    try:
+        if status != 1 or public != PUBLIC_KNOWLEDGE:
+            public_knowledge_index.remove(knowledge_id)
+            return
+        if embedding is None:
+            if public_knowledge_index.contains(knowledge_id):
+                return
+            embedding = load_knowledge_embedding(get_redis_connection(decode_responses=False), knowledge_id)
+            if embedding is None:
+                logger.warning(f"No embedding found in Redis for public knowledge ID: {knowledge_id}")
+                return
+        public_knowledge_index.upsert(knowledge_id, embedding)
     except Exception as e:
-        pretty_print(f"Error querying user knowledge: {str(e)}", color="error")
-        return []
+        logger.error(f"Error syncing public ANN index for knowledge {knowledge_id}: {str(e)}")
+
+
+def load_knowledge_embedding_row(knowledge_id: int) -> Optional[Dict]:
+    """读取 embedding 任务需要的知识字段"""
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, user_id, question, answer, status, embedding_status, embedding_hash
+                FROM knowledge
+                WHERE id = %s
+                """,
+                (knowledge_id,)
+            )
+            return cursor.fetchone()
+
+
+def mark_knowledge_embedding(knowledge_id: int, embedding_status: int, content_hash: str) -> None:
+    """
+    更新知识的 embedding 状态
+
+    只在知识内容仍是 content_hash 对应的内容时更新，避免旧任务覆盖新内容的状态；
+    保持 update_time 不变，后台任务不影响列表排序。
+    """
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE knowledge
+                SET embedding_status = %s, embedding_hash = %s, update_time = update_time
+                WHERE id = %s AND SHA1(CONCAT(question, answer)) = %s
+                """,
+                (embedding_status, content_hash, knowledge_id, content_hash)
+            )
+        connection.commit()
+
+
+def publish_knowledge_embedding_ready(row: Dict) -> None:
+    """通知所有 API 进程知识的 embedding 已写入 Redis"""
+    get_redis_connection().publish(
+        EMBEDDING_READY_CHANNEL,
+        json.dumps({"user_id": str(row["user_id"]), "knowledge_id": row["id"]})
+    )
+
+
+# 知识 embedding 的后台计算：inline（默认，进程内线程池）或 celery（需要运行 celery -A sources.celery_app worker，
+# 没有 worker 时任务会一直留在队列中，新建和修改的知识无法被检索）
+embedding_pipeline = EmbeddingPipeline(
+    get_redis_connection,
+    load_knowledge_embedding_row,
+    get_embedding,
+    lambda knowledge_id, embedding: store_knowledge_embedding(get_redis_connection(), knowledge_id, embedding),
+    mark_knowledge_embedding,
+    on_ready=publish_knowledge_embedding_ready,
+    send_task=celery_app.send_task,
+    mode=os.getenv("EMBEDDING_TASK_MODE", "inline"),
+    inline_workers=int(os.getenv("EMBEDDING_TASK_INLINE_WORKERS", 2)),
+    max_retries=int(os.getenv("EMBEDDING_TASK_MAX_RETRIES", 5)),
+    lock_wait_timeout=float(os.getenv("EMBEDDING_TASK_LOCK_WAIT_TIMEOUT", 600)),
+)
+
+
+def schedule_knowledge_embedding(knowledge_id: int, question: str, answer: str) -> None:
+    """投递知识的 embedding 任务；投递失败只记录日志，不影响写接口"""
+    try:
+        embedding_pipeline.schedule(knowledge_id, question, answer)
+    except Exception as e:
+        logger.error(f"Failed to schedule embedding for knowledge {knowledge_id}: {str(e)}")
+
+
+def apply_knowledge_embedding(user_id: str, knowledge_id: int) -> None:
+    """把后台任务写入 Redis 的 embedding 加入本进程的常驻索引"""
+    if not vector_index_manager.is_loaded(user_id) and not public_knowledge_index.is_loaded():
+        # 未加载的用户可能有驱逐时写入的磁盘段，其中是这条知识的旧向量；丢弃后下次完整构建会从 Redis 读到新的 embedding
+        vector_index_manager.invalidate(user_id)
+        return
+    embedding = load_knowledge_embedding(get_redis_connection(decode_responses=False), knowledge_id)
+    if embedding is None:
+        return
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, user_id, question, description, answer, public, model_name, tool_id, params, create_time, update_time
+                FROM knowledge
+                WHERE id = %s AND status = 1
+                """,
+                (knowledge_id,)
+            )
+            row = cursor.fetchone()
+    if row is None:
+        return
+    vector_index_manager.upsert(user_id, row_to_knowledge_item(row), embedding)
+    sync_public_knowledge(knowledge_id, row['public'], 1, embedding)
+
+
+def listen_knowledge_embeddings(stop: threading.Event) -> None:
+    """订阅 embedding 写入通知并更新常驻索引，连接断开后自动重新订阅"""
+    while not stop.is_set():
+        pubsub = None
+        try:
+            pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(EMBEDDING_READY_CHANNEL)
+            while not stop.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                payload = json.loads(message["data"])
+                try:
+                    apply_knowledge_embedding(payload["user_id"], payload["knowledge_id"])
+                except Exception as e:
+                    logger.error(f"Failed to apply embedding of knowledge {payload['knowledge_id']}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Knowledge embedding listener disconnected: {str(e)}")
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+
+def start_knowledge_embedding_listener() -> threading.Event:
+    """启动后台订阅线程，返回用于停止线程的事件"""
+    stop = threading.Event()
+    threading.Thread(target=listen_knowledge_embeddings, args=(stop,), name="embedding-listener", daemon=True).start()
+    return stop
 
 
 def get_knowledge_tool(user_id: str, question: str, top_k: int = 3, similarity_threshold: float = 0) -> Tuple[
@@ -261,129 +766,37 @@ def get_knowledge_tool(user_id: str, question: str, top_k: int = 3, similarity_t
         query_embedding = get_embedding(question)
         logger.info(f"Generated embedding for question: {question}")
 
-        # 2. 从MySQL查询该用户的所有有效知识记录
-        knowledge_results = get_user_knowledge(user_id)
-
-        if not knowledge_results:
-            logger.info(f"No knowledge records found for user: {user_id}")
-            return None, None
-
-        logger.info(f"Found {len(knowledge_results)} knowledge records for user: {user_id}")
-
-        # 3. 从Redis查询所有知识记录的embedding
-        redis_conn = get_redis_connection()
-        knowledge_embeddings = {}
-
-        for knowledge in knowledge_results:
-            knowledge_id = knowledge.id
-            redis_key = f"knowledge_embedding_{knowledge_id}"
-            embedding_str = redis_conn.get(redis_key)
-            logger.info(f"embedding key is {redis_key}")
-            if embedding_str:
-                # 将字符串转换回embedding列表
-                embedding = eval(embedding_str)  # 注意：在生产环境中应使用更安全的方法如json.loads
-                knowledge_embeddings[knowledge_id] = embedding
-                logger.info(f"Retrieved embedding for knowledge ID: {knowledge_id}")
-            else:
-                logger.warning(f"No embedding found in Redis for knowledge ID: {knowledge_id}")
-
-        # 4. 构建用于相似度计算的数据结构
-        if not knowledge_embeddings:
-            logger.warning("No embeddings found for any knowledge records")
+        # 2. 获取常驻内存的用户向量索引（首次访问时从MySQL和Redis构建）
+        user_index = vector_index_manager.get(user_id)
+        if len(user_index) == 0:
+            logger.info(f"No knowledge embeddings found for user: {user_id}")
             return None, None
 
-        # 构建向量索引数据结构
-        embeddings_list = []
-        knowledge_items = []
-
-        for knowledge in knowledge_results:
-            knowledge_id = knowledge.id
-            if knowledge_id in knowledge_embeddings:
-                embeddings_list.append(knowledge_embeddings[knowledge_id])
-                knowledge_items.append(knowledge)
-
-        if not embeddings_list:
-            logger.warning("No valid embeddings available for similarity calculation")
-            return None, None
-
-        # 构建临时的向量索引用于搜索
-        temp_user_vector_indices = get_user_vector_indices(user_id, embeddings_list, knowledge_items)
-        logger.info(f"temp_user_vector_indices:{temp_user_vector_indices}")
-        # 5. 使用search_knowledge_base方法找出最接近的知识
-        search_results = search_knowledge_base(
-            user_id,  # 使用临时用户ID
-            query_embedding,
-            temp_user_vector_indices,
-            top_k,
-            similarity_threshold
-        )
-        logger.info(f"search_results:{search_results}")
-        # 清理临时向量索引
-        if user_id in temp_user_vector_indices:
-            del temp_user_vector_indices[user_id]
+        # 3. 一次矩阵-向量乘法找出最接近的知识，开启混合检索时再与 BM25 关键词检索结果融合
+        if KNOWLEDGE_HYBRID_SEARCH:
+            search_results = user_index.hybrid_search_items(query_embedding, question, top_k, similarity_threshold,
+                                                            candidates=KNOWLEDGE_HYBRID_CANDIDATES)
+        else:
+            search_results = user_index.search_items(query_embedding, top_k, similarity_threshold)
+        logger.info(f"search_results:{[(knowledge.id, similarity) for knowledge, similarity in search_results]}")
 
         if not search_results:
             logger.info("No matching knowledge found above similarity threshold")
             return None, None
 
         # 获取最相似的知识记录
-        best_knowledge = search_results[0]
+        knowledge_item, _ = search_results[0]
 
-        # 6. 根据知识记录中的tool_id查询对应的工具信息
+        # 4. 工具信息在构建索引时已经通过 JOIN 读出；索引构建后新关联的工具才查询一次数据库并缓存
         tool_info = None
-        if best_knowledge["tool_id"]:
-            try:
-                connection = get_db_connection()
-                try:
-                    with connection.cursor() as cursor:
-                        # 查询工具信息
-                        tool_query_sql = """
-                                         SELECT id, \
-                                                user_id, \
-                                                title, \
-                                                description, \
-                                                url, \
-                                                status, \
-                                                timeout, \
-                                                params
-                                         FROM tools
-                                         WHERE id = %s \
-                                           AND status = %s
-                                         """
-                        cursor.execute(tool_query_sql, (best_knowledge['tool_id'], 1))
-                        tool_result = cursor.fetchone()
-
-                        if tool_result:
-                            tool_info = ToolItem(
-                                id=tool_result['id'],
-                                user_id=str(tool_result['user_id']),
-                                title=tool_result['title'],
-                                description=tool_result['description'],
-                                url=tool_result['url'],
-                                status=tool_result['status'],
-                                timeout=tool_result['timeout'],
-                                params=tool_result['params']
-                            )
-                            logger.info(f"Retrieved tool info for tool ID: {best_knowledge['tool_id']}")
-                        else:
-                            logger.warning(f"No tool found for tool ID: {best_knowledge['tool_id']}")
-                finally:
-                    connection.close()
-            except Exception as e:
-                logger.error(f"Error retrieving tool info: {str(e)}")
-
-        # 构建返回的知识记录对象
-        knowledge_item = KnowledgeItem(
-            id=best_knowledge['id'],
-            user_id=best_knowledge['user_id'],
-            question=best_knowledge['question'],
-            description=best_knowledge['description'],
-            answer=best_knowledge['answer'],
-            public=best_knowledge['public'],
-            model_name=best_knowledge['model_name'] or "",
-            tool_id=best_knowledge['tool_id'] or 0,
-            params=best_knowledge['params'] or "",
-        )
+        if knowledge_item.tool_id:
+            cached, tool_info = user_index.get_tool(knowledge_item.tool_id)
+            if not cached:
+                tool_info = get_tool_by_id(knowledge_item.tool_id)
+                if tool_info:
+                    user_index.set_tools({knowledge_item.tool_id: tool_info})
+            if tool_info is None:
+                logger.warning(f"No tool found for tool ID: {knowledge_item.tool_id}")
 
         return knowledge_item, tool_info
 
@@ -392,24 +805,27 @@ def get_knowledge_tool(user_id: str, question: str, top_k: int = 3, similarity_t
         return None, None
 
 
-def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict) -> dict:
+def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict, connection=None) -> dict:
     """
     创建工具和知识记录的核心功能
 
     Args:
         tool_data: 工具相关数据
         knowledge_data: 知识相关数据
+        connection: 调用方已借出的连接；传入时在该连接上执行并提交，不归还。
+            已持有连接的接口必须传入，否则再借第二个连接会在连接池耗尽时互相等待
 
     Returns:
         dict: 包含操作结果的字典
     """
-    connection = None
+    owns_connection = connection is None
     tool_id = None
     knowledge_id = None
 
     try:
         # 获取数据库连接
-        connection = get_db_connection()
+        if owns_connection:
+            connection = get_db_connection()
 
         # 开始事务
         connection.begin()
@@ -442,9 +858,9 @@ def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict) ->
             # 插入 Knowledge 数据，使用 tool_id
             knowledge_sql = """
                             INSERT INTO knowledge
-                            (user_id, question, description, answer, public, status, embedding_id, model_name, tool_id,
-                             params)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            (user_id, question, description, answer, public, status, embedding_id, embedding_status,
+                             model_name, tool_id, params)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                             """
             cursor.execute(knowledge_sql, (
                 knowledge_data['user_id'],
@@ -454,6 +870,7 @@ def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict) ->
                 knowledge_data['public'],
                 1,  # status
                 knowledge_data['embedding_id'],
+                EMBEDDING_PENDING,
                 knowledge_data['model_name'],
                 tool_id,  # 使用刚刚创建的 tool_id
                 knowledge_data['params']
@@ -462,23 +879,25 @@ def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict) ->
             # 获取插入的 knowledge ID
             knowledge_id = cursor.lastrowid
 
-            # 计算并存储 embedding
-            query_embedding = get_embedding(knowledge_data['question'] + knowledge_data['answer'])
-
-            # 将 embedding 写入 Redis
-            try:
-                redis_conn = get_redis_connection()
-                # 使用记录ID作为键，将embedding存储到Redis中
-                redis_key = f"knowledge_embedding_{knowledge_id}"
-                redis_conn.set(redis_key, str(query_embedding))
-                logger.info(f"Embedding stored in Redis with key: {redis_key}")
-            except Exception as redis_error:
-                logger.error(f"Failed to store embedding in Redis: {str(redis_error)}")
-                # 注意：即使Redis存储失败，我们也不会中断主流程
-
         # 提交事务
         connection.commit()
 
+        # 事务提交后再投递 embedding 任务（任务需要读到已提交的记录），写入后由通知加入常驻索引
+        schedule_knowledge_embedding(knowledge_id, knowledge_data['question'], knowledge_data['answer'])
+        invalidate_knowledge_counts(knowledge_data['user_id'], knowledge_data['public'] == PUBLIC_KNOWLEDGE)
+        # 新建的工具默认不公开
+        invalidate_tool_counts(tool_data['user_id'], public=False)
+        vector_index_manager.set_tool(knowledge_data['user_id'], tool_id, ToolItem(
+            id=tool_id,
+            user_id=str(tool_data['user_id']),
+            title=tool_data['title'],
+            description=tool_data['description'],
+            url=tool_data['url'],
+            status=True,
+            timeout=tool_data['timeout'],
+            params=tool_data['params']
+        ))
+
         logger.info(
             f"Tool and knowledge records created successfully. Tool ID: {tool_id}, Knowledge ID: {knowledge_id}")
         return {
@@ -499,10 +918,214 @@ def create_tool_and_knowledge_records(tool_data: dict, knowledge_data: dict) ->
             "knowledge_id": knowledge_id
         }
     finally:
-        if connection:
+        if owns_connection and connection:
             connection.close()
 
 
+# 批量导入：每次 embedding 请求的最大条数（OpenAI 接口上限 2048）和每条 INSERT 语句的行数
+IMPORT_EMBEDDING_BATCH_SIZE = min(int(os.getenv("IMPORT_EMBEDDING_BATCH_SIZE", 512)), 2048)
+IMPORT_INSERT_ROWS = int(os.getenv("IMPORT_INSERT_ROWS", 100))
+
+
+def request_embeddings(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """
+    按 IMPORT_EMBEDDING_BATCH_SIZE 分批请求一组文本的 embedding，不经过缓存和合并队列
+
+    Returns:
+        List[Optional[np.ndarray]]: 与 texts 一一对应，所在批次请求失败的为 None
+    """
+    results: List[Optional[np.ndarray]] = []
+    for start in range(0, len(texts), IMPORT_EMBEDDING_BATCH_SIZE):
+        batch = texts[start:start + IMPORT_EMBEDDING_BATCH_SIZE]
+        try:
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            results.extend(np.asarray(data.embedding, dtype=np.float32)
+                           for data in sorted(response.data, key=lambda data: data.index))
+        except Exception as e:
+            logger.error(f"Error in embedding batch of {len(batch)} for import: {str(e)}")
+            results.extend([None] * len(batch))
+    return results
+
+
+def import_knowledge_batch(user_id: str, records: List[Tuple[int, Dict]], owned_tools: Dict[int, bool],
+                           embed=request_embeddings) -> Dict:
+    """
+    批量导入一批已校验的知识
+
+    先批量计算 embedding（不占用数据库事务），再在一个事务中用多行 INSERT 写入整批记录，
+    提交后用一次 pipeline 把向量写入 Redis。embedding 请求失败或 Redis 写入失败的记录
+    标记为 embedding_status=0 并交给后台任务补算。
+
+    Args:
+        user_id: 导入到的用户
+        records: (数据行号, validate_import_record 返回的知识数据) 列表
+        owned_tools: 工具ID是否属于该用户的缓存，跨批次复用
+        embed: 批量计算 embedding 的函数
+
+    Returns:
+        Dict: {"imported": [(行号, 知识ID)], "errors": [{"row": 行号, "errors": [...]}]}
+    """
+    errors = []
+    unknown_tools = {data['tool_id'] for _, data in records} - owned_tools.keys()
+    if unknown_tools:
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id FROM tools WHERE user_id = %s AND status = 1 "
+                    f"AND id IN ({', '.join(['%s'] * len(unknown_tools))})",
+                    [user_id, *unknown_tools]
+                )
+                found = {row['id'] for row in cursor.fetchall()}
+        owned_tools.update({tool_id: tool_id in found for tool_id in unknown_tools})
+    valid = []
+    for row, data in records:
+        if owned_tools[data['tool_id']]:
+            valid.append((row, data))
+        else:
+            errors.append({"row": row, "errors": ["Tool not found or not owned by current user"]})
+    if not valid:
+        return {"imported": [], "errors": errors}
+
+    embeddings = embed([knowledge_embedding_text(data['question'], data['answer']) for _, data in valid])
+    hashes = [knowledge_content_hash(data['question'], data['answer']) for _, data in valid]
+
+    def row_values(i: int) -> List:
+        data = valid[i][1]
+        ready = embeddings[i] is not None
+        return [user_id, data['question'], data['description'], data['answer'], data['public'], data['model_name'],
+                data['tool_id'], data['params'], 1, 0, EMBEDDING_READY if ready else EMBEDDING_PENDING,
+                hashes[i] if ready else ""]
+
+    def insert_rows(cursor, count: int, values: List) -> None:
+        cursor.execute(
+            """
+            INSERT INTO knowledge
+            (user_id, question, description, answer, public, model_name, tool_id, params, status, embedding_id,
+             embedding_status, embedding_hash)
+            VALUES """ + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * count),
+            values
+        )
+
+    ids = []
+    connection = get_db_connection()
+    try:
+        connection.begin()
+        with connection.cursor() as cursor:
+            # Galera/组复制等环境的自增步长不是 1
+            cursor.execute("SELECT @@auto_increment_increment AS increment")
+            increment = int(cursor.fetchone()['increment'])
+            for start in range(0, len(valid), IMPORT_INSERT_ROWS):
+                chunk = range(start, min(start + IMPORT_INSERT_ROWS, len(valid)))
+                cursor.execute("SAVEPOINT import_chunk")
+                insert_rows(cursor, len(chunk), [value for i in chunk for value in row_values(i)])
+                # 多行 INSERT 的自增ID通常按步长连续，lastrowid 是第一行的ID；
+                # innodb_autoinc_lock_mode 等配置下不一定成立，用内容校验推算的ID，不一致时逐行插入
+                chunk_ids = [cursor.lastrowid + increment * offset for offset in range(len(chunk))]
+                cursor.execute(
+                    f"SELECT id, SHA1(CONCAT(question, answer)) AS content_hash FROM knowledge "
+                    f"WHERE user_id = %s AND id IN ({', '.join(['%s'] * len(chunk_ids))})",
+                    [user_id, *chunk_ids]
+                )
+                inserted = {row['id']: row['content_hash'] for row in cursor.fetchall()}
+                if [inserted.get(knowledge_id) for knowledge_id in chunk_ids] != [hashes[i] for i in chunk]:
+                    logger.warning("Auto-increment ids of imported knowledge are not consecutive, inserting row by row")
+                    cursor.execute("ROLLBACK TO SAVEPOINT import_chunk")
+                    chunk_ids = []
+                    for i in chunk:
+                        insert_rows(cursor, 1, row_values(i))
+                        chunk_ids.append(cursor.lastrowid)
+                ids.extend(chunk_ids)
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        logger.error(f"Error importing knowledge batch for user {user_id}: {str(e)}")
+        return {"imported": [], "errors": errors + [{"row": row, "errors": [f"Insert failed: {str(e)}"]}
+                                                    for row, _ in valid]}
+    finally:
+        connection.close()
+
+    ready = {knowledge_id: embedding for knowledge_id, embedding in zip(ids, embeddings) if embedding is not None}
+    try:
+        if ready:
+            set_many(get_redis_connection(), {knowledge_embedding_key(knowledge_id): encode_embedding(embedding, EMBEDDING_MODEL)
+                                              for knowledge_id, embedding in ready.items()})
+    except Exception as e:
+        logger.error(f"Failed to store imported embeddings in Redis: {str(e)}")
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE knowledge SET embedding_status = %s, embedding_hash = '' "
+                    f"WHERE id IN ({', '.join(['%s'] * len(ready))})",
+                    [EMBEDDING_PENDING, *ready]
+                )
+            connection.commit()
+        ready = {}
+
+    for knowledge_id, (_, data) in zip(ids, valid):
+        embedding = ready.get(knowledge_id)
+        if embedding is None:
+            schedule_knowledge_embedding(knowledge_id, data['question'], data['answer'])
+            continue
+        vector_index_manager.upsert(user_id, KnowledgeItem(
+            id=knowledge_id,
+            user_id=str(user_id),
+            question=data['question'],
+            description=data['description'],
+            answer=data['answer'],
+            public=data['public'],
+            model_name=data['model_name'],
+            tool_id=data['tool_id'],
+            params=data['params']
+        ), embedding)
+        if data['public'] == PUBLIC_KNOWLEDGE:
+            sync_public_knowledge(knowledge_id, data['public'], 1, embedding)
+    invalidate_knowledge_counts(user_id, any(data['public'] == PUBLIC_KNOWLEDGE for _, data in valid))
+
+    return {"imported": [(row, knowledge_id) for (row, _), knowledge_id in zip(valid, ids)], "errors": errors}
+
+
+def tool_result_to_item(tool_result: Dict) -> ToolItem:
+    """将 tools 表查询结果（含创建和更新时间）转换为 ToolItem"""
+    return ToolItem(
+        id=tool_result['id'],
+        user_id=str(tool_result['user_id']),
+        title=tool_result['title'],
+        description=tool_result['description'],
+        url=tool_result['url'],
+        status=tool_result['status'],
+        create_time=tool_result['create_time'].isoformat() if tool_result['create_time'] else None,
+        update_time=tool_result['update_time'].isoformat() if tool_result['update_time'] else None,
+        timeout=tool_result['timeout'],
+        params=tool_result['params']
+    )
+
+
+def get_tools_by_ids(cursor, tool_ids: Iterable[int]) -> List[ToolItem]:
+    """
+    用调用方已打开的游标一次查询多个有效工具
+
+    Args:
+        cursor: 调用方连接上的游标，不再从连接池借出第二个连接
+        tool_ids: 工具ID
+
+    Returns:
+        List[ToolItem]: 按ID排序的工具，不存在或已删除的工具不返回
+    """
+    tool_ids = sorted(set(tool_ids))
+    if not tool_ids:
+        return []
+    cursor.execute(
+        f"""
+        SELECT id, user_id, title, description, url, push, public, status, timeout, params, create_time, update_time
+        FROM tools
+        WHERE id IN ({', '.join(['%s'] * len(tool_ids))}) AND status = 1
+        ORDER BY id
+        """,
+        tool_ids
+    )
+    return [tool_result_to_item(row) for row in cursor.fetchall()]
+
+
 def get_tool_by_id(tool_id: int) -> Optional[ToolItem]:
     """
     根据tool_id查询数据库tools表
@@ -529,18 +1152,7 @@ def get_tool_by_id(tool_id: int) -> Optional[ToolItem]:
 
                 if tool_result:
                     # 构建ToolItem对象
-                    tool_item = ToolItem(
-                        id=tool_result['id'],
-                        user_id=str(tool_result['user_id']),
-                        title=tool_result['title'],
-                        description=tool_result['description'],
-                        url=tool_result['url'],
-                        status=tool_result['status'],
-                        create_time=tool_result['create_time'].isoformat() if tool_result['create_time'] else None,
-                        update_time=tool_result['update_time'].isoformat() if tool_result['update_time'] else None,
-                        timeout=tool_result['timeout'],
-                        params=tool_result['params']
-                    )
+                    tool_item = tool_result_to_item(tool_result)
                     logger.info(f"Retrieved tool info for tool ID: {tool_id}")
                     return tool_item
                 else:
@@ -0,0 +1,84 @@
+import base64
+import json
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pymysql.cursors
+
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+# embedding 的导出方式：none 不导出，base64 为小端 float32 原始字节的 base64，float 为数字数组
+EXPORT_EMBEDDING_MODES = ("none", "base64", "float")
+
+EXPORT_COLUMNS = ("id", "user_id", "question", "description", "answer", "public", "model_name", "tool_id", "params",
+                  "create_time", "update_time")
+
+
+def export_line(row: Dict, embedding: Optional[np.ndarray] = None, mode: str = "none") -> bytes:
+    """把一行知识序列化为一行 NDJSON"""
+    record = {column: row[column] for column in EXPORT_COLUMNS}
+    record["user_id"] = str(record["user_id"])
+    for column in ("create_time", "update_time"):
+        if record[column] is not None:
+            record[column] = record[column].isoformat()
+    if mode != "none":
+        if embedding is None:
+            record["embedding"] = None
+        elif mode == "base64":
+            record["embedding"] = base64.b64encode(np.asarray(embedding, dtype="<f4").tobytes()).decode("ascii")
+        else:
+            record["embedding"] = np.asarray(embedding, dtype=np.float32).tolist()
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_knowledge_export(connection_factory: Callable, load_embeddings: Callable[[List[int]], Dict[int, np.ndarray]],
+                          user_id: Optional[str] = None, public: Optional[int] = None, embeddings: str = "none",
+                          chunk_size: int = 500) -> Iterator[bytes]:
+    """
+    以 NDJSON 流式导出知识
+
+    使用独立连接上的非缓冲游标（SSDictCursor）按主键顺序读取，每次只在内存中保留 chunk_size 行；
+    需要 embedding 时每块用一次 pipeline MGET 读取。调用方提前停止迭代（客户端断开）时直接关闭连接，
+    不读完剩余结果集。导出中途出错时最后输出一行 {"error": ...}，便于客户端判断导出不完整。
+
+    Args:
+        connection_factory: 创建新数据库连接的函数（不使用连接池，导出可能持续很久）
+        load_embeddings: 按知识ID批量读取 embedding
+        user_id: 导出该用户的知识
+        public: 导出公开知识时传公开的取值
+        embeddings: EXPORT_EMBEDDING_MODES 之一
+        chunk_size: 每块的行数
+    """
+    conditions, params = ["status = %s"], [1]
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if public is not None:
+        conditions.append("public = %s")
+        params.append(public)
+
+    connection = connection_factory()
+    exported = 0
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        # 非缓冲读取时服务端要等客户端消费完才能继续发送，慢客户端不应导致连接被服务端断开
+        cursor.execute("SET SESSION net_write_timeout = 3600")
+        cursor.execute(
+            f"SELECT {', '.join(EXPORT_COLUMNS)} FROM knowledge WHERE {' AND '.join(conditions)} ORDER BY id",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            vectors = load_embeddings([row["id"] for row in rows]) if embeddings != "none" else {}
+            yield b"".join(export_line(row, vectors.get(row["id"]), embeddings) for row in rows)
+            exported += len(rows)
+        logger.info(f"Exported {exported} knowledge records (user={user_id}, public={public})")
+    except Exception as e:
+        logger.error(f"Error exporting knowledge after {exported} records: {str(e)}")
+        yield (json.dumps({"error": str(e), "exported": exported}) + "\n").encode("utf-8")
+    finally:
+        connection.close()
@@ -0,0 +1,107 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# ASCII 标识符：接口名、产品编号、版本号等（get_user_info、SKU-1024、v2.1）
+_IDENTIFIER_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-.]*[A-Za-z0-9]|[A-Za-z0-9]")
+# 标识符内部的单词：驼峰、下划线、连字符分隔的各部分
+_IDENTIFIER_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# 中日韩文字连续片段
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    BM25 分词
+
+    - ASCII 标识符整体作为一个词（小写），含驼峰或分隔符时再加入各组成部分，
+      这样 "getUserInfo" 既能精确命中，也能被 "user info" 命中
+    - 中日韩文字没有空格分词，使用单字加相邻二字（bigram），不依赖词典
+    """
+    if not text:
+        return []
+    tokens = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        tokens.append(identifier.lower())
+        parts = _IDENTIFIER_PART_RE.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    for run in _CJK_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    增量维护的 BM25 倒排索引
+
+    倒排表为 {词: {文档ID: 词频}}，另外记录每个文档的词集合以便删除和替换。
+    """
+
+    # 估算内存时每个倒排项的字节数（dict 槽位加两个 int 对象）
+    ENTRY_BYTES = 100
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.total_length = 0
+        self.entries = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self) -> int:
+        """倒排表占用内存的估算值"""
+        return self.entries * self.ENTRY_BYTES
+
+    def add(self, doc_id: int, text: str) -> None:
+        """新增或替换一个文档"""
+        self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.doc_terms[doc_id] = tuple(counts)
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        self.entries += len(counts)
+
+    def remove(self, doc_id: int) -> bool:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.entries -= len(terms)
+        return True
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            List[Tuple[int, float]]: 按 BM25 得分降序的 (文档ID, 得分)，没有任何词命中时为空
+        """
+        doc_count = len(self.doc_lengths)
+        if doc_count == 0 or top_k <= 0:
+            return []
+        average_length = self.total_length / doc_count or 1
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda entry: entry[1])
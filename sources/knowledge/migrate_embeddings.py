@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+将 Redis 中旧的文本格式 embedding（str(list)）迁移为二进制 float32 格式
+
+用法:
+    python -m sources.knowledge.migrate_embeddings [--batch-size 500] [--dry-run]
+
+迁移期间读取端同时兼容两种格式，可以在服务运行时执行。写回时使用
+compare-and-set 脚本，如果键在读取后已被接口重写，则跳过该键。
+"""
+
+import argparse
+import time
+
+from sources.knowledge.knowledge import get_redis_connection, EMBEDDING_MODEL
+from sources.knowledge.embedding_codec import encode_embedding, decode_embedding, is_binary_embedding
+from sources.logger import Logger
+from sources.utility import pretty_print
+
+logger = Logger("knowledge.log")
+
+# 只有当前值仍是读取到的旧值时才覆盖，避免覆盖迁移过程中新写入的数据
+COMPARE_AND_SET_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def migrate_embeddings(batch_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    扫描所有 knowledge_embedding_* 键，把文本格式改写为二进制格式
+
+    Args:
+        batch_size: 每批 SCAN/MGET 的键数量
+        dry_run: 只统计，不写回
+
+    Returns:
+        dict: 迁移统计 scanned / migrated / skipped / failed
+    """
+    redis_conn = get_redis_connection(decode_responses=False)
+    compare_and_set = redis_conn.register_script(COMPARE_AND_SET_SCRIPT)
+    stats = {"scanned": 0, "migrated": 0, "skipped": 0, "failed": 0}
+
+    batch = []
+    for key in redis_conn.scan_iter(match="knowledge_embedding_*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            _migrate_batch(redis_conn, compare_and_set, batch, stats, dry_run)
+            batch = []
+    if batch:
+        _migrate_batch(redis_conn, compare_and_set, batch, stats, dry_run)
+    return stats
+
+
+def _migrate_batch(redis_conn, compare_and_set, keys, stats, dry_run):
+    values = redis_conn.mget(keys)
+    pipe = redis_conn.pipeline(transaction=False)
+    pending = 0
+    for key, raw in zip(keys, values):
+        stats["scanned"] += 1
+        if raw is None or is_binary_embedding(raw):
+            stats["skipped"] += 1
+            continue
+        try:
+            embedding, _ = decode_embedding(raw)
+        except Exception as e:
+            logger.error(f"Failed to decode embedding {key!r}: {str(e)}")
+            stats["failed"] += 1
+            continue
+        if dry_run:
+            stats["migrated"] += 1
+            continue
+        compare_and_set(keys=[key], args=[raw, encode_embedding(embedding, EMBEDDING_MODEL)], client=pipe)
+        pending += 1
+    if pending:
+        for result in pipe.execute():
+            if result:
+                stats["migrated"] += 1
+            else:
+                stats["skipped"] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate knowledge embeddings in Redis to the binary float32 format")
+    parser.add_argument("--batch-size", type=int, default=500, help="keys per SCAN/MGET batch")
+    parser.add_argument("--dry-run", action="store_true", help="only count keys that need migration")
+    args = parser.parse_args()
+
+    start = time.time()
+    result = migrate_embeddings(batch_size=args.batch_size, dry_run=args.dry_run)
+    logger.info(f"Embedding migration finished: {result}")
+    pretty_print(f"Embedding migration finished in {time.time() - start:.1f}s: {result}", color="success")
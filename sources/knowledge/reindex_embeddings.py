@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+重建知识 embedding：补齐 Redis 中缺失的向量，重算模型或内容已过期的向量
+
+用法:
+    python -m sources.knowledge.reindex_embeddings [--range-size 5000] [--batch-size 256] [--concurrency 4]
+        [--requests-per-minute 3000] [--checkpoint .cache/reindex_checkpoint.json] [--reset] [--dry-run]
+
+按主键区间扫描 knowledge 表，每个区间用一次 pipeline MGET 读出现有向量，以下情况需要重算：
+Redis 中没有向量、向量的模型不是当前的 EMBEDDING_MODEL、embedding_status 不是已写入、
+或 embedding_hash 与当前内容不一致。重算按批并发请求 embedding 接口（全局限速），
+写回时用 pipeline 写 Redis、批量更新 embedding_status，并通知 API 进程更新常驻索引。
+每个区间完成后写入检查点（有批次失败时停在第一个失败的区间之前），中断后再次运行会从检查点继续。
+可以在服务运行时执行。
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sources.knowledge.knowledge import EMBEDDING_MODEL, client, db_connection, get_redis_connection, \
+    knowledge_embedding_key
+from sources.knowledge.embedding_codec import encode_embedding, decode_embedding
+from sources.knowledge.embedding_pipeline import EMBEDDING_READY, EMBEDDING_READY_CHANNEL, embedding_lock_key, \
+    knowledge_content_hash, knowledge_embedding_text
+from sources.logger import Logger
+from sources.utility import pretty_print
+
+logger = Logger("knowledge.log")
+
+# 只有锁仍由本批持有（值是本批的 token）时才删除；锁过期后可能已被后台任务重新获取
+COMPARE_AND_DELETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RequestRateLimiter:
+    """按固定间隔放行请求的全局限速器，多个线程共享"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(self.next_slot, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def stale_reason(row: Dict, raw: Optional[bytes], model: str = EMBEDDING_MODEL) -> Optional[str]:
+    """
+    判断一条知识的向量是否需要重算
+
+    Returns:
+        Optional[str]: missing / model / status / content，不需要重算时为 None
+    """
+    if not raw:
+        return "missing"
+    try:
+        _, stored_model = decode_embedding(raw)
+    except Exception:
+        return "missing"
+    # 迁移前的文本格式没有模型信息，视为当前模型
+    if stored_model is not None and stored_model != model:
+        return "model"
+    if row["embedding_status"] != EMBEDDING_READY:
+        return "status"
+    # 迁移前写入的记录没有 embedding_hash，无法判断内容是否变化
+    if row["embedding_hash"] and row["embedding_hash"] != knowledge_content_hash(row["question"], row["answer"]):
+        return "content"
+    return None
+
+
+def load_checkpoint(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    """先写临时文件再原子替换，中断时不会留下损坏的检查点"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+class EmbeddingReindexer:
+    def __init__(self, batch_size: int = 256, concurrency: int = 4, requests_per_minute: float = 3000,
+                 max_retries: int = 5, notify: bool = True, dry_run: bool = False):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.notify = notify
+        self.dry_run = dry_run
+        self.limiter = RequestRateLimiter(requests_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reindex")
+        self.redis_conn = get_redis_connection(decode_responses=False)
+        self.compare_and_delete = self.redis_conn.register_script(COMPARE_AND_DELETE_SCRIPT)
+        self.stats = {"scanned": 0, "missing": 0, "model": 0, "status": 0, "content": 0, "reindexed": 0, "skipped": 0,
+                      "failed": 0}
+        self.stats_lock = threading.Lock()
+
+    def _add(self, name: str, value: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def max_id(self) -> int:
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM knowledge")
+                return int(cursor.fetchone()["max_id"])
+
+    def scan_range(self, start_id: int, end_id: int) -> List[Dict]:
+        """读取 (start_id, end_id] 内的有效知识，返回需要重算的记录"""
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT id, user_id, question, answer, embedding_status, embedding_hash
+                    FROM knowledge
+                    WHERE id > %s AND id <= %s AND status = 1
+                    ORDER BY id
+                    """,
+                    (start_id, end_id)
+                )
+                rows = cursor.fetchall()
+        if not rows:
+            return []
+        raws = self.redis_conn.mget([knowledge_embedding_key(row["id"]) for row in rows])
+        stale = []
+        for row, raw in zip(rows, raws):
+            reason = stale_reason(row, raw)
+            if reason is not None:
+                self._add(reason)
+                stale.append(row)
+        self._add("scanned", len(rows))
+        return stale
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+                return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt + 1}): {str(e)}")
+                time.sleep(min(2 ** attempt, 60))
+
+    def _unchanged(self, locked: List) -> tuple:
+        """筛出内容与扫描时一致、仍然有效的知识"""
+        if not locked:
+            return [], []
+        for row, _ in locked:
+            row["content_hash"] = knowledge_content_hash(row["question"], row["answer"])
+        with db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id, SHA1(CONCAT(question, answer)) AS content_hash FROM knowledge "
+                    f"WHERE status = 1 AND id IN ({', '.join(['%s'] * len(locked))})",
+                    [row["id"] for row, _ in locked]
+                )
+                current = {row["id"]: row["content_hash"] for row in cursor.fetchall()}
+        unchanged = [(row, embedding) for row, embedding in locked if current.get(row["id"]) == row["content_hash"]]
+        self._add("skipped", len(locked) - len(unchanged))
+        return [row for row, _ in unchanged], [embedding for _, embedding in unchanged]
+
+    def reindex_batch(self, rows: List[Dict]) -> None:
+        """重算一批向量并写回 Redis 和 MySQL"""
+        try:
+            embeddings = self._embed([knowledge_embedding_text(row["question"], row["answer"]) for row in rows])
+        except Exception as e:
+            logger.error(f"Failed to re-embed knowledge {rows[0]['id']}..{rows[-1]['id']}: {str(e)}")
+            self._add("failed", len(rows))
+            return
+
+        # 与 embedding 后台任务使用同一把锁：正在被任务计算的知识跳过，持锁期间再确认内容没有变化，
+        # 避免旧内容的向量覆盖任务刚写入的新向量
+        token = uuid.uuid4().hex
+        pipe = self.redis_conn.pipeline(transaction=False)
+        for row in rows:
+            pipe.set(embedding_lock_key(row["id"]), token, nx=True, ex=60)
+        locked = [(row, embedding) for row, embedding, acquired in zip(rows, embeddings, pipe.execute()) if acquired]
+        self._add("skipped", len(rows) - len(locked))
+        try:
+            rows, embeddings = self._unchanged(locked)
+            # 先写 Redis 再更新状态：中途失败时状态仍是未写入，下次运行会重算
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for row, embedding in zip(rows, embeddings):
+                pipe.set(knowledge_embedding_key(row["id"]), encode_embedding(embedding, EMBEDDING_MODEL))
+            pipe.execute()
+            with db_connection() as connection:
+                with connection.cursor() as cursor:
+                    # 写入期间内容又被接口修改的记录已标记为待计算，由其后台任务处理
+                    cursor.executemany(
+                        """
+                        UPDATE knowledge
+                        SET embedding_status = %s, embedding_hash = %s, update_time = update_time
+                        WHERE id = %s AND SHA1(CONCAT(question, answer)) = %s
+                        """,
+                        [(EMBEDDING_READY, row["content_hash"], row["id"], row["content_hash"]) for row in rows]
+                    )
+                connection.commit()
+        finally:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for row, _ in locked:
+                self.compare_and_delete(keys=[embedding_lock_key(row["id"])], args=[token], client=pipe)
+            pipe.execute()
+        if self.notify:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for row in rows:
+                pipe.publish(EMBEDDING_READY_CHANNEL, json.dumps({"user_id": str(row["user_id"]), "knowledge_id": row["id"]}))
+            pipe.execute()
+        self._add("reindexed", len(rows))
+
+    def run(self, start_id: int, end_id: int, range_size: int, checkpoint_path: str) -> Dict:
+        started = time.time()
+        position = start_id
+        # 检查点只推进到第一个有失败批次的区间之前，再次运行时从该区间重试
+        last_id = start_id
+        while position < end_id:
+            range_end = min(position + range_size, end_id)
+            failed_before = self.stats["failed"]
+            stale = self.scan_range(position, range_end)
+            if stale and not self.dry_run:
+                batches = [stale[i:i + self.batch_size] for i in range(0, len(stale), self.batch_size)]
+                list(self.executor.map(self.reindex_batch, batches))
+            if last_id == position and self.stats["failed"] == failed_before:
+                last_id = range_end
+            position = range_end
+
+            elapsed = max(time.time() - started, 1e-6)
+            with self.stats_lock:
+                stats = dict(self.stats)
+            if not self.dry_run:
+                save_checkpoint(checkpoint_path, {"last_id": last_id, "end_id": end_id, "model": EMBEDDING_MODEL,
+                                                  "stats": stats, "updated_at": time.time()})
+            pretty_print(f"id <= {position}/{end_id}: scanned {stats['scanned']} ({stats['scanned'] / elapsed:.0f} rows/s), "
+                         f"reindexed {stats['reindexed']} ({stats['reindexed'] / elapsed:.1f} rows/s), "
+                         f"failed {stats['failed']}", color="status")
+        self.executor.shutdown()
+        return dict(self.stats, seconds=round(time.time() - started, 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed knowledge rows whose vectors are missing or stale")
+    parser.add_argument("--start-id", type=int, default=None, help="scan ids greater than this (default: checkpoint or 0)")
+    parser.add_argument("--end-id", type=int, default=None, help="scan ids up to this (default: current MAX(id))")
+    parser.add_argument("--range-size", type=int, default=5000, help="ids per scan range and checkpoint")
+    parser.add_argument("--batch-size", type=int, default=256, help="texts per embedding request (max 2048)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent embedding requests")
+    parser.add_argument("--requests-per-minute", type=float, default=3000, help="embedding request rate limit, 0 to disable")
+    parser.add_argument("--checkpoint", default=".cache/reindex_checkpoint.json", help="checkpoint file for resuming")
+    parser.add_argument("--reset", action="store_true", help="ignore the existing checkpoint")
+    parser.add_argument("--no-notify", action="store_true", help="do not notify API processes to refresh resident indexes")
+    parser.add_argument("--dry-run", action="store_true", help="only count stale rows")
+    args = parser.parse_args()
+
+    checkpoint = {} if args.reset else load_checkpoint(args.checkpoint)
+    if checkpoint.get("model") not in (None, EMBEDDING_MODEL):
+        pretty_print(f"Checkpoint was written for model {checkpoint['model']}, starting over", color="warning")
+        checkpoint = {}
+    reindexer = EmbeddingReindexer(batch_size=min(args.batch_size, 2048), concurrency=args.concurrency,
+                                   requests_per_minute=args.requests_per_minute, notify=not args.no_notify,
+                                   dry_run=args.dry_run)
+    start_id = args.start_id if args.start_id is not None else checkpoint.get("last_id", 0)
+    end_id = args.end_id if args.end_id is not None else reindexer.max_id()
+    result = reindexer.run(start_id, end_id, args.range_size, args.checkpoint)
+    logger.info(f"Embedding reindex finished: {result}")
+    pretty_print(f"Embedding reindex finished: {result}", color="success")
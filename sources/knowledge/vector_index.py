@@ -0,0 +1,570 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sources.knowledge.lexical_index import BM25Index
+from sources.logger import Logger
+
+logger = Logger("knowledge.log")
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """L2 归一化（单个向量或按行），零向量保持为零"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """用 argpartition 选出得分最高的 k 个下标，只对这 k 个排序"""
+    if k <= 0 or scores.shape[0] == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates])]
+
+
+# 索引矩阵支持的存储精度
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# 参与 BM25 倒排索引的知识字段
+LEXICAL_FIELDS = ("question", "description", "answer")
+
+
+def lexical_text(item) -> str:
+    """拼接知识中参与关键词检索的文本"""
+    return "\n".join(getattr(item, field, None) or "" for field in LEXICAL_FIELDS)
+
+
+# 量化打分时每次转换成 float32 的行数：块足够小能留在 CPU 缓存中，也避免为整个矩阵分配临时副本
+SCORE_BLOCK_ROWS = 256
+
+
+def quantize_rows(vectors: np.ndarray, precision: str):
+    """
+    把归一化后的 float32 向量转换为存储精度
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (编码后的矩阵, 每行的缩放系数)；int8 按行对称量化，其余精度缩放系数为 1
+    """
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=-1) / 127
+        scales = np.where(scales > 0, scales, 1).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(PRECISIONS[precision]), np.ones(vectors.shape[:-1], dtype=np.float32)
+
+
+class UserVectorIndex:
+    """
+    单个用户的常驻向量索引
+
+    所有向量经过 L2 归一化后保存在一个连续的矩阵中，行号与 ids 数组一一对应，
+    余弦相似度就是一次矩阵-向量乘法（BLAS），top-k 用 argpartition 选出，
+    只为最终的 k 个结果构建字典。增删改都是增量操作，不会重建整个矩阵。
+
+    precision 为 float16 或 int8（按行缩放）时矩阵以量化形式常驻内存，先在量化矩阵上
+    粗排出 rerank_candidates 个候选，再用 exact_store 中的 float32 原始向量精确重排；
+    没有 exact_store 时直接使用量化得分。
+
+    同时维护一份 question/description/answer 的 BM25 倒排索引（lexical），与矩阵同步增删改，
+    hybrid_search_items 把两路结果按倒数排名融合（RRF），弥补向量检索对接口名、编号等精确词不敏感的问题。
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 16, precision: str = "float32",
+                 exact_store=None, rerank_candidates: int = 32):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unsupported precision {precision}")
+        self.dim = dim
+        self.size = 0
+        self.capacity = capacity
+        self.precision = precision
+        self.exact_store = exact_store if precision != "float32" else None
+        self.rerank_candidates = rerank_candidates
+        self.matrix = np.zeros((capacity, dim), dtype=PRECISIONS[precision]) if dim else None
+        self.scales = np.ones(capacity, dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.items: Dict[int, object] = {}
+        self.positions: Dict[int, int] = {}
+        # 知识关联的工具元数据 {tool_id: ToolItem 或 None（工具已删除）}，检索时无需再查询数据库
+        self.tools: Dict[int, object] = {}
+        # 每次修改递增，用于判断磁盘上的段是否过期
+        self.version = 0
+        self.lexical = BM25Index()
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """矩阵、缩放系数、ID数组和倒排索引（估算）占用的内存"""
+        matrix_bytes = self.matrix.nbytes if self.matrix is not None else 0
+        scale_bytes = self.scales.nbytes if self.precision == "int8" else 0
+        return matrix_bytes + scale_bytes + self.ids.nbytes + self.lexical.nbytes
+
+    def _ensure_capacity(self, needed: int) -> None:
+        if needed <= self.capacity and self.matrix is not None:
+            return
+        new_capacity = max(needed, self.capacity * 2)
+        matrix = np.zeros((new_capacity, self.dim), dtype=PRECISIONS[self.precision])
+        scales = np.ones(new_capacity, dtype=np.float32)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        if self.matrix is not None:
+            matrix[:self.size] = self.matrix[:self.size]
+            scales[:self.size] = self.scales[:self.size]
+            ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.scales, self.ids = matrix, scales, ids
+        self.capacity = new_capacity
+
+    def _check_dim(self, dim: int) -> None:
+        if self.dim is None:
+            self.dim = dim
+        if dim != self.dim:
+            raise ValueError(f"embedding dim {dim} does not match index dim {self.dim}")
+
+    def upsert(self, item, embedding) -> None:
+        """
+        新增或替换一条知识及其向量
+
+        Args:
+            item: KnowledgeItem 对象，必须包含 id
+            embedding: 知识的 embedding 向量
+        """
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(-1))
+        codes, scales = quantize_rows(vector[None, :], self.precision)
+        with self.lock:
+            self._check_dim(vector.shape[0])
+            row = self.positions.get(item.id)
+            if row is None:
+                self._ensure_capacity(self.size + 1)
+                row = self.size
+                self.size += 1
+                self.positions[item.id] = row
+                self.ids[row] = item.id
+            self.matrix[row] = codes[0]
+            self.scales[row] = scales[0]
+            self.items[item.id] = item
+            self.lexical.add(item.id, lexical_text(item))
+            if self.exact_store is not None:
+                self.exact_store.put_many([item.id], vector[None, :])
+            self.version += 1
+
+    def extend(self, items: List, embeddings, normalized: bool = False) -> None:
+        """
+        批量追加一组新知识（ID 不能已经存在于索引中）
+
+        Args:
+            items: KnowledgeItem 列表
+            embeddings: 与 items 一一对应的向量矩阵
+            normalized: 向量已经归一化（例如从磁盘段读出）时跳过归一化
+        """
+        if not items:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not normalized:
+            vectors = normalize_rows(vectors)
+        codes, scales = quantize_rows(vectors, self.precision)
+        with self.lock:
+            self._check_dim(vectors.shape[1])
+            start = self.size
+            self._ensure_capacity(start + len(items))
+            self.matrix[start:start + len(items)] = codes
+            self.scales[start:start + len(items)] = scales
+            for row, item in enumerate(items, start):
+                self.ids[row] = item.id
+                self.positions[item.id] = row
+                self.items[item.id] = item
+                self.lexical.add(item.id, lexical_text(item))
+            self.size += len(items)
+            if self.exact_store is not None:
+                self.exact_store.put_many([item.id for item in items], vectors)
+            self.version += 1
+
+    def _dequantize(self, rows) -> np.ndarray:
+        return self.matrix[rows].astype(np.float32) * self.scales[rows, None]
+
+    def export(self):
+        """返回 (ids, 归一化 float32 矩阵) 的拷贝，用于写入磁盘段；量化索引优先取原始向量"""
+        with self.lock:
+            if self.matrix is None:
+                return self.ids[:0].copy(), np.zeros((0, 0), dtype=np.float32)
+            ids = self.ids[:self.size].copy()
+            if self.precision == "float32":
+                return ids, self.matrix[:self.size].copy()
+            exact = self.exact_store.get_many(ids.tolist()) if self.exact_store is not None else None
+            return ids, exact if exact is not None else self._dequantize(slice(0, self.size))
+
+    def release(self) -> None:
+        """索引被丢弃时释放 exact_store 中的原始向量"""
+        if self.exact_store is not None:
+            with self.lock:
+                self.exact_store.delete(self.ids[:self.size].tolist())
+
+    def set_tools(self, tools: Dict[int, object]) -> None:
+        """缓存工具元数据，None 表示工具不存在或已删除"""
+        with self.lock:
+            self.tools.update(tools)
+
+    def get_tool(self, tool_id: int):
+        """
+        Returns:
+            Tuple[bool, Optional[ToolItem]]: (是否已缓存, 工具)
+        """
+        with self.lock:
+            if tool_id in self.tools:
+                return True, self.tools[tool_id]
+            return False, None
+
+    def drop_tool(self, tool_id: int) -> None:
+        with self.lock:
+            self.tools.pop(tool_id, None)
+
+    def update_item(self, item) -> bool:
+        """只更新知识的元数据，向量保持不变；知识不在索引中时返回 False"""
+        with self.lock:
+            if item.id not in self.positions:
+                return False
+            self.items[item.id] = item
+            self.lexical.add(item.id, lexical_text(item))
+            self.version += 1
+            return True
+
+    def remove(self, knowledge_id: int) -> bool:
+        """删除一条知识，用最后一行填补空位以保持矩阵连续"""
+        with self.lock:
+            row = self.positions.pop(knowledge_id, None)
+            if row is None:
+                return False
+            self.items.pop(knowledge_id, None)
+            self.lexical.remove(knowledge_id)
+            last = self.size - 1
+            if row != last:
+                moved_id = int(self.ids[last])
+                self.matrix[row] = self.matrix[last]
+                self.scales[row] = self.scales[last]
+                self.ids[row] = moved_id
+                self.positions[moved_id] = row
+            self.size = last
+            if self.exact_store is not None:
+                self.exact_store.delete([knowledge_id])
+            self.version += 1
+            return True
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.precision == "float32":
+            return self.matrix[:self.size] @ query
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.size)
+            scores[start:end] = self.matrix[start:end].astype(np.float32) @ query
+        if self.precision == "int8":
+            scores *= self.scales[:self.size]
+        return scores
+
+    def _rank(self, query: np.ndarray, top_k: int):
+        """返回 [(行号, 相似度)]，量化索引先粗排再用原始向量精确重排"""
+        scores = self._scores(query)
+        if self.precision == "float32":
+            return [(row, float(scores[row])) for row in top_k_indices(scores, top_k)]
+        candidates = top_k_indices(scores, max(top_k, self.rerank_candidates))
+        exact = None
+        if self.exact_store is not None and len(candidates):
+            exact = self.exact_store.get_many(self.ids[candidates].tolist())
+        if exact is None:
+            return [(row, float(scores[row])) for row in candidates[:top_k]]
+        exact_scores = exact @ query
+        return [(candidates[i], float(exact_scores[i])) for i in top_k_indices(exact_scores, top_k)]
+
+    def search_items(self, query_embedding, top_k: int = 3, threshold: float = 0) -> List[Tuple[object, float]]:
+        """
+        在索引中检索最相似的知识
+
+        Args:
+            query_embedding: 问题的 embedding 向量
+            top_k: 返回最相关的几个结果
+            threshold: 相似度阈值
+
+        Returns:
+            List[Tuple[KnowledgeItem, float]]: 按相似度降序排列的 (知识, 相似度)
+        """
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        with self.lock:
+            if self.size == 0 or query.shape[0] != self.dim or not query.any():
+                return []
+            results = []
+            for row, similarity in self._rank(query, top_k):
+                if similarity < threshold:
+                    break
+                results.append((self.items[int(self.ids[row])], similarity))
+            return results
+
+    def _row_similarities(self, rows: List[int], query: np.ndarray) -> np.ndarray:
+        """指定行的余弦相似度，量化索引优先使用原始向量"""
+        if self.exact_store is not None:
+            exact = self.exact_store.get_many(self.ids[rows].tolist())
+            if exact is not None:
+                return exact @ query
+        return self._dequantize(rows) @ query
+
+    def hybrid_search_items(self, query_embedding, query_text: str, top_k: int = 3, threshold: float = 0,
+                            candidates: int = 50, rrf_k: int = 60,
+                            lexical_margin: float = 0.1) -> List[Tuple[object, float]]:
+        """
+        向量检索与 BM25 关键词检索融合
+
+        两路各取 candidates 个候选，按 RRF 得分 Σ 1 / (rrf_k + 名次) 排序。关键词命中的知识说明问题与
+        知识有相同的词，相似度阈值放宽 lexical_margin；其余知识仍受 threshold 限制。
+
+        Args:
+            query_embedding: 问题的 embedding 向量
+            query_text: 问题原文
+            top_k: 返回最相关的几个结果
+            threshold: 相似度阈值
+            candidates: 每一路参与融合的候选数量
+            rrf_k: RRF 平滑常数，越大排名靠后的候选权重越接近靠前的
+            lexical_margin: 关键词命中时相似度阈值的放宽量
+
+        Returns:
+            List[Tuple[KnowledgeItem, float]]: 按融合得分降序排列的 (知识, 相似度)
+        """
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        with self.lock:
+            if self.size == 0 or query.shape[0] != self.dim or not query.any():
+                return []
+            fused: Dict[int, float] = {}
+            similarities: Dict[int, float] = {}
+            for rank, (row, similarity) in enumerate(self._rank(query, max(candidates, top_k))):
+                knowledge_id = int(self.ids[row])
+                fused[knowledge_id] = 1 / (rrf_k + rank + 1)
+                similarities[knowledge_id] = similarity
+            lexical_ids = set()
+            for rank, (knowledge_id, _) in enumerate(self.lexical.search(query_text, max(candidates, top_k))):
+                fused[knowledge_id] = fused.get(knowledge_id, 0.0) + 1 / (rrf_k + rank + 1)
+                lexical_ids.add(knowledge_id)
+
+            # 只被关键词命中的知识补算相似度，用于阈值判断，并保持返回值的含义与 search_items 一致
+            missing = [knowledge_id for knowledge_id in lexical_ids if knowledge_id not in similarities]
+            if missing:
+                scores = self._row_similarities([self.positions[knowledge_id] for knowledge_id in missing], query)
+                similarities.update(zip(missing, (float(score) for score in scores)))
+
+            results = []
+            for knowledge_id in sorted(fused, key=fused.get, reverse=True):
+                similarity = similarities[knowledge_id]
+                if similarity < threshold - (lexical_margin if knowledge_id in lexical_ids else 0):
+                    continue
+                results.append((self.items[knowledge_id], similarity))
+                if len(results) == top_k:
+                    break
+            return results
+
+    def search(self, query_embedding, top_k: int = 3, threshold: float = 0) -> List[Dict]:
+        """
+        在索引中检索最相似的知识
+
+        Returns:
+            List[Dict]: 按相似度降序排列的知识字典，包含 similarity 字段
+        """
+        results = []
+        for item, similarity in self.search_items(query_embedding, top_k, threshold):
+            result_item = item.dict()
+            result_item["similarity"] = similarity
+            results.append(result_item)
+        return results
+
+
+class VectorIndexManager:
+    """
+    进程内常驻的用户向量索引管理器
+
+    用户第一次检索时通过 loader 从 MySQL/Redis 构建索引，之后常驻内存，
+    由知识的创建、修改、删除接口增量维护。尚未加载的用户不会被增量操作加载，
+    下次检索时会完整构建。加载过程中到达的增量操作会被记录，加载完成后在发布索引前重放，
+    期间用户索引被作废时重新加载。
+
+    配置了 memory_budget 时按 LRU 控制常驻用户：超出预算时把最久未使用的用户矩阵
+    写入磁盘存储（store）后从内存移除，下次检索时由 pager 读取 MySQL 元数据并从
+    memmap 取回向量（page-in），不需要再访问 Redis。
+    """
+
+    def __init__(self, loader: Callable[[str], UserVectorIndex], store=None, memory_budget: int = 0,
+                 pager: Callable[[str, object, object], UserVectorIndex] = None):
+        self.loader = loader
+        self.store = store
+        self.memory_budget = memory_budget
+        self.pager = pager
+        self.indices: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_locks: Dict[str, threading.Lock] = {}
+        # 正在加载的用户 -> 加载期间到达的增量操作
+        self.pending: Dict[str, List[Tuple]] = {}
+        # 磁盘段对应的索引版本，段存在且版本一致时驱逐无需重写
+        self.stored_versions: Dict[str, int] = {}
+        self.evictions = 0
+        self.page_ins = 0
+        self.cold_loads = 0
+        self.page_in_latencies = deque(maxlen=1000)
+
+    def get(self, user_id) -> UserVectorIndex:
+        """获取用户的索引，未加载时同步构建或从磁盘换入（同一用户并发请求只加载一次）"""
+        user_id = str(user_id)
+        with self.lock:
+            index = self.indices.get(user_id)
+            if index is not None:
+                self.indices.move_to_end(user_id)
+                return index
+            load_lock = self.load_locks.setdefault(user_id, threading.Lock())
+        try:
+            with load_lock:
+                index = self.indices.get(user_id)
+                if index is not None:
+                    return index
+                while True:
+                    with self.lock:
+                        self.pending[user_id] = []
+                    try:
+                        index = self._load(user_id)
+                    except Exception:
+                        with self.lock:
+                            self.pending.pop(user_id, None)
+                        raise
+                    with self.lock:
+                        operations = self.pending.pop(user_id)
+                        if ("invalidate",) in operations:
+                            index.release()
+                            continue
+                        for operation in operations:
+                            self._apply(index, operation)
+                        self.indices[user_id] = index
+                        self._evict_over_budget(keep=user_id)
+                    return index
+        finally:
+            with self.lock:
+                if self.load_locks.get(user_id) is load_lock:
+                    del self.load_locks[user_id]
+
+    @staticmethod
+    def _apply(index: UserVectorIndex, operation: Tuple) -> None:
+        if operation[0] == "remove":
+            index.remove(operation[1])
+        elif operation[2] is None:
+            index.update_item(operation[1])
+        else:
+            index.upsert(operation[1], operation[2])
+
+    def _load(self, user_id: str) -> UserVectorIndex:
+        segment = self.store.read(user_id) if self.store is not None and self.pager is not None else None
+        if segment is None:
+            self.cold_loads += 1
+            return self.loader(user_id)
+        start = time.perf_counter()
+        index = self.pager(user_id, *segment)
+        self.page_ins += 1
+        self.page_in_latencies.append(time.perf_counter() - start)
+        # 换入后与磁盘段一致，再次驱逐时不必重写
+        self.stored_versions[user_id] = index.version
+        return index
+
+    def _evict_over_budget(self, keep: str) -> None:
+        if not self.memory_budget:
+            return
+        resident = sum(index.nbytes for index in self.indices.values())
+        while resident > self.memory_budget and len(self.indices) > 1:
+            user_id, index = next(iter(self.indices.items()))
+            if user_id == keep:
+                self.indices.move_to_end(user_id)
+                continue
+            self._evict(user_id, index)
+            resident -= index.nbytes
+
+    def _evict(self, user_id: str, index: UserVectorIndex) -> None:
+        if self.store is not None:
+            try:
+                if self.stored_versions.get(user_id) != index.version or user_id not in self.store:
+                    self.store.write(user_id, *index.export())
+                    self.stored_versions[user_id] = index.version
+            except Exception as e:
+                logger.error(f"Failed to spill vector index of user {user_id} to disk: {str(e)}")
+                self.store.discard(user_id)
+        del self.indices[user_id]
+        index.release()
+        self.evictions += 1
+
+    def is_loaded(self, user_id) -> bool:
+        return str(user_id) in self.indices
+
+    def _discard_stored(self, user_id: str) -> None:
+        # 冷用户的数据发生变化，磁盘段过期，下次从 MySQL/Redis 完整构建
+        self.stored_versions.pop(user_id, None)
+        if self.store is not None:
+            self.store.discard(user_id)
+
+    def upsert(self, user_id, item, embedding=None) -> None:
+        """
+        增量写入一条知识；embedding 为空时只更新元数据
+
+        用户索引未加载时直接忽略（并丢弃过期的磁盘段），等下次检索时再完整构建；
+        正在加载时记录下来，加载完成后重放。
+        """
+        self._change(str(user_id), ("upsert", item, embedding))
+
+    def remove(self, user_id, knowledge_id: int) -> None:
+        self._change(str(user_id), ("remove", knowledge_id))
+
+    def _change(self, user_id: str, operation: Tuple) -> None:
+        with self.lock:
+            index = self.indices.get(user_id)
+            if index is None:
+                self._discard_stored(user_id)
+                if user_id in self.pending:
+                    self.pending[user_id].append(operation)
+                return
+            self._apply(index, operation)
+
+    def set_tool(self, user_id, tool_id: int, tool) -> None:
+        """缓存已加载用户的工具元数据"""
+        index = self.indices.get(str(user_id))
+        if index is not None:
+            index.set_tools({tool_id: tool})
+
+    def invalidate_tool(self, user_id, tool_id: int) -> None:
+        """工具修改或删除后丢弃缓存，下次检索时重新查询"""
+        index = self.indices.get(str(user_id))
+        if index is not None:
+            index.drop_tool(tool_id)
+
+    def invalidate(self, user_id) -> None:
+        """丢弃用户索引，下次检索时重新构建"""
+        user_id = str(user_id)
+        with self.lock:
+            index = self.indices.pop(user_id, None)
+            self._discard_stored(user_id)
+            if user_id in self.pending:
+                self.pending[user_id].append(("invalidate",))
+        if index is not None:
+            index.release()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            indices = list(self.indices.values())
+            latencies = sorted(self.page_in_latencies)
+        stats = {
+            "users": len(indices),
+            "items": sum(len(index) for index in indices),
+            "bytes": sum(index.nbytes for index in indices),
+            "memory_budget": self.memory_budget,
+            "evictions": self.evictions,
+            "page_ins": self.page_ins,
+            "cold_loads": self.cold_loads,
+            "page_in_ms_p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+            "page_in_ms_p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        }
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        return stats
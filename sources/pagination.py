@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sources.logger import Logger
+
+logger = Logger("pagination.log")
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无法解析"""
+
+
+def encode_cursor(sort_value, row_id) -> str:
+    """
+    把最后一行的 (排序时间, id) 编码为不透明的下一页游标
+
+    Args:
+        sort_value: 排序列的值（datetime）
+        row_id: 行主键
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, int(row_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析 encode_cursor 生成的游标，格式不正确时抛出 InvalidCursorError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception as e:
+        raise InvalidCursorError(f"invalid cursor: {cursor}") from e
+
+
+def keyset_condition(sort_column: str, id_column: str = "id") -> str:
+    """
+    ORDER BY sort_column DESC, id_column DESC 时“位于游标之后”的条件
+
+    对应参数由 keyset_params 生成；配合 (..., sort_column) 复合索引，深分页不再需要扫描并丢弃 OFFSET 行。
+    """
+    return f"AND ({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))"
+
+
+def keyset_params(cursor: Tuple[datetime, int]) -> List:
+    sort_value, row_id = cursor
+    return [sort_value, sort_value, row_id]
+
+
+def next_page_cursor(rows: List[Dict], limit: int, sort_key: str, id_key: str = "id") -> Optional[str]:
+    """本页已满时返回下一页游标，否则返回 None（没有更多数据）"""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[sort_key], last[id_key])
+
+
+class CountCache:
+    """
+    列表接口总数的 Redis 缓存
+
+    每个作用域（如某个用户的知识、全部公开工具）对应一个 Redis hash，字段是查询条件的摘要，值是 COUNT(*)
+    的结果。写入时删除整个作用域的 hash；hash 带 TTL，计数在与写入并发时可能短暂偏旧，最长不超过 ttl 秒。
+    Redis 不可用时直接回源计数。
+    """
+
+    def __init__(self, redis_factory: Callable, ttl: int = 300, prefix: str = "count_cache"):
+        self.redis_factory = redis_factory
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def _key(self, scope: str) -> str:
+        return f"{self.prefix}:{scope}"
+
+    @staticmethod
+    def _field(condition) -> str:
+        return hashlib.sha1(json.dumps(condition, default=str).encode("utf-8")).hexdigest()
+
+    def get_or_compute(self, scope: str, condition, compute: Callable[[], int]) -> int:
+        """
+        返回缓存的总数，未命中时调用 compute() 计数并写回
+
+        Args:
+            scope: 写入时整体失效的作用域
+            condition: 作用域内的查询条件（如搜索词），任意可 JSON 序列化的值
+            compute: 回源计数函数
+        """
+        key, field = self._key(scope), self._field(condition)
+        try:
+            cached = self.redis_factory().hget(key, field)
+        except Exception as e:
+            logger.error(f"Failed to read cached count {key}: {str(e)}")
+            cached = None
+            with self.lock:
+                self.errors += 1
+        if cached is not None:
+            with self.lock:
+                self.hits += 1
+            return int(cached)
+
+        with self.lock:
+            self.misses += 1
+        total = compute()
+        try:
+            pipe = self.redis_factory().pipeline(transaction=False)
+            pipe.hset(key, field, total)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to cache count {key}: {str(e)}")
+            with self.lock:
+                self.errors += 1
+        return total
+
+    def invalidate(self, *scopes: str) -> None:
+        """数据写入后失效这些作用域的全部计数"""
+        if not scopes:
+            return
+        try:
+            self.redis_factory().delete(*[self._key(scope) for scope in scopes])
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached counts {scopes}: {str(e)}")
+            with self.lock:
+                self.errors += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "ttl": self.ttl,
+            }
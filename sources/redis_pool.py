@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Iterable, Optional
+
+import redis
+import redis.asyncio
+
+# 进程内共享的 Redis 连接池：文本（decode_responses=True）和二进制各一个
+_pools: Dict[bool, redis.BlockingConnectionPool] = {}
+_clients: Dict[bool, redis.Redis] = {}
+# asyncio 连接池绑定到创建它的事件循环，每个事件循环各自持有一组客户端
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[bool, redis.asyncio.Redis]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _pool_options(decode_responses: bool) -> Dict:
+    return {
+        "host": os.getenv("REDIS_HOST"),
+        "port": int(os.getenv("REDIS_PORT", 6379)),
+        "decode_responses": decode_responses,
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+        # 连接数达到上限时等待空闲连接的秒数
+        "timeout": float(os.getenv("REDIS_POOL_TIMEOUT", 5)),
+        "socket_connect_timeout": float(os.getenv("REDIS_CONNECT_TIMEOUT", 10)),
+        "socket_timeout": float(os.getenv("REDIS_SOCKET_TIMEOUT", 10)),
+        "health_check_interval": int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30)),
+    }
+
+
+def get_redis_client(decode_responses: bool = True) -> redis.Redis:
+    """
+    返回进程内共享的同步 Redis 客户端
+
+    Args:
+        decode_responses: 读取二进制数据（如 embedding）时传 False
+    """
+    client = _clients.get(decode_responses)
+    if client is not None:
+        return client
+    with _lock:
+        if decode_responses not in _clients:
+            pool = redis.BlockingConnectionPool(**_pool_options(decode_responses))
+            _pools[decode_responses] = pool
+            _clients[decode_responses] = redis.Redis(connection_pool=pool)
+        return _clients[decode_responses]
+
+
+def get_async_redis_client(decode_responses: bool = True) -> redis.asyncio.Redis:
+    """返回当前事件循环共享的 asyncio Redis 客户端，必须在事件循环中调用"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if decode_responses not in clients:
+            pool = redis.asyncio.BlockingConnectionPool(**_pool_options(decode_responses))
+            clients[decode_responses] = redis.asyncio.Redis(connection_pool=pool)
+        return clients[decode_responses]
+
+
+def redis_pool_stats() -> Dict:
+    """同步连接池的使用情况"""
+    stats = {}
+    for decode_responses, pool in list(_pools.items()):
+        # BlockingConnectionPool 的队列里用 None 占位未创建的连接
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        created = len(pool._connections)
+        stats["text" if decode_responses else "binary"] = {
+            "max_connections": pool.max_connections,
+            "created": created,
+            "idle": idle,
+            "in_use": created - idle,
+        }
+    return stats
+
+
+def incr_with_expiry(client: redis.Redis, key: str, ttl: int) -> int:
+    """
+    计数器加一，并保证键带有过期时间
+
+    INCR 和 TTL 在一次往返中发送；只有新建的键（没有过期时间）才需要第二次往返设置 EXPIRE。
+    """
+    pipe = client.pipeline(transaction=False)
+    pipe.incr(key)
+    pipe.ttl(key)
+    count, current_ttl = pipe.execute()
+    if current_ttl < 0:
+        client.expire(key, ttl)
+    return count
+
+
+async def aincr_with_expiry(client: redis.asyncio.Redis, key: str, ttl: int) -> int:
+    """incr_with_expiry 的 asyncio 版本"""
+    pipe = client.pipeline(transaction=False)
+    pipe.incr(key)
+    pipe.ttl(key)
+    count, current_ttl = await pipe.execute()
+    if current_ttl < 0:
+        await client.expire(key, ttl)
+    return count
+
+
+def set_many(client: redis.Redis, mapping: Dict, ex: Optional[int] = None) -> None:
+    """在一次往返中写入多个键，可选统一的过期时间"""
+    if not mapping:
+        return
+    pipe = client.pipeline(transaction=False)
+    for key, value in mapping.items():
+        pipe.set(key, value, ex=ex)
+    pipe.execute()
+
+
+def delete_many(client: redis.Redis, keys: Iterable[str], chunk_size: int = 500) -> int:
+    """分块 DEL 多个键并在一次往返中发送，返回删除的数量"""
+    keys = list(keys)
+    if not keys:
+        return 0
+    pipe = client.pipeline(transaction=False)
+    for start in range(0, len(keys), chunk_size):
+        pipe.delete(*keys[start:start + chunk_size])
+    return sum(pipe.execute())
+
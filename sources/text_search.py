@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from typing import List, Sequence, Tuple
+
+SEARCH_MODES = ("fulltext", "like")
+DEFAULT_SEARCH_MODE = os.getenv("TEXT_SEARCH_MODE", "fulltext")
+# 与 MySQL 的 ngram_token_size 保持一致，短于它的查询词无法在 ngram 索引中匹配
+NGRAM_TOKEN_SIZE = int(os.getenv("NGRAM_TOKEN_SIZE", 2))
+
+
+class TextSearch:
+    """
+    列表接口的文本搜索条件
+
+    - fulltext：在 FULLTEXT(... ) WITH PARSER ngram 索引上做 BOOLEAN MODE 短语匹配（与 LIKE '%q%' 的语义接近），
+      结果按 NATURAL LANGUAGE MODE 的相关度排序
+    - like：原有的 LIKE '%q%' 模糊匹配，逐行扫描，作为兼容和兜底路径
+
+    查询词短于 ngram_token_size，或表上还没有 FULLTEXT 索引（迁移未执行）时自动退回 like。
+    """
+
+    def __init__(self, table: str, columns: Sequence[str], missing_index_ttl: float = 300):
+        self.table = table
+        self.columns = tuple(columns)
+        self.match = f"MATCH({', '.join(self.columns)})"
+        self.missing_index_ttl = missing_index_ttl
+        self.has_index = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def fulltext_available(self, cursor) -> bool:
+        """检查表上是否有 FULLTEXT 索引；存在时结果永久缓存，不存在时 missing_index_ttl 秒后重新检查"""
+        with self.lock:
+            if self.has_index or (self.has_index is False and time.monotonic() - self.checked_at < self.missing_index_ttl):
+                return self.has_index
+        cursor.execute(
+            """
+            SELECT 1
+            FROM information_schema.STATISTICS
+            WHERE table_schema = DATABASE()
+              AND table_name = %s
+              AND index_type = 'FULLTEXT'
+            LIMIT 1
+            """,
+            (self.table,)
+        )
+        has_index = cursor.fetchone() is not None
+        with self.lock:
+            self.has_index = has_index
+            self.checked_at = time.monotonic()
+        return has_index
+
+    def resolve_mode(self, cursor, query: str, mode: str) -> str:
+        """返回实际使用的搜索方式"""
+        if mode != "fulltext" or len(query.strip()) < NGRAM_TOKEN_SIZE:
+            return "like"
+        return "fulltext" if self.fulltext_available(cursor) else "like"
+
+    def condition(self, query: str, mode: str) -> Tuple[str, List]:
+        """
+        生成追加在 WHERE 之后的搜索条件
+
+        Returns:
+            Tuple[str, List]: (以 AND 开头的 SQL 片段, 对应参数)
+        """
+        if mode == "fulltext":
+            # 短语匹配：ngram 把短语拆成相邻的 n-gram 并要求按顺序出现
+            phrase = '"' + query.strip().replace('"', " ") + '"'
+            return f"AND {self.match} AGAINST (%s IN BOOLEAN MODE)", [phrase]
+        search_pattern = f"%{query}%"
+        return "AND (" + " OR ".join(f"{column} LIKE %s" for column in self.columns) + ")", \
+            [search_pattern] * len(self.columns)
+
+    def relevance_order(self, query: str) -> Tuple[str, List]:
+        """fulltext 模式下的 ORDER BY 片段（相关度倒序，id 作为次序）及参数"""
+        return f"{self.match} AGAINST (%s IN NATURAL LANGUAGE MODE) DESC, id DESC", [query.strip()]
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio
+
+# 一次往返完成准入：解析 firebase uid 映射（调用方已知 user_id 时跳过），当日计数加一，新建的计数键设置过期时间。
+# 计数键由映射得到的 user_id 拼出，不在 KEYS 中声明，只适用于单实例 Redis（与现有部署一致）。
+# 返回 {user_id, count}；映射不存在时返回 {'', 0}，由调用方查库建立映射后带 user_id 再执行一次。
+ADMISSION_SCRIPT = """
+local user_id = ARGV[1]
+if user_id == '' then
+    user_id = redis.call('GET', KEYS[1])
+    if not user_id then
+        return {'', 0}
+    end
+end
+local key = 'api_usage_' .. user_id .. '_' .. ARGV[2]
+local count = redis.call('INCR', key)
+if redis.call('TTL', key) < 0 then
+    redis.call('EXPIRE', key, ARGV[3])
+end
+return {user_id, count}
+"""
+
+
+def uid_mapping_key(firebase_uid: str) -> str:
+    """firebase uid 到 user_id 映射的 Redis 键"""
+    return f"firebase_uid_{firebase_uid}"
+
+
+async def aadmit(client: redis.asyncio.Redis, firebase_uid: str, user_id: Optional[str], day: str,
+                 ttl: int) -> Tuple[Optional[str], int]:
+    """
+    执行准入脚本
+
+    Args:
+        client: decode_responses=True 的 asyncio Redis 客户端
+        firebase_uid: token 中的 firebase uid
+        user_id: 已知的 user_id；为空时由脚本读取映射
+        day: 计数键的日期后缀（UTC，%Y%m%d）
+        ttl: 新建计数键的过期秒数
+
+    Returns:
+        Tuple[Optional[str], int]: user_id 和当日计数；映射不存在时为 (None, 0)
+    """
+    # register_script 只计算脚本的 SHA1，执行时 EVALSHA，脚本未加载时自动回退到 EVAL
+    script = client.register_script(ADMISSION_SCRIPT)
+    mapped_user_id, count = await script(keys=[uid_mapping_key(firebase_uid)],
+                                         args=["" if user_id is None else str(user_id), day, ttl])
+    if isinstance(mapped_user_id, bytes):
+        mapped_user_id = mapped_user_id.decode("utf-8")
+    return (mapped_user_id or None), int(count)
+
+
+class LocalQuotaBucket:
+    """
+    进程内的每日额度令牌桶，在访问 Redis 之前拒绝明显超限的用户
+
+    桶的容量为每日上限，每个 UTC 日开始时补满；令牌数不在本地扣减，而是用 Redis 返回的当日计数同步
+    （剩余 = 上限 - 计数）。当日计数只增不减，其他进程的调用只会让真实剩余更少，因此本地令牌耗尽时
+    拒绝一定正确；本地仍有令牌时交给 Redis 计数判定。
+    """
+
+    def __init__(self, limit: int, max_size: int = 100000):
+        self.limit = limit
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, user_id, day: str) -> bool:
+        key = str(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != day or entry[1] > 0:
+                return True
+            self.entries.move_to_end(key)
+            self.rejected += 1
+            return False
+
+    def observe(self, user_id, day: str, count: int) -> None:
+        """用 Redis 返回的当日计数同步剩余令牌"""
+        key = str(user_id)
+        with self.lock:
+            self.entries[key] = (day, self.limit - count)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"size": len(self.entries), "rejected_locally": self.rejected}
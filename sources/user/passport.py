@@ -1,8 +1,16 @@
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
 import firebase_admin
-from firebase_admin import auth, credentials
+from firebase_admin import auth, credentials, _token_gen
 from fastapi import HTTPException
-from sources.knowledge.knowledge import get_db_connection, get_redis_connection
-import random
+from starlette.concurrency import run_in_threadpool
+from sources.knowledge.knowledge import get_redis_connection, db_connection
+from sources.redis_pool import incr_with_expiry, aincr_with_expiry, get_async_redis_client
+from sources.user.token_cache import VerifiedTokenCache, CertificatePrefetcher
+from sources.user.admission import LocalQuotaBucket, aadmit
+from sources.user.snowflake import SnowflakeGenerator
 from datetime import datetime, timedelta, timezone
 from sources.logger import Logger
 import traceback
@@ -12,8 +20,18 @@ logger = Logger("passport.log")
 cred = credentials.Certificate("firebase_service_key.json")
 firebase_admin.initialize_app(cred)
 
-# 初始化 Redis 连接
-redis_client = get_redis_connection()  # 根据实际情况调整配置
+# 进程内共享的 Redis 客户端
+redis_client = get_redis_connection()
+
+# 新用户 user_id 的生成器，多节点部署时通过 SNOWFLAKE_NODE_ID 为每个进程分配不同的节点号
+user_id_generator = SnowflakeGenerator()
+
+# 已验证 token 的进程内缓存：同一 token 再次请求时跳过签名验证和 uid 映射查询
+verified_token_cache = VerifiedTokenCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+                                          margin=int(os.getenv("TOKEN_CACHE_MARGIN", 60)))
+
+# Firebase 公钥证书的后台预取，由 start_certificate_prefetch 创建
+certificate_prefetcher: Optional[CertificatePrefetcher] = None
 
 # 白名单配置 - 字典形式
 WHITELIST_TOKENS = {
@@ -28,7 +46,7 @@ WHITELIST_TOKENS = {
     # }
 }
 
-def verify_firebase_token(auth_header: str):
+def _id_token_from_header(auth_header: str) -> str:
     # 检查是否为白名单请求
     # if auth_header in WHITELIST_TOKENS:
     #     return WHITELIST_TOKENS[auth_header]
@@ -36,12 +54,57 @@ def verify_firebase_token(auth_header: str):
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
 
-    id_token = auth_header.split("Bearer ")[1]
+    return auth_header.split("Bearer ")[1]
+
 
+def _decode_firebase_token(id_token: str) -> dict:
+    """验证 ID token 的签名和有效期，返回解码后的 claims"""
     try:
+        return auth.verify_id_token(id_token)
+    except Exception as e:
+        logger.error(f"Error id token:{id_token}: {str(e)}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def provision_user(firebase_uid, email: str) -> int:
+    """
+    按 firebase uid 查询或创建用户
 
-        decoded_token = auth.verify_id_token(id_token)
-        firebase_uid = decoded_token['uid']
+    新用户的 user_id 由 snowflake 生成器分配。INSERT ... ON DUPLICATE KEY 以 firebase_uid 唯一键判重：
+    用户已存在时不修改记录，通过 LAST_INSERT_ID(user_id) 取回已有的 user_id，并发的首次登录也只会创建一个用户。
+    冲突的是其他用户的 user_id 或 email 时不取回（避免把该 firebase uid 关联到别人的账号），
+    user_id 冲突换一个ID重试一次，email 冲突则失败。已有用户的判重也会占用一个自增 id，不影响使用。
+
+    Returns:
+        int: user_id
+    """
+    for attempt in range(2):
+        new_user_id = user_id_generator.next_id()
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO users (user_id, firebase_uid, email) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        user_id = IF(firebase_uid = VALUES(firebase_uid), LAST_INSERT_ID(user_id), user_id)
+                    """,
+                    (new_user_id, firebase_uid, email)
+                )
+                inserted, existing_user_id = cursor.rowcount, cursor.lastrowid
+            conn.commit()
+        if inserted == 1:
+            logger.info(f"Created user {new_user_id} for firebase uid {firebase_uid}")
+            return new_user_id
+        if existing_user_id:
+            return existing_user_id
+        logger.warning(f"User id {new_user_id} or email conflicts with another user (attempt {attempt + 1})")
+    raise ValueError(f"Failed to provision user for firebase uid {firebase_uid}")
+
+
+def _map_firebase_user(decoded_token: dict) -> dict:
+    """把 claims 中的 firebase uid 替换为 user_id，首次登录时创建用户"""
+    firebase_uid = decoded_token['uid']
+    try:
 
         # 先检查 Redis 中是否存在
         user_data = redis_client.get(f"firebase_uid_{firebase_uid}")
@@ -49,66 +112,57 @@ def verify_firebase_token(auth_header: str):
             # Redis 中存在，用缓存的 user_id 覆盖 uid
             decoded_token['uid'] = user_data
         else:
-            # Redis 中不存在，查询数据库
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            # 查询数据库中的 user 表
-            cursor.execute("SELECT user_id, email FROM users WHERE firebase_uid = %s", (firebase_uid,))
-            result = cursor.fetchone()
-
-            if result:
-                # 数据库中找到记录，用 user_id 覆盖 uid
-                user_id = result['user_id']
-                decoded_token['uid'] = user_id
-                # 写入 Redis 缓存
-                redis_client.setex(f"firebase_uid_{firebase_uid}", 86400, user_id)  # 缓存1小时
-            else:
-                # 数据库中也不存在，需要创建新用户
-                # 最多尝试5次生成唯一的user_id
-                user_id = None
-                attempts = 0
-                max_attempts = 5
-
-                while attempts < max_attempts:
-                    # 生成64位正整数作为 user_id
-                    new_user_id = random.getrandbits(64)
-
-                    # 检查user_id是否已存在
-                    cursor.execute("SELECT COUNT(*) AS cnt FROM users WHERE user_id = %s", (new_user_id,))
-                    row = cursor.fetchone()
-                    logger.info(f"attempt: {attempts}, new user id: {new_user_id}")
-                    if row and row['cnt'] > 0:
-                        attempts += 1
-                    else:
-                        # user_id唯一，可以使用
-                        user_id = new_user_id
-                        break
-
-                # 如果成功生成了唯一的user_id，则插入数据库
-                if user_id is not None and attempts < max_attempts:
-                    # 插入数据库
-                    cursor.execute(
-                        "INSERT INTO users (user_id, firebase_uid, email) VALUES (%s, %s, %s)",
-                        (user_id, firebase_uid, decoded_token['email'])
-                    )
-                    conn.commit()
-
-                    # 用新生成的 user_id 覆盖 uid
-                    decoded_token['uid'] = user_id
-                    # 写入 Redis 缓存
-                    redis_client.setex(f"firebase_uid_{firebase_uid}", 86400, user_id)  # 缓存10天
-                elif attempts >= max_attempts:
-                    conn.close()
-                    raise HTTPException(status_code=500, detail="Failed to generate unique user_id after 5 attempts")
-
-            conn.close()
+            # Redis 中不存在：查询或创建用户只需一条语句
+            user_id = provision_user(firebase_uid, decoded_token['email'])
+            decoded_token['uid'] = user_id
+            # 写入 Redis 缓存
+            redis_client.setex(f"firebase_uid_{firebase_uid}", 86400, user_id)
 
         return decoded_token
     except Exception as e:
-        logger.error(f"Error id token:{id_token}: {str(e)}")
+        logger.error(f"Error mapping firebase uid {firebase_uid}: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
+
+def verify_firebase_token(auth_header: str):
+    id_token = _id_token_from_header(auth_header)
+
+    cached_token = verified_token_cache.get(id_token)
+    if cached_token is not None:
+        return cached_token
+
+    decoded_token = _map_firebase_user(_decode_firebase_token(id_token))
+    verified_token_cache.put(id_token, decoded_token)
+    return decoded_token
+
+
+def start_certificate_prefetch() -> Optional[threading.Event]:
+    """
+    启动 Firebase 公钥证书的后台预取
+
+    Returns:
+        Optional[threading.Event]: 用于停止预取线程的事件；无法取得 firebase_admin 的证书 session 时返回 None
+    """
+    global certificate_prefetcher
+    try:
+        # 预取必须写入 firebase_admin 验证 token 时使用的同一个带缓存 session
+        session = auth._get_client(firebase_admin.get_app())._token_verifier.request.session
+    except AttributeError as e:
+        logger.warning(f"Firebase certificate session unavailable, prefetch disabled: {str(e)}")
+        return None
+    certificate_prefetcher = CertificatePrefetcher(session, _token_gen.ID_TOKEN_CERT_URI,
+                                                   refresh_margin=int(os.getenv("FIREBASE_CERT_REFRESH_MARGIN", 300)))
+    return certificate_prefetcher.start()
+
+
+def token_cache_stats() -> dict:
+    return {
+        "verified_tokens": verified_token_cache.stats(),
+        "local_quota": local_quota.stats(),
+        "certificates": certificate_prefetcher.stats() if certificate_prefetcher is not None else None
+    }
+
+
 def seconds_until_end_of_day() -> int:
     now = datetime.now(timezone.utc)
     tomorrow = (now + timedelta(days=1)).replace(
@@ -118,6 +172,9 @@ def seconds_until_end_of_day() -> int:
 
 MAX_DAILY_CALLS = 100
 
+# 本进程已知当日额度耗尽的用户在访问 Redis 之前直接拒绝
+local_quota = LocalQuotaBucket(MAX_DAILY_CALLS)
+
 def check_and_increase_usage(user_id: int) -> bool:
     """
     返回 True：允许调用
@@ -126,11 +183,8 @@ def check_and_increase_usage(user_id: int) -> bool:
     today = datetime.utcnow().strftime("%Y%m%d")
     key = f"api_usage_{user_id}_{today}"
 
-    count = redis_client.incr(key)
-
-    if count == 1:
-        # 第一次使用，设置过期时间到当天结束
-        redis_client.expire(key, seconds_until_end_of_day())
+    # INCR 与过期时间检查在一次往返内完成，计数键在当天结束时过期
+    count = incr_with_expiry(redis_client, key, seconds_until_end_of_day())
 
     if count > MAX_DAILY_CALLS:
         return False
@@ -138,6 +192,27 @@ def check_and_increase_usage(user_id: int) -> bool:
     return True
 
 
+def get_user_emails(cursor, user_ids: Iterable) -> Dict[int, str]:
+    """
+    用调用方已打开的游标一次查询多个用户的邮箱
+
+    Args:
+        cursor: 调用方连接上的游标，不再从连接池借出第二个连接
+        user_ids: 用户ID
+
+    Returns:
+        Dict[int, str]: user_id -> email，不存在的用户不返回
+    """
+    user_ids = sorted({int(user_id) for user_id in user_ids})
+    if not user_ids:
+        return {}
+    cursor.execute(
+        f"SELECT user_id, email FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+        user_ids
+    )
+    return {row['user_id']: row['email'] for row in cursor.fetchall()}
+
+
 def get_user_by_id(user_id: str):
     """
     根据user_id查询user表，返回用户数据
@@ -149,15 +224,15 @@ def get_user_by_id(user_id: str):
         dict: 用户数据，如果用户不存在则返回None
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_connection() as conn:
+            cursor = conn.cursor()
 
-        # 查询用户数据
-        query_sql = "SELECT user_id, firebase_uid, email, oauth_provider, oauth_provider_id, is_active, create_time, update_time FROM users WHERE user_id = %s"
-        params = [int(user_id)]
+            # 查询用户数据
+            query_sql = "SELECT user_id, firebase_uid, email, oauth_provider, oauth_provider_id, is_active, create_time, update_time FROM users WHERE user_id = %s"
+            params = [int(user_id)]
 
-        cursor.execute(query_sql, params)
-        result = cursor.fetchone()
+            cursor.execute(query_sql, params)
+            result = cursor.fetchone()
 
         if result:
             # 将查询结果转换为字典格式
@@ -178,6 +253,47 @@ def get_user_by_id(user_id: str):
     except Exception as e:
         logger.error(f"Error querying user by ID {user_id}: {str(e)}")
         return None
-    finally:
-        if conn:
-            conn.close()
+
+
+async def acheck_and_increase_usage(user_id: int) -> bool:
+    """check_and_increase_usage 的 asyncio 版本，供 async 路由使用，不阻塞事件循环"""
+    today = datetime.utcnow().strftime("%Y%m%d")
+    key = f"api_usage_{user_id}_{today}"
+
+    count = await aincr_with_expiry(get_async_redis_client(), key, seconds_until_end_of_day())
+
+    return count <= MAX_DAILY_CALLS
+
+
+async def admit_query(auth_header: str) -> Tuple[dict, bool]:
+    """
+    查询接口的准入：验证 token 并消耗一次当日额度
+
+    token 命中进程内缓存时不做签名验证，额度已在本地耗尽的用户直接拒绝，否则只有一次 Redis 往返
+    （准入脚本完成 uid 映射、计数和过期时间设置）。未命中缓存时在线程池中验证签名；Redis 中没有
+    uid 映射（首次登录或映射过期）时查库建立映射后再计数。
+
+    Returns:
+        Tuple[dict, bool]: 解码后的 token（uid 为 user_id）和是否允许调用
+    """
+    id_token = _id_token_from_header(auth_header)
+    today = datetime.utcnow().strftime("%Y%m%d")
+    redis_conn = get_async_redis_client()
+
+    user = verified_token_cache.get(id_token)
+    if user is not None:
+        if not local_quota.allow(user['uid'], today):
+            return user, False
+        _, count = await aadmit(redis_conn, user.get('sub', ''), user['uid'], today, seconds_until_end_of_day())
+    else:
+        user = await run_in_threadpool(_decode_firebase_token, id_token)
+        firebase_uid = user['uid']
+        user_id, count = await aadmit(redis_conn, firebase_uid, None, today, seconds_until_end_of_day())
+        if user_id is None:
+            await run_in_threadpool(_map_firebase_user, user)
+            user_id, count = await aadmit(redis_conn, firebase_uid, user['uid'], today, seconds_until_end_of_day())
+        user['uid'] = user_id
+        verified_token_cache.put(id_token, user)
+
+    local_quota.observe(user['uid'], today, count)
+    return user, count <= MAX_DAILY_CALLS
@@ -0,0 +1,153 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from sources.logger import Logger
+
+logger = Logger("passport.log")
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def token_cache_key(id_token: str) -> bytes:
+    """缓存键为 ID token 的 SHA256，内存中不保留 token 原文"""
+    return hashlib.sha256(id_token.encode("utf-8")).digest()
+
+
+class VerifiedTokenCache:
+    """
+    已验证 ID token 的进程内有界 LRU 缓存
+
+    条目保存解码后的 claims（uid 已替换为映射后的 user_id），在 token 的 exp 之前 margin 秒过期，
+    因此缓存不会延长 token 的有效期。命中时返回 claims 的浅拷贝，调用方修改不影响缓存。
+    """
+
+    def __init__(self, max_size: int = 10000, margin: int = 60, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.margin = margin
+        self.clock = clock
+        self.entries: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, id_token: str) -> Optional[Dict]:
+        key = token_cache_key(id_token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(claims)
+
+    def put(self, id_token: str, claims: Dict) -> None:
+        """缓存验证通过的 claims，没有 exp 或即将过期的 token 不缓存"""
+        try:
+            expires_at = float(claims["exp"]) - self.margin
+        except (KeyError, TypeError, ValueError):
+            return
+        if expires_at <= self.clock():
+            return
+        key = token_cache_key(id_token)
+        with self.lock:
+            self.entries[key] = (expires_at, dict(claims))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+def cache_max_age(cache_control: Optional[str]) -> Optional[int]:
+    """解析 Cache-Control 响应头中的 max-age"""
+    match = MAX_AGE_PATTERN.search(cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+class CertificatePrefetcher:
+    """
+    后台预取 Firebase 公钥证书
+
+    firebase_admin 通过支持 HTTP 缓存的 session 获取证书，缓存过期后第一个验证 token 的请求要同步等待
+    证书下载。本类在缓存过期前 refresh_margin 秒用 Cache-Control: no-cache 请求同一个 session，
+    绕过旧缓存并写入新证书，请求路径上始终命中缓存。
+    """
+
+    def __init__(self, session, url: str, refresh_margin: int = 300, min_interval: int = 60,
+                 retry_interval: int = 30, timeout: float = 10):
+        """
+        Args:
+            session: firebase_admin 验证 token 使用的 requests session（cachecontrol 包装）
+            url: 证书地址
+            refresh_margin: 在 max-age 到期前多少秒刷新
+        """
+        self.session = session
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.min_interval = min_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.stop_event = threading.Event()
+        self.refreshes = 0
+        self.failures = 0
+        self.next_refresh_at = None
+
+    def refresh(self) -> float:
+        """
+        下载一次证书
+
+        Returns:
+            float: 距下一次刷新的秒数
+        """
+        response = self.session.get(self.url, headers={"Cache-Control": "no-cache"}, timeout=self.timeout)
+        response.raise_for_status()
+        self.refreshes += 1
+        max_age = cache_max_age(response.headers.get("Cache-Control"))
+        if max_age is None:
+            return self.min_interval
+        return max(max_age - self.refresh_margin, self.min_interval)
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                delay = self.refresh()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Failed to prefetch Firebase certificates: {str(e)}")
+                delay = self.retry_interval
+            self.next_refresh_at = time.time() + delay
+            self.stop_event.wait(delay)
+
+    def start(self) -> threading.Event:
+        """启动后台刷新线程，返回用于停止线程的事件"""
+        threading.Thread(target=self.run, name="firebase-cert-prefetch", daemon=True).start()
+        return self.stop_event
+
+    def stats(self) -> Dict:
+        return {"refreshes": self.refreshes, "failures": self.failures, "next_refresh_at": self.next_refresh_at}
@@ -0,0 +1,55 @@
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.user.admission import ADMISSION_SCRIPT, LocalQuotaBucket, aadmit
+
+
+class FakeScriptClient:
+    """在内存中模拟准入脚本的 Redis 客户端"""
+
+    def __init__(self, mappings):
+        self.data = dict(mappings)
+        self.ttls = {}
+        self.calls = 0
+
+    def register_script(self, script):
+        assert script == ADMISSION_SCRIPT
+
+        async def run(keys, args):
+            self.calls += 1
+            user_id, day, ttl = args
+            if user_id == "":
+                user_id = self.data.get(keys[0])
+                if user_id is None:
+                    return ["", 0]
+            key = f"api_usage_{user_id}_{day}"
+            self.data[key] = self.data.get(key, 0) + 1
+            self.ttls.setdefault(key, ttl)
+            return [user_id, self.data[key]]
+        return run
+
+
+class TestAdmission(unittest.TestCase):
+    def test_script_resolves_mapping_and_counts(self):
+        client = FakeScriptClient({"firebase_uid_abc": "42"})
+        self.assertEqual(asyncio.run(aadmit(client, "abc", None, "20250101", 600)), ("42", 1))
+        self.assertEqual(asyncio.run(aadmit(client, "abc", 42, "20250101", 300)), ("42", 2))
+        self.assertEqual(client.ttls, {"api_usage_42_20250101": 600})
+        self.assertEqual(asyncio.run(aadmit(client, "missing", None, "20250101", 600)), (None, 0))
+
+    def test_local_bucket_rejects_only_after_quota_observed(self):
+        bucket = LocalQuotaBucket(limit=3)
+        self.assertTrue(bucket.allow(42, "20250101"))
+        bucket.observe(42, "20250101", 2)
+        self.assertTrue(bucket.allow("42", "20250101"))
+        bucket.observe(42, "20250101", 3)
+        self.assertFalse(bucket.allow(42, "20250101"))
+        self.assertTrue(bucket.allow(42, "20250102"))
+        self.assertEqual(bucket.stats(), {"size": 1, "rejected_locally": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.ann_index import IVFFlatIndex, PublicKnowledgeIndex
+
+
+def clustered_vectors(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+class TestIVFFlatIndex(unittest.TestCase):
+    def setUp(self):
+        self.vectors = clustered_vectors(2000)
+        self.index = IVFFlatIndex(nprobe=8)
+        self.index.add_many(list(range(2000)), self.vectors)
+
+    def test_untrained_index_is_exact(self):
+        hits = self.index.search(self.vectors[7], top_k=1)
+        self.assertEqual(hits[0][0], 7)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_trained_recall(self):
+        self.index.train(nlist=40)
+        self.assertEqual(len(self.index), 2000)
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        queries = clustered_vectors(50, seed=1)
+        recall = []
+        for query in queries:
+            exact = set(np.argsort(-(normalized @ query))[:10].tolist())
+            approx = {knowledge_id for knowledge_id, _ in self.index.search(query, top_k=10)}
+            recall.append(len(exact & approx) / 10)
+        self.assertGreater(np.mean(recall), 0.9)
+
+    def test_incremental_insert_and_delete(self):
+        self.index.train(nlist=40)
+        self.assertTrue(self.index.remove(7))
+        self.assertFalse(self.index.remove(7))
+        self.assertNotEqual(self.index.search(self.vectors[7], top_k=1)[0][0], 7)
+        self.index.add(5000, self.vectors[7])
+        self.index.add(5000, self.vectors[7])
+        self.assertEqual(self.index.search(self.vectors[7], top_k=1)[0][0], 5000)
+        self.assertEqual(len(self.index), 2000)
+
+    def test_snapshot_round_trip(self):
+        self.index.train(nlist=40)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ann.npz")
+            self.index.save(path, built_at=123.0)
+            restored, metadata = IVFFlatIndex.load(path)
+        self.assertEqual(metadata["built_at"], 123.0)
+        self.assertEqual(restored.nlist, 40)
+        query = self.vectors[42]
+        self.assertEqual(restored.search(query, top_k=5), self.index.search(query, top_k=5))
+        restored.remove(42)
+        self.assertEqual(len(restored), 1999)
+
+
+class TestPublicKnowledgeIndex(unittest.TestCase):
+    def test_restore_applies_changes_since_snapshot(self):
+        vectors = clustered_vectors(100)
+        calls = []
+
+        def loader():
+            calls.append("full")
+            yield list(range(100)), vectors
+
+        def delta_loader(since):
+            calls.append(since)
+            return {500: vectors[3]}, [3]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ann.npz")
+            first = PublicKnowledgeIndex(loader, delta_loader, clock=lambda: 1000.0, snapshot_path=path, min_train_size=10)
+            self.assertEqual(len(first.get()), 100)
+            self.assertEqual(first.get().nlist, 40)
+
+            second = PublicKnowledgeIndex(loader, delta_loader, clock=lambda: 2000.0, snapshot_path=path)
+            index = second.get()
+        self.assertEqual(calls, ["full", 940.0])
+        self.assertEqual(len(index), 100)
+        self.assertEqual(second.search(vectors[3], top_k=1)[0][0], 500)
+
+    def test_updates_ignored_until_loaded(self):
+        index = PublicKnowledgeIndex(lambda: iter(()), lambda since: ({}, []))
+        index.upsert(1, [1.0, 0.0])
+        self.assertFalse(index.is_loaded())
+        index.get()
+        index.upsert(1, [1.0, 0.0])
+        self.assertTrue(index.contains(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("VECTOR_INDEX_STORE_DIR", tempfile.mkdtemp())
+from sources.knowledge import knowledge
+from sources.knowledge.bulk_import import ImportParser, validate_import_record
+from sources.knowledge.embedding_pipeline import knowledge_content_hash
+
+
+def feed_in_chunks(parser, data: bytes, size: int):
+    rows = []
+    for start in range(0, len(data), size):
+        rows.extend(parser.feed(data[start:start + size]))
+    return rows + parser.close()
+
+
+class TestImportParser(unittest.TestCase):
+    def test_ndjson_split_across_chunks(self):
+        data = '{"question": "查询订单", "answer": "调用接口"}\n\nnot json\n[1]\n{"question": "q2"}'.encode("utf-8")
+        rows = feed_in_chunks(ImportParser("ndjson"), data, 5)
+        self.assertEqual([row for row, _, _ in rows], [1, 2, 3, 4])
+        self.assertEqual(rows[0][1], {"question": "查询订单", "answer": "调用接口"})
+        self.assertTrue(rows[1][2].startswith("invalid JSON"))
+        self.assertEqual(rows[2][2], "each line must be a JSON object")
+        self.assertEqual(rows[3][1], {"question": "q2"})
+
+    def test_csv_with_quoted_newlines_and_bom(self):
+        data = '﻿question,answer,toolId\r\n"多行\n问题","a, b",3\r\nq2,a2\r\n'.encode("utf-8")
+        rows = feed_in_chunks(ImportParser("csv"), data, 4)
+        self.assertEqual(rows[0], (1, {"question": "多行\n问题", "answer": "a, b", "toolId": "3"}, None))
+        self.assertEqual(rows[1], (2, None, "expected 3 columns, got 2"))
+
+
+class TestValidateImportRecord(unittest.TestCase):
+    def test_normalizes_csv_strings_and_aliases(self):
+        data, errors = validate_import_record({"question": "q", "answer": "a", "tool_id": "3", "public": "2",
+                                               "params": {"city": "北京"}})
+        self.assertEqual(errors, [])
+        self.assertEqual(data["tool_id"], 3)
+        self.assertEqual(data["public"], 2)
+        self.assertEqual(data["model_name"], "gpt-4o-mini")
+        self.assertEqual(data["params"], '{"city": "北京"}')
+
+    def test_reports_all_errors(self):
+        data, errors = validate_import_record({"question": "x" * 101, "toolId": "abc", "public": 5})
+        self.assertIsNone(data)
+        self.assertEqual(len(errors), 4)
+
+
+class FakeKnowledgeTable:
+    """模拟 knowledge 表的自增ID分配；interleave 时多行 INSERT 中间插入其他会话的一行"""
+
+    def __init__(self, increment=1, interleave=False):
+        self.increment = increment
+        self.interleave = interleave
+        self.next_id = 1
+        self.rows = {}
+        self.savepoint = None
+        self.commits = 0
+
+    def allocate(self):
+        knowledge_id = self.next_id
+        self.next_id += self.increment
+        return knowledge_id
+
+    def cursor(self):
+        return FakeImportCursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeImportCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        table = self.table
+        if sql.startswith("SELECT @@auto_increment_increment"):
+            self.result = [{"increment": table.increment}]
+        elif sql.startswith("SAVEPOINT"):
+            table.savepoint = dict(table.rows)
+        elif sql.startswith("ROLLBACK TO SAVEPOINT"):
+            table.rows = table.savepoint
+        elif sql.startswith("INSERT INTO knowledge"):
+            ids = []
+            for offset in range(0, len(params), 12):
+                if table.interleave and ids:
+                    table.allocate()
+                ids.append(table.allocate())
+                user_id, question, _, answer = params[offset:offset + 4]
+                table.rows[ids[-1]] = (user_id, knowledge_content_hash(question, answer))
+            self.lastrowid = ids[0]
+        elif sql.startswith("SELECT id, SHA1"):
+            user_id, *ids = params
+            self.result = [{"id": knowledge_id, "content_hash": table.rows[knowledge_id][1]}
+                           for knowledge_id in ids if table.rows.get(knowledge_id, (None,))[0] == user_id]
+        else:
+            raise AssertionError(sql)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class TestImportKnowledgeBatch(unittest.TestCase):
+    def setUp(self):
+        self.stored = {}
+        patches = {"set_many": lambda client, mapping: self.stored.update(mapping), "get_redis_connection": mock.Mock(),
+                   "schedule_knowledge_embedding": mock.Mock(), "invalidate_knowledge_counts": mock.Mock(),
+                   "sync_public_knowledge": mock.Mock()}
+        for name, value in patches.items():
+            patcher = mock.patch.object(knowledge, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(knowledge.vector_index_manager, "upsert")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.records = [(row, validate_import_record({"question": f"q{row}", "answer": "a", "toolId": 3})[0])
+                        for row in range(1, 6)]
+
+    def run_import(self, table):
+        with mock.patch.object(knowledge, "get_db_connection", lambda: table), \
+                mock.patch.object(knowledge, "IMPORT_INSERT_ROWS", 3):
+            return knowledge.import_knowledge_batch("7", self.records, {3: True},
+                                                    embed=lambda texts: [[float(len(text)), 1.0] for text in texts])
+
+    def assert_ids_match_content(self, table, result):
+        self.assertEqual(result["errors"], [])
+        for (row, knowledge_id), (_, data) in zip(result["imported"], self.records):
+            self.assertEqual(table.rows[knowledge_id][1], knowledge_content_hash(data["question"], data["answer"]))
+        self.assertEqual(sorted(self.stored), sorted(knowledge.knowledge_embedding_key(knowledge_id)
+                                                     for _, knowledge_id in result["imported"]))
+
+    def test_ids_follow_auto_increment_increment(self):
+        table = FakeKnowledgeTable(increment=2)
+        result = self.run_import(table)
+        self.assertEqual([knowledge_id for _, knowledge_id in result["imported"]], [1, 3, 5, 7, 9])
+        self.assert_ids_match_content(table, result)
+
+    def test_non_consecutive_ids_fall_back_to_row_inserts(self):
+        table = FakeKnowledgeTable(interleave=True)
+        result = self.run_import(table)
+        self.assertEqual(len(table.rows), 5)
+        self.assert_ids_match_content(table, result)
+        self.assertEqual(table.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
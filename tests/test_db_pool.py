@@ -0,0 +1,183 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from pymysql.constants import SERVER_STATUS
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("VECTOR_INDEX_STORE_DIR", tempfile.mkdtemp())
+from sources.db_pool import ConnectionPool, PoolTimeoutError
+from sources.knowledge import knowledge
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.server_status = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.broken = False
+        self._result = None
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.broken:
+            raise ConnectionError("gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status = 0
+
+    def close(self):
+        self.open = False
+
+    def cursor(self):
+        return "cursor"
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+        def factory():
+            connection = FakeConnection()
+            self.created.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(factory, max_size=2, checkout_timeout=0.2, health_check_interval=0.05)
+
+    def test_reuses_connections_and_delegates(self):
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.cursor(), "cursor")
+        connection = self.pool.acquire()
+        connection.close()
+        connection.close()
+        self.assertEqual(len(self.created), 1)
+        stats = self.pool.stats()
+        self.assertEqual((stats["checkouts"], stats["in_use"], stats["idle"]), (2, 0, 1))
+
+    def test_checkout_timeout_and_waiters(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.acquire()
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+
+        threading.Timer(0.05, first.close).start()
+        start = time.monotonic()
+        self.pool.acquire(timeout=1)
+        self.assertGreater(time.monotonic() - start, 0.03)
+        self.assertEqual(len(self.created), 2)
+        second.close()
+
+    def test_leaked_connection_is_returned_when_collected(self):
+        self.pool.acquire()
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+    def test_open_transaction_is_rolled_back(self):
+        connection = self.pool.acquire()
+        connection._raw.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        connection.close()
+        self.assertEqual(self.created[0].rollbacks, 1)
+
+    def test_broken_and_expired_connections_are_replaced(self):
+        self.pool.acquire().close()
+        self.created[0].broken = True
+        time.sleep(0.06)
+        self.pool.acquire().close()
+        self.assertEqual(len(self.created), 2)
+        self.assertFalse(self.created[0].open)
+
+        self.pool.max_lifetime = 0
+        self.pool.acquire().close()
+        self.assertEqual(len(self.created), 3)
+        self.assertEqual(self.pool.stats()["size"], 1)
+
+    def test_closed_connection_is_discarded_on_release(self):
+        connection = self.pool.acquire()
+        connection._raw.open = False
+        connection.close()
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(" ".join(sql.split()))
+        self.connection.next_id += 1
+        self.lastrowid = self.connection.next_id
+
+    def fetchall(self):
+        return []
+
+
+class FakeSQLConnection(FakeConnection):
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+        self.next_id = 0
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestHelpersReuseCheckedOutConnection(unittest.TestCase):
+    """接口持有连接时调用的辅助函数不能再借第二个连接，否则连接池耗尽时互相等待"""
+
+    def setUp(self):
+        self.pool = ConnectionPool(FakeSQLConnection, max_size=1, checkout_timeout=0.1)
+        for target, name, value in ((knowledge, "db_pool", self.pool),
+                                    (knowledge, "schedule_knowledge_embedding", mock.Mock()),
+                                    (knowledge, "invalidate_knowledge_counts", mock.Mock()),
+                                    (knowledge, "invalidate_tool_counts", mock.Mock()),
+                                    (knowledge.vector_index_manager, "set_tool", mock.Mock())):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_create_records_on_callers_connection(self):
+        tool_data = {"user_id": 1, "title": "t", "description": "d", "url": "u", "push": 1, "timeout": 10, "params": ""}
+        knowledge_data = {"user_id": 1, "question": "q", "description": "d", "answer": "a", "public": 1,
+                          "embedding_id": 0, "model_name": "m", "params": ""}
+        with knowledge.db_connection() as connection:
+            with connection.cursor() as cursor:
+                self.assertEqual(knowledge.get_tools_by_ids(cursor, [3, 3, 2]), [])
+            result = knowledge.create_tool_and_knowledge_records(tool_data, knowledge_data, connection=connection)
+            self.assertTrue(result["success"], result["message"])
+            # 传入的连接由调用方归还
+            self.assertEqual(self.pool.stats()["in_use"], 1)
+        connection = self.pool.acquire()
+        self.assertEqual(connection.commits, 1)
+        self.assertIn("WHERE id IN (%s, %s) AND status = 1", connection.statements[0])
+        connection.close()
+        self.assertEqual((self.pool.stats()["in_use"], self.pool.stats()["timeouts"]), (0, 0))
+
+        # 不传连接时仍然自己借出并归还
+        self.assertTrue(knowledge.create_tool_and_knowledge_records(tool_data, knowledge_data)["success"])
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
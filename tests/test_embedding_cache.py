@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.embedding_cache import EmbeddingCache, normalize_text
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def compute(text):
+            self.calls.append(text)
+            return [float(len(text)), 1.0]
+
+        self.compute = compute
+        self.redis = DictRedis()
+        self.cache = EmbeddingCache(compute, "test-model", max_size=2, redis_factory=lambda: self.redis, ttl=60)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  hello \n  world "), "hello world")
+        self.assertEqual(self.cache.cache_key("hello  world"), self.cache.cache_key(" hello world"))
+
+    def test_local_hit(self):
+        first = self.cache.get("question")
+        second = self.cache.get("question ")
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, ["question"])
+        self.assertFalse(first.flags.writeable)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_redis_tier_and_ttl(self):
+        self.cache.get("question")
+        self.assertEqual(list(self.redis.ttls.values()), [60])
+        other = EmbeddingCache(self.compute, "test-model", redis_factory=lambda: self.redis)
+        np.testing.assert_allclose(other.get("question"), [8.0, 1.0])
+        self.assertEqual(self.calls, ["question"])
+        self.assertEqual(other.stats()["redis_hits"], 1)
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(self.compute, "test-model", max_size=2)
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+        self.assertEqual(cache.stats()["size"], 2)
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(self.calls, ["a", "b", "c", "b"])
+
+    def test_redis_failure_falls_back_to_compute(self):
+        def broken():
+            raise ConnectionError("redis down")
+
+        cache = EmbeddingCache(self.compute, "test-model", redis_factory=broken)
+        np.testing.assert_allclose(cache.get("abc"), [3.0, 1.0])
+        self.assertEqual(cache.stats()["redis_errors"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.embedding_codec import encode_embedding, decode_embedding, is_binary_embedding
+
+
+class TestEmbeddingCodec(unittest.TestCase):
+    def setUp(self):
+        self.embedding = [0.125, -0.5, 1e-3, 3.0]
+
+    def test_round_trip(self):
+        raw = encode_embedding(self.embedding, "text-embedding-3-small")
+        self.assertTrue(is_binary_embedding(raw))
+        vector, model = decode_embedding(raw)
+        self.assertEqual(model, "text-embedding-3-small")
+        self.assertEqual(vector.dtype, np.float32)
+        np.testing.assert_allclose(vector, np.asarray(self.embedding, dtype=np.float32))
+
+    def test_binary_is_compact(self):
+        raw = encode_embedding(np.random.rand(1536), "text-embedding-3-small")
+        self.assertLess(len(raw), 1536 * 4 + 64)
+        self.assertGreater(len(str(np.random.rand(1536).tolist())), len(raw))
+
+    def test_decode_is_zero_copy(self):
+        raw = encode_embedding(self.embedding, "m")
+        vector, _ = decode_embedding(raw)
+        self.assertFalse(vector.flags.writeable)
+
+    def test_legacy_text_format(self):
+        for raw in (str(self.embedding), str(self.embedding).encode("utf-8")):
+            self.assertFalse(is_binary_embedding(raw))
+            vector, model = decode_embedding(raw)
+            self.assertIsNone(model)
+            np.testing.assert_allclose(vector, np.asarray(self.embedding, dtype=np.float32))
+
+    def test_unknown_version(self):
+        raw = bytearray(encode_embedding(self.embedding, "m"))
+        raw[4] = 99
+        with self.assertRaises(ValueError):
+            decode_embedding(bytes(raw))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("VECTOR_INDEX_STORE_DIR", tempfile.mkdtemp())
+from sources.knowledge.knowledge import load_knowledge_embeddings, knowledge_embedding_key
+from sources.knowledge.embedding_codec import encode_embedding
+
+
+class FakePipeline:
+    def __init__(self, data):
+        self.data = data
+        self.commands = []
+
+    def mget(self, keys):
+        self.commands.append(list(keys))
+
+    def execute(self):
+        return [[self.data.get(key) for key in keys] for keys in self.commands]
+
+
+class FakeRedis:
+    def __init__(self, data):
+        self.data = data
+        self.pipelines = []
+
+    def pipeline(self, transaction=True):
+        pipe = FakePipeline(self.data)
+        self.pipelines.append(pipe)
+        return pipe
+
+
+class TestLoadKnowledgeEmbeddings(unittest.TestCase):
+    def test_chunked_mget_keeps_ids_aligned(self):
+        data = {knowledge_embedding_key(knowledge_id): encode_embedding([float(knowledge_id), 1.0], "m")
+                for knowledge_id in (1, 2, 4, 6, 7)}
+        # 迁移前的文本格式
+        data[knowledge_embedding_key(5)] = b"[5.0, 1.0]"
+        redis_conn = FakeRedis(data)
+
+        embeddings = load_knowledge_embeddings(redis_conn, [1, 2, 3, 4, 5, 6, 7], chunk_size=3)
+
+        self.assertEqual([len(keys) for keys in redis_conn.pipelines[0].commands], [3, 3, 1])
+        self.assertEqual(sorted(embeddings), [1, 2, 4, 5, 6, 7])
+        for knowledge_id, vector in embeddings.items():
+            np.testing.assert_allclose(vector, [float(knowledge_id), 1.0])
+
+    def test_empty_ids(self):
+        redis_conn = FakeRedis({})
+        self.assertEqual(load_knowledge_embeddings(redis_conn, []), {})
+        self.assertEqual(redis_conn.pipelines, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
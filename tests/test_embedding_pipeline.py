@@ -0,0 +1,167 @@
+import unittest
+import os
+import sys
+import threading
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge import embedding_pipeline
+from sources.knowledge.embedding_pipeline import EmbeddingPipeline, EmbeddingLockBusy, EMBEDDING_FAILED, \
+    EMBEDDING_PENDING, EMBEDDING_READY, EMBED_KNOWLEDGE_TASK, knowledge_content_hash
+
+
+class FakeLock:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def acquire(self):
+        if self.name in self.client.locks:
+            return False
+        self.client.locks.add(self.name)
+        return True
+
+    def release(self):
+        self.client.locks.discard(self.name)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.locks = set()
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return FakeLock(self, name)
+
+
+class FakeClock:
+    def __init__(self, on_sleep=None):
+        self.now = 0.0
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep:
+            self.on_sleep()
+
+
+class TestEmbeddingPipeline(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.rows = {1: {"id": 1, "user_id": 7, "question": "q", "answer": "a", "status": 1,
+                         "embedding_status": EMBEDDING_PENDING, "embedding_hash": ""}}
+        self.stored = {}
+        self.sent = []
+        self.ready = []
+        self.embedded = []
+        self.pipeline = EmbeddingPipeline(
+            lambda: self.redis,
+            self.rows.get,
+            self.embed,
+            self.stored.__setitem__,
+            self.mark,
+            on_ready=self.ready.append,
+            send_task=lambda name, args, task_id, retry: self.sent.append((name, args, task_id)),
+        )
+
+    def embed(self, text):
+        self.embedded.append(text)
+        return [1.0, 0.0]
+
+    def mark(self, knowledge_id, status, content_hash):
+        self.rows[knowledge_id].update(embedding_status=status, embedding_hash=content_hash)
+
+    def test_schedule_deduplicates_same_content(self):
+        self.assertTrue(self.pipeline.schedule(1, "q", "a"))
+        self.assertFalse(self.pipeline.schedule(1, "q", "a"))
+        self.assertTrue(self.pipeline.schedule(1, "q", "a2"))
+        content_hash = knowledge_content_hash("q", "a")
+        self.assertEqual(self.sent[0], (EMBED_KNOWLEDGE_TASK, [1, content_hash], f"embed-knowledge-1-{content_hash}"))
+        self.assertEqual(len(self.sent), 2)
+
+        self.pipeline.process(1, content_hash)
+        self.assertTrue(self.pipeline.schedule(1, "q", "a"))
+
+    def test_process_is_idempotent(self):
+        content_hash = knowledge_content_hash("q", "a")
+        self.assertEqual(self.pipeline.process(1, content_hash), "ready")
+        self.assertEqual(self.rows[1]["embedding_status"], EMBEDDING_READY)
+        self.assertEqual(self.stored, {1: [1.0, 0.0]})
+        self.assertEqual([row["id"] for row in self.ready], [1])
+        self.assertEqual(self.pipeline.process(1, content_hash), "skipped")
+        self.assertEqual(self.embedded, ["qa"])
+
+    def test_stale_and_deleted_tasks_are_skipped(self):
+        self.assertEqual(self.pipeline.process(1, knowledge_content_hash("old", "a")), "stale")
+        self.rows[1]["status"] = 2
+        self.assertEqual(self.pipeline.process(1, knowledge_content_hash("q", "a")), "skipped")
+        self.assertEqual(self.embedded, [])
+
+    def test_lock_busy_and_failure(self):
+        self.redis.locks.add("embedding_lock:1")
+        with self.assertRaises(EmbeddingLockBusy):
+            self.pipeline.process(1, knowledge_content_hash("q", "a"))
+        self.redis.locks.clear()
+
+        self.pipeline.fail(1, knowledge_content_hash("q", "a"), RuntimeError("rate limited"))
+        self.assertEqual(self.rows[1]["embedding_status"], EMBEDDING_FAILED)
+        self.assertEqual(self.pipeline.stats()["failed"], 1)
+
+    def test_lock_wait_does_not_use_failure_retries(self):
+        self.pipeline.max_retries = 0
+        self.redis.locks.add("embedding_lock:1")
+
+        def release_after_third_wait():
+            # 持锁的任务在第三次等待后结束
+            if len(clock.sleeps) == 3:
+                self.redis.locks.clear()
+
+        clock = FakeClock(on_sleep=release_after_third_wait)
+        with mock.patch.object(embedding_pipeline, "time", clock):
+            self.pipeline.run_inline(1, knowledge_content_hash("q", "a"))
+        self.assertEqual(clock.sleeps, [1, 1, 2])
+        self.assertEqual(self.rows[1]["embedding_status"], EMBEDDING_READY)
+
+    def test_lock_wait_timeout_marks_failed_and_clears_key(self):
+        self.pipeline.lock_wait_timeout = 30
+        self.assertTrue(self.pipeline.schedule(1, "q", "a"))
+        self.redis.locks.add("embedding_lock:1")
+        clock = FakeClock()
+        with mock.patch.object(embedding_pipeline, "time", clock):
+            self.pipeline.run_inline(1, knowledge_content_hash("q", "a"))
+        self.assertEqual(clock.sleeps, [1, 1, 2, 4, 8, 10, 10])
+        self.assertEqual(self.rows[1]["embedding_status"], EMBEDDING_FAILED)
+        # 幂等键已清除，可以重新投递
+        self.assertTrue(self.pipeline.schedule(1, "q", "a"))
+
+    def test_falls_back_to_inline_when_broker_unavailable(self):
+        done = threading.Event()
+
+        def broken_send(*args, **kwargs):
+            raise ConnectionError("broker down")
+
+        self.pipeline.send_task = broken_send
+        self.pipeline.on_ready = lambda row: done.set()
+        self.assertTrue(self.pipeline.schedule(1, "q", "a"))
+        self.assertTrue(done.wait(5))
+        self.assertEqual(self.rows[1]["embedding_status"], EMBEDDING_READY)
+        self.assertEqual(self.pipeline.stats()["inline"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
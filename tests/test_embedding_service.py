@@ -0,0 +1,114 @@
+import unittest
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from openai import OpenAI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.embedding_service import EmbeddingBatcher
+
+
+def fake_vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 997), 1.0]
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    """模拟 OpenAI /v1/embeddings 接口，记录每次请求的 input"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.server.requests.append(inputs)
+        if any(text == "bad input" for text in inputs):
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": {"message": "bad input", "type": "invalid_request_error"}}).encode())
+            return
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_vector(text)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        payload = json.dumps({"object": "list", "data": data, "model": body["model"],
+                              "usage": {"prompt_tokens": 1, "total_tokens": 1}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbeddingHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.client = OpenAI(api_key="test", base_url=f"http://127.0.0.1:{cls.server.server_port}/v1", max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+
+    def test_single_request(self):
+        batcher = EmbeddingBatcher(self.client, "fake-model", window_ms=1)
+        np.testing.assert_allclose(batcher.embed("hello"), fake_vector("hello"))
+        self.assertEqual(self.server.requests, [["hello"]])
+
+    def test_concurrent_requests_are_coalesced_and_deduplicated(self):
+        batcher = EmbeddingBatcher(self.client, "fake-model", window_ms=100)
+        texts = [f"question {i % 10}" for i in range(40)]
+        with ThreadPoolExecutor(max_workers=40) as pool:
+            results = list(pool.map(batcher.embed, texts))
+        for text, result in zip(texts, results):
+            np.testing.assert_allclose(result, fake_vector(text))
+        sent = [text for request in self.server.requests for text in request]
+        self.assertEqual(sorted(sent), sorted(set(texts)))
+        self.assertLess(len(self.server.requests), 10)
+        self.assertEqual(batcher.stats()["deduplicated"], 30)
+
+    def test_max_batch_size(self):
+        batcher = EmbeddingBatcher(self.client, "fake-model", window_ms=50, max_batch_size=4)
+        results = batcher.embed_many([f"t{i}" for i in range(10)])
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(len(request) <= 4 for request in self.server.requests))
+
+    def test_async_embed(self):
+        batcher = EmbeddingBatcher(self.client, "fake-model", window_ms=20)
+
+        async def run():
+            return await asyncio.gather(*(batcher.aembed(f"async {i}") for i in range(5)))
+
+        results = asyncio.run(run())
+        np.testing.assert_allclose(results[3], fake_vector("async 3"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_bad_input_does_not_fail_the_batch(self):
+        batcher = EmbeddingBatcher(self.client, "fake-model", window_ms=50)
+        good = batcher.submit("good input")
+        bad = batcher.submit("bad input")
+        np.testing.assert_allclose(good.result(5), fake_vector("good input"))
+        with self.assertRaises(Exception):
+            bad.result(5)
+        with self.assertRaises(ValueError):
+            batcher.embed("  ")
+
+
+if __name__ == '__main__':
+    unittest.main()
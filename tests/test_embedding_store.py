@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.embedding_store import MmapEmbeddingStore, MmapRowStore
+
+
+class TestMmapEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MmapEmbeddingStore(os.path.join(self.directory.name, "embeddings.f32"), min_compact_bytes=0)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_write_and_read(self):
+        vectors = np.arange(12, dtype=np.float32).reshape(4, 3)
+        self.store.write("1", [10, 11, 12, 13], vectors)
+        self.store.write("2", [20], np.ones((1, 3), dtype=np.float32))
+        ids, stored = self.store.read("1")
+        self.assertIsInstance(stored, np.memmap)
+        np.testing.assert_array_equal(ids, [10, 11, 12, 13])
+        np.testing.assert_array_equal(stored, vectors)
+        self.assertIsNone(self.store.read("3"))
+
+    def test_rewrite_and_compaction(self):
+        self.store.write("1", [1, 2], np.ones((2, 3), dtype=np.float32))
+        self.store.write("2", [3], np.full((1, 3), 2, dtype=np.float32))
+        self.store.write("1", [1], np.full((1, 3), 3, dtype=np.float32))
+        # 第一个段成为垃圾后达到一半，触发压缩
+        self.assertEqual(self.store.stats()["file_bytes"], 2 * 3 * 4)
+        np.testing.assert_array_equal(self.store.read("2")[1], [[2, 2, 2]])
+        np.testing.assert_array_equal(self.store.read("1")[1], [[3, 3, 3]])
+        self.store.discard("2")
+        self.assertNotIn("2", self.store)
+        self.assertEqual(self.store.stats()["live_bytes"], 3 * 4)
+
+
+class TestMmapRowStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MmapRowStore(os.path.join(self.directory.name, "exact.f32"), min_compact_rows=4)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_put_get_delete_and_compact(self):
+        self.store.put_many([1, 2], np.array([[1, 1], [2, 2]], dtype=np.float32))
+        np.testing.assert_array_equal(self.store.get_many([2, 1]), [[2, 2], [1, 1]])
+        self.store.put_many([1], np.array([[3, 3]], dtype=np.float32))
+        np.testing.assert_array_equal(self.store.get_many([1]), [[3, 3]])
+        self.assertIsNone(self.store.get_many([1, 9]))
+        self.store.delete([2])
+        self.store.put_many([4], np.array([[4, 4]], dtype=np.float32))
+        # 4 行中只有 2 行有效，触发压缩
+        self.assertEqual(self.store.stats()["file_rows"], 2)
+        np.testing.assert_array_equal(self.store.get_many([4, 1]), [[4, 4], [3, 3]])
+        with self.assertRaises(ValueError):
+            self.store.put_many([5], np.ones((1, 3), dtype=np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("VECTOR_INDEX_STORE_DIR", tempfile.mkdtemp())
+from sources.knowledge import embedding_tasks
+from sources.knowledge.embedding_pipeline import EmbeddingLockBusy
+
+
+class FakeTime:
+    """每次读取前进 step 秒；eager 执行时重试不会真正等待"""
+
+    def __init__(self, step):
+        self.now = 1000.0
+        self.step = step
+
+    def time(self):
+        self.now += self.step
+        return self.now
+
+
+class TestEmbedKnowledgeTask(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = embedding_tasks.embedding_pipeline
+        self.calls = 0
+        for name, value in (("max_retries", 1), ("lock_wait_timeout", 60), ("fail", mock.Mock())):
+            patcher = mock.patch.object(self.pipeline, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_task(self, process, step=1.0):
+        with mock.patch.object(self.pipeline, "process", process), \
+                mock.patch.object(embedding_tasks, "time", FakeTime(step)):
+            return embedding_tasks.embed_knowledge.apply(args=[1, "hash"])
+
+    def test_lock_busy_retries_do_not_use_max_retries(self):
+        def process(knowledge_id, content_hash):
+            self.calls += 1
+            if self.calls <= 8:
+                raise EmbeddingLockBusy("busy")
+            return "ready"
+
+        result = self.run_task(process)
+        self.assertEqual((result.status, result.result, self.calls), ("SUCCESS", "ready", 9))
+        self.pipeline.fail.assert_not_called()
+
+    def test_lock_wait_timeout_marks_failed(self):
+        def process(knowledge_id, content_hash):
+            self.calls += 1
+            raise EmbeddingLockBusy("busy")
+
+        result = self.run_task(process, step=20.0)
+        self.assertEqual(result.status, "FAILURE")
+        self.assertEqual(self.calls, 3)
+        self.pipeline.fail.assert_called_once()
+
+    def test_errors_retry_max_retries_times(self):
+        def process(knowledge_id, content_hash):
+            self.calls += 1
+            raise RuntimeError("rate limited")
+
+        result = self.run_task(process)
+        self.assertEqual((result.status, self.calls), ("FAILURE", 2))
+        self.pipeline.fail.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
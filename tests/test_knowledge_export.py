@@ -0,0 +1,93 @@
+import unittest
+import base64
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.knowledge_export import iter_knowledge_export
+
+
+class FakeCursor:
+    def __init__(self, rows, fail_after=None):
+        self.rows = rows
+        self.fail_after = fail_after
+        self.position = 0
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise RuntimeError("lost connection")
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.closed = False
+
+    def cursor(self, cursor_class=None):
+        return self._cursor
+
+    def close(self):
+        self.closed = True
+
+
+def make_row(knowledge_id):
+    return {"id": knowledge_id, "user_id": 7, "question": "问题", "description": "", "answer": "a", "public": 2,
+            "model_name": "", "tool_id": 3, "params": "", "create_time": datetime(2025, 1, 1), "update_time": None}
+
+
+class TestKnowledgeExport(unittest.TestCase):
+    def setUp(self):
+        self.cursor = FakeCursor([make_row(i) for i in range(1, 6)])
+        self.connection = FakeConnection(self.cursor)
+        self.loaded = []
+
+    def load_embeddings(self, ids):
+        self.loaded.append(ids)
+        return {knowledge_id: np.full(2, knowledge_id, dtype=np.float32) for knowledge_id in ids if knowledge_id != 2}
+
+    def export(self, **kwargs):
+        chunks = list(iter_knowledge_export(lambda: self.connection, self.load_embeddings, chunk_size=2, **kwargs))
+        return [json.loads(line) for chunk in chunks for line in chunk.decode("utf-8").splitlines()]
+
+    def test_streams_chunks_with_embeddings(self):
+        records = self.export(user_id="7", embeddings="base64")
+        self.assertEqual([record["id"] for record in records], [1, 2, 3, 4, 5])
+        self.assertEqual(self.loaded, [[1, 2], [3, 4], [5]])
+        self.assertEqual(np.frombuffer(base64.b64decode(records[0]["embedding"]), dtype="<f4").tolist(), [1.0, 1.0])
+        self.assertIsNone(records[1]["embedding"])
+        self.assertEqual(records[0]["create_time"], "2025-01-01T00:00:00")
+        self.assertEqual(self.cursor.queries[1][1], [1, "7"])
+        self.assertTrue(self.connection.closed)
+
+    def test_no_embeddings_and_public_scope(self):
+        records = self.export(public=2)
+        self.assertNotIn("embedding", records[0])
+        self.assertEqual(self.loaded, [])
+        self.assertIn("public = %s", self.cursor.queries[1][0])
+
+    def test_error_line_and_early_close(self):
+        self.cursor.fail_after = 2
+        records = self.export(embeddings="float")
+        self.assertEqual(records[-1], {"error": "lost connection", "exported": 2})
+        self.assertEqual(records[0]["embedding"], [1.0, 1.0])
+
+        connection = FakeConnection(FakeCursor([make_row(i) for i in range(1, 6)]))
+        stream = iter_knowledge_export(lambda: connection, self.load_embeddings, chunk_size=2)
+        next(stream)
+        stream.close()
+        self.assertTrue(connection.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.lexical_index import BM25Index, tokenize
+from sources.knowledge.vector_index import UserVectorIndex
+
+
+class FakeItem:
+    def __init__(self, id, question="", description=None, answer=""):
+        self.id = id
+        self.question = question
+        self.description = description
+        self.answer = answer
+
+
+class TestTokenize(unittest.TestCase):
+    def test_identifiers_and_cjk(self):
+        self.assertEqual(tokenize("getUserInfo"), ["getuserinfo", "get", "user", "info"])
+        self.assertEqual(tokenize("SKU-1024 v2.1"), ["sku-1024", "sku", "1024", "v2.1", "v", "2", "1"])
+        self.assertEqual(tokenize("查询订单"), ["查", "询", "订", "单", "查询", "询订", "订单"])
+        self.assertEqual(tokenize(""), [])
+
+
+class TestBM25Index(unittest.TestCase):
+    def test_rank_and_remove(self):
+        index = BM25Index()
+        index.add(1, "查询订单状态")
+        index.add(2, "退款 refund_order")
+        index.add(3, "查询天气")
+        self.assertEqual([doc for doc, _ in index.search("订单", 3)], [1])
+        self.assertEqual(index.search("refund", 3)[0][0], 2)
+
+        index.add(1, "修改密码")
+        self.assertEqual(index.search("订单", 3), [])
+        self.assertTrue(index.remove(3))
+        self.assertFalse(index.remove(3))
+        self.assertEqual(len(index), 2)
+        self.assertNotIn("天气", index.postings)
+
+
+class TestHybridSearch(unittest.TestCase):
+    def setUp(self):
+        self.index = UserVectorIndex()
+        self.index.upsert(FakeItem(1, "查询天气", answer="weather"), [1.0, 0.0, 0.0])
+        self.index.upsert(FakeItem(2, "调用 getOrderStatus 查询订单", answer="order"), [0.8, 0.6, 0.0])
+        self.index.upsert(FakeItem(3, "修改密码", answer="password"), [0.0, 0.0, 1.0])
+
+    def test_keyword_match_promoted(self):
+        query = [1.0, 0.05, 0.0]
+        self.assertEqual(self.index.search_items(query, top_k=1)[0][0].id, 1)
+        results = self.index.hybrid_search_items(query, "getOrderStatus", top_k=2)
+        self.assertEqual([item.id for item, _ in results], [2, 1])
+        self.assertAlmostEqual(results[0][1], float(self.index.search_items(query, top_k=2)[1][1]), places=5)
+
+    def test_threshold_relaxed_only_for_keyword_hits(self):
+        query = [1.0, 0.0, 0.0]
+        self.assertEqual([item.id for item, _ in self.index.hybrid_search_items(query, "订单", 3, 0.85)], [2, 1])
+        self.assertEqual([item.id for item, _ in self.index.hybrid_search_items(query, "天气", 3, 0.85)], [1])
+        self.assertEqual(self.index.hybrid_search_items(query, "密码", 3, 0.85), [self.index.search_items(query, 1)[0]])
+
+    def test_incremental_updates(self):
+        self.index.update_item(FakeItem(3, "重置 getOrderStatus 令牌"))
+        self.assertIn(3, [doc for doc, _ in self.index.lexical.search("getOrderStatus", 3)])
+        self.index.remove(2)
+        self.assertEqual([doc for doc, _ in self.index.lexical.search("getOrderStatus", 3)], [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
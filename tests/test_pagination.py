@@ -0,0 +1,96 @@
+import unittest
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.pagination import CountCache, InvalidCursorError, decode_cursor, encode_cursor, keyset_params, \
+    next_page_cursor
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def hset(self, key, field, value):
+        self.commands.append(lambda: self.client.hashes.setdefault(key, {}).__setitem__(field, str(value)))
+
+    def expire(self, key, ttl):
+        self.commands.append(lambda: self.client.ttls.__setitem__(key, ttl))
+
+    def execute(self):
+        for command in self.commands:
+            command()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.down = False
+
+    def hget(self, key, field):
+        if self.down:
+            raise ConnectionError("redis down")
+        return self.hashes.get(key, {}).get(field)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        update_time = datetime(2025, 3, 1, 12, 30, 5)
+        cursor = encode_cursor(update_time, 42)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (update_time, 42))
+        self.assertEqual(keyset_params((update_time, 42)), [update_time, update_time, 42])
+
+    def test_invalid_cursor(self):
+        for cursor in ["", "not-a-cursor", encode_cursor("yesterday", 1)]:
+            with self.assertRaises(InvalidCursorError):
+                decode_cursor(cursor)
+
+    def test_next_page_cursor_only_for_full_pages(self):
+        rows = [{"id": 3, "update_time": datetime(2025, 1, 2)}, {"id": 2, "update_time": datetime(2025, 1, 1)}]
+        self.assertEqual(decode_cursor(next_page_cursor(rows, 2, "update_time")), (datetime(2025, 1, 1), 2))
+        self.assertIsNone(next_page_cursor(rows, 3, "update_time"))
+        self.assertIsNone(next_page_cursor([], 3, "update_time"))
+
+
+class TestCountCache(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = CountCache(lambda: self.redis, ttl=60)
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        return 7
+
+    def test_hit_after_miss_and_invalidate(self):
+        self.assertEqual(self.cache.get_or_compute("knowledge:user:1", "q", self.compute), 7)
+        self.assertEqual(self.cache.get_or_compute("knowledge:user:1", "q", self.compute), 7)
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(self.redis.ttls["count_cache:knowledge:user:1"], 60)
+
+        self.cache.get_or_compute("knowledge:user:1", "other", self.compute)
+        self.assertEqual(self.computed, 2)
+        self.cache.invalidate("knowledge:user:1")
+        self.cache.get_or_compute("knowledge:user:1", "q", self.compute)
+        self.assertEqual(self.computed, 3)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_redis_failure_falls_back_to_compute(self):
+        self.redis.down = True
+        self.assertEqual(self.cache.get_or_compute("tools:public", "", self.compute), 7)
+        self.assertEqual(self.cache.stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
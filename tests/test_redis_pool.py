@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources import redis_pool
+from sources.redis_pool import get_redis_client, get_async_redis_client, incr_with_expiry, set_many, delete_many, \
+    redis_pool_stats
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.client.round_trips += 1
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def ttl(self, key):
+        return self.ttls.get(key, -1)
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+        return True
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        if ex is not None:
+            self.ttls[key] = ex
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.values.pop(key, None) is not None)
+
+
+class TestRedisPool(unittest.TestCase):
+    def test_clients_are_shared(self):
+        client = get_redis_client()
+        self.assertIs(client, get_redis_client())
+        self.assertIsNot(client, get_redis_client(decode_responses=False))
+        self.assertIs(client.connection_pool, redis_pool._pools[True])
+        stats = redis_pool_stats()["text"]
+        self.assertEqual((stats["created"], stats["in_use"]), (0, 0))
+
+    def test_async_client_per_event_loop(self):
+        async def fetch():
+            return get_async_redis_client(), get_async_redis_client()
+
+        first, again = asyncio.run(fetch())
+        self.assertIs(first, again)
+        second, _ = asyncio.run(fetch())
+        self.assertIsNot(first, second)
+
+    def test_incr_with_expiry(self):
+        client = FakeRedis()
+        self.assertEqual(incr_with_expiry(client, "usage", 60), 1)
+        self.assertEqual(client.ttls["usage"], 60)
+        client.ttls["usage"] = 30
+        self.assertEqual(incr_with_expiry(client, "usage", 60), 2)
+        self.assertEqual(client.ttls["usage"], 30)
+        self.assertEqual(client.round_trips, 2)
+
+    def test_set_and_delete_many(self):
+        client = FakeRedis()
+        set_many(client, {f"k{i}": i for i in range(5)}, ex=10)
+        self.assertEqual(client.round_trips, 1)
+        self.assertEqual(client.ttls["k4"], 10)
+        self.assertEqual(delete_many(client, [f"k{i}" for i in range(6)], chunk_size=2), 5)
+        self.assertEqual(client.round_trips, 2)
+        self.assertEqual(delete_many(client, []), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
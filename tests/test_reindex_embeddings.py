@@ -0,0 +1,231 @@
+import unittest
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("VECTOR_INDEX_STORE_DIR", tempfile.mkdtemp())
+from sources.knowledge import reindex_embeddings
+from sources.knowledge.reindex_embeddings import EmbeddingReindexer, RequestRateLimiter, stale_reason, \
+    load_checkpoint, save_checkpoint
+from sources.knowledge.embedding_codec import encode_embedding
+from sources.knowledge.embedding_pipeline import EMBEDDING_PENDING, EMBEDDING_READY, embedding_lock_key, \
+    knowledge_content_hash
+from sources.knowledge.knowledge import knowledge_embedding_key
+
+
+def knowledge_row(knowledge_id, question="q", answer="a", status=EMBEDDING_READY, embedding_hash=None):
+    return {"id": knowledge_id, "user_id": 1, "question": question, "answer": answer, "embedding_status": status,
+            "embedding_hash": knowledge_content_hash(question, answer) if embedding_hash is None else embedding_hash}
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        def run(keys, args, client):
+            return client.compare_and_delete(keys[0], args[0])
+        return run
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def compare_and_delete(self, key, token):
+        if self.values.get(key) != token:
+            return 0
+        del self.values[key]
+        return 1
+
+    def publish(self, channel, message):
+        self.published.append(message)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.db.on_select()
+        self.results = [{"id": knowledge_id, "content_hash": knowledge_content_hash(*self.db.contents[knowledge_id])}
+                        for knowledge_id in params if knowledge_id in self.db.contents]
+
+    def executemany(self, sql, params):
+        self.db.updates.extend(knowledge_id for _, _, knowledge_id, _ in params)
+
+    def fetchall(self):
+        return self.results
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.contents = {row["id"]: (row["question"], row["answer"]) for row in rows}
+        self.updates = []
+        self.on_select = lambda: None
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestReindexHelpers(unittest.TestCase):
+    def test_stale_reason(self):
+        row = knowledge_row(1)
+        current = encode_embedding([1.0, 0.0], "m")
+        self.assertIsNone(stale_reason(row, current, model="m"))
+        self.assertEqual(stale_reason(row, None, model="m"), "missing")
+        self.assertEqual(stale_reason(row, b"not json", model="m"), "missing")
+        self.assertEqual(stale_reason(row, encode_embedding([1.0, 0.0], "old"), model="m"), "model")
+        self.assertEqual(stale_reason(knowledge_row(1, status=EMBEDDING_PENDING), current, model="m"), "status")
+        self.assertEqual(stale_reason(knowledge_row(1, embedding_hash="0" * 40), current, model="m"), "content")
+        # 迁移前的文本格式和没有 embedding_hash 的记录不算过期
+        self.assertIsNone(stale_reason(row, b"[1.0, 0.0]", model="m"))
+        self.assertIsNone(stale_reason(knowledge_row(1, embedding_hash=""), current, model="m"))
+
+    def test_rate_limiter_spaces_requests(self):
+        clock = FakeClock()
+        with mock.patch.object(reindex_embeddings, "time", clock):
+            limiter = RequestRateLimiter(requests_per_minute=120)
+            for _ in range(3):
+                limiter.acquire()
+            self.assertEqual(clock.sleeps, [0.5, 0.5])
+            # 空闲一段时间后不会攒下额度
+            clock.now += 10
+            limiter.acquire()
+            limiter.acquire()
+            self.assertEqual(clock.sleeps, [0.5, 0.5, 0.5])
+
+            unlimited = RequestRateLimiter(requests_per_minute=0)
+            unlimited.acquire()
+            unlimited.acquire()
+            self.assertEqual(len(clock.sleeps), 3)
+
+    def test_checkpoint_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "nested", "checkpoint.json")
+            self.assertEqual(load_checkpoint(path), {})
+            checkpoint = {"last_id": 5000, "end_id": 12000, "model": "m", "stats": {"failed": 0}}
+            save_checkpoint(path, checkpoint)
+            self.assertEqual(load_checkpoint(path), checkpoint)
+            self.assertEqual(os.listdir(os.path.dirname(path)), ["checkpoint.json"])
+
+
+class TestEmbeddingReindexer(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(reindex_embeddings, "get_redis_connection", lambda decode_responses=True: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reindexer = EmbeddingReindexer(batch_size=2, concurrency=1, requests_per_minute=0)
+        self.addCleanup(self.reindexer.executor.shutdown)
+
+    def test_reindex_batch_partial_failure(self):
+        rows = [knowledge_row(i, question=f"q{i}") for i in range(1, 7)]
+        db = FakeDatabase(rows)
+        # 第 4 条正在被后台任务计算；第 5 条的锁在本批持有期间过期并被后台任务重新获取
+        self.redis.values[embedding_lock_key(4)] = "task"
+
+        def take_over_lock():
+            if embedding_lock_key(5) in self.redis.values:
+                self.redis.values[embedding_lock_key(5)] = "task"
+        db.on_select = take_over_lock
+
+        def embed(texts):
+            if texts == ["q1a", "q2a"]:
+                raise RuntimeError("rate limited")
+            return [[1.0, 0.0] for _ in texts]
+
+        self.reindexer._embed = embed
+        with mock.patch.object(reindex_embeddings, "db_connection", db.connection):
+            for batch in (rows[0:2], rows[2:4], rows[4:6]):
+                self.reindexer.reindex_batch(batch)
+
+        stats = self.reindexer.stats
+        self.assertEqual((stats["failed"], stats["skipped"], stats["reindexed"]), (2, 1, 3))
+        self.assertEqual(db.updates, [3, 5, 6])
+        for knowledge_id in (1, 2, 4):
+            self.assertNotIn(knowledge_embedding_key(knowledge_id), self.redis.values)
+        for knowledge_id in (3, 5, 6):
+            self.assertIn(knowledge_embedding_key(knowledge_id), self.redis.values)
+        # 只释放本批仍持有的锁，不删除后台任务的锁
+        locks = {key: value for key, value in self.redis.values.items() if key.startswith("embedding_lock:")}
+        self.assertEqual(locks, {embedding_lock_key(4): "task", embedding_lock_key(5): "task"})
+        self.assertEqual(len(self.redis.published), 3)
+
+    def test_checkpoint_stops_at_first_failed_range(self):
+        def scan_range(start_id, end_id):
+            return [knowledge_row(end_id)]
+
+        def reindex_batch(rows):
+            self.reindexer._add("failed" if rows[0]["id"] in (20, 40) else "reindexed", len(rows))
+
+        self.reindexer.scan_range = scan_range
+        self.reindexer.reindex_batch = reindex_batch
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.json")
+            with mock.patch.object(reindex_embeddings, "pretty_print"):
+                result = self.reindexer.run(0, 50, 10, path)
+            checkpoint = load_checkpoint(path)
+        self.assertEqual((result["reindexed"], result["failed"]), (3, 2))
+        self.assertEqual(checkpoint["last_id"], 10)
+        self.assertEqual(checkpoint["end_id"], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.user.snowflake import SnowflakeGenerator, MAX_SEQUENCE, snowflake_timestamp
+
+
+class FakeClock:
+    def __init__(self, now, step=0.0):
+        self.now = now
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class TestSnowflakeGenerator(unittest.TestCase):
+    def test_layout_and_order(self):
+        clock = FakeClock(1735689600.0)
+        generator = SnowflakeGenerator(node_id=5, clock=clock)
+        first, second = generator.next_id(), generator.next_id()
+        self.assertEqual(second, first + 1)
+        self.assertEqual((first >> 12) & 1023, 5)
+        self.assertEqual(snowflake_timestamp(first), 1735689600.0)
+        self.assertLess(first, 1 << 63)
+
+        clock.now += 0.001
+        self.assertGreater(generator.next_id(), second)
+
+    def test_sequence_exhaustion_and_clock_rollback_wait(self):
+        clock = FakeClock(1735689600.0)
+        generator = SnowflakeGenerator(node_id=1, clock=clock)
+        generator.last_ms, generator.sequence = generator._now_ms(), MAX_SEQUENCE
+        clock.step = 0.0004
+        next_id = generator.next_id()
+        self.assertEqual(next_id & MAX_SEQUENCE, 0)
+        self.assertEqual(next_id >> 22, generator.last_ms)
+
+        last = generator.last_ms
+        clock.now -= 0.003
+        self.assertGreaterEqual(generator.next_id() >> 22, last)
+
+    def test_unique_across_threads(self):
+        generator = SnowflakeGenerator(node_id=3)
+        ids = []
+
+        def worker():
+            ids.extend(generator.next_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 8000)
+
+
+if __name__ == '__main__':
+    unittest.main()
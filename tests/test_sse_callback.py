@@ -0,0 +1,99 @@
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.callback.sse_callback import SSECallbackHandler
+from sources.callback.stream_metrics import StreamMetrics
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+class TestSSECoalescing(unittest.TestCase):
+    def test_time_window_and_end_ordering(self):
+        async def scenario():
+            queue = asyncio.Queue()
+            handler = SSECallbackHandler(queue, coalesce_ms=20, coalesce_bytes=1024)
+            for token in ("你", "好", "，世"):
+                await handler.on_llm_new_token(token)
+            self.assertTrue(queue.empty())
+            await asyncio.sleep(0.05)
+            first = drain(queue)
+
+            await handler.on_llm_new_token("界")
+            await handler.put_event({'type': 'end', 'content': ''})
+            return first, drain(queue)
+
+        first, rest = asyncio.run(scenario())
+        self.assertEqual(first, [{'type': 'token', 'content': '你好，世'}])
+        self.assertEqual(rest, [{'type': 'token', 'content': '界'}, {'type': 'end', 'content': ''}])
+
+    def test_byte_threshold_and_sentence_boundary(self):
+        async def scenario():
+            queue = asyncio.Queue()
+            handler = SSECallbackHandler(queue, coalesce_ms=1000, coalesce_bytes=6, flush_on_sentence=True)
+            for token in ("ab", "cd", "efg", "Hi", ". ", "x"):
+                await handler.on_llm_new_token(token)
+            events = drain(queue)
+            await handler.flush()
+            return events + drain(queue)
+
+        events = asyncio.run(scenario())
+        self.assertEqual([event['content'] for event in events], ["abcdefg", "Hi. ", "x"])
+
+    def test_disabled_passes_tokens_through(self):
+        async def scenario():
+            queue = asyncio.Queue()
+            handler = SSECallbackHandler(queue, coalesce_ms=0)
+            for token in ("a", "", "b"):
+                await handler.on_llm_new_token(token)
+            return drain(queue)
+
+        self.assertEqual([event['content'] for event in asyncio.run(scenario())], ["a", "b"])
+
+    def test_bounded_queue_backpressure(self):
+        async def scenario():
+            queue = asyncio.Queue(maxsize=1)
+            handler = SSECallbackHandler(queue, coalesce_ms=0)
+            await handler.on_llm_new_token("a")
+            blocked = asyncio.create_task(handler.on_llm_new_token("b"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            first = queue.get_nowait()
+            await blocked
+            events = [first, queue.get_nowait()]
+            self.assertEqual(handler.backpressure_waits, 1)
+
+            # 定时器触发时队列已满则推迟，不丢 token
+            handler = SSECallbackHandler(queue, coalesce_ms=10, coalesce_bytes=1024)
+            queue.put_nowait({'type': 'token', 'content': 'x'})
+            await handler.on_llm_new_token("c")
+            await asyncio.sleep(0.03)
+            self.assertEqual(queue.qsize(), 1)
+            queue.get_nowait()
+            await asyncio.sleep(0.03)
+            return events, queue.get_nowait()
+
+        events, deferred = asyncio.run(scenario())
+        self.assertEqual([event['content'] for event in events], ["a", "b"])
+        self.assertEqual(deferred['content'], "c")
+
+    def test_stream_metrics(self):
+        metrics = StreamMetrics()
+        metrics.stream_started()
+        metrics.agent_cancelled(1.5)
+        metrics.record("backpressure_waits", 3)
+        metrics.stream_finished()
+        stats = metrics.stats()
+        self.assertEqual((stats["started"], stats["active"], stats["cancelled_agents"]), (1, 0, 1))
+        self.assertEqual((stats["cancelled_agent_seconds"], stats["backpressure_waits"]), (1.5, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.text_search import TextSearch
+
+
+class FakeCursor:
+    def __init__(self, has_index):
+        self.has_index = has_index
+        self.queries = 0
+
+    def execute(self, sql, params=None):
+        self.queries += 1
+
+    def fetchone(self):
+        return {"1": 1} if self.has_index else None
+
+
+class TestTextSearch(unittest.TestCase):
+    def setUp(self):
+        self.search = TextSearch("tools", ("title", "description"))
+
+    def test_conditions(self):
+        sql, params = self.search.condition("订单", "like")
+        self.assertEqual(sql, "AND (title LIKE %s OR description LIKE %s)")
+        self.assertEqual(params, ["%订单%", "%订单%"])
+        sql, params = self.search.condition(' say "hi" ', "fulltext")
+        self.assertEqual(sql, "AND MATCH(title, description) AGAINST (%s IN BOOLEAN MODE)")
+        self.assertEqual(params, ['"say  hi "'])
+        order_by, params = self.search.relevance_order(" 订单 ")
+        self.assertTrue(order_by.startswith("MATCH(title, description) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC"))
+        self.assertEqual(params, ["订单"])
+
+    def test_resolve_mode(self):
+        cursor = FakeCursor(has_index=True)
+        self.assertEqual(self.search.resolve_mode(cursor, "订单", "fulltext"), "fulltext")
+        self.assertEqual(self.search.resolve_mode(cursor, "单", "fulltext"), "like")
+        self.assertEqual(self.search.resolve_mode(cursor, "订单", "like"), "like")
+        self.search.resolve_mode(cursor, "支付", "fulltext")
+        self.assertEqual(cursor.queries, 1)
+
+    def test_missing_index_falls_back_to_like(self):
+        cursor = FakeCursor(has_index=False)
+        self.assertEqual(self.search.resolve_mode(cursor, "订单", "fulltext"), "like")
+        self.search.resolve_mode(cursor, "订单", "fulltext")
+        self.assertEqual(cursor.queries, 1)
+        self.search.checked_at -= self.search.missing_index_ttl
+        cursor.has_index = True
+        self.assertEqual(self.search.resolve_mode(cursor, "订单", "fulltext"), "fulltext")
+
+
+if __name__ == '__main__':
+    unittest.main()
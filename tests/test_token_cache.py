@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.user.token_cache import VerifiedTokenCache, CertificatePrefetcher, cache_max_age
+
+
+class FakeResponse:
+    def __init__(self, cache_control):
+        self.headers = {"Cache-Control": cache_control} if cache_control else {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, cache_control):
+        self.cache_control = cache_control
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        return FakeResponse(self.cache_control)
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = VerifiedTokenCache(max_size=2, margin=60, clock=lambda: self.now)
+
+    def test_hit_until_expiry_margin(self):
+        self.cache.put("token-a", {"uid": 42, "exp": 1200})
+        claims = self.cache.get("token-a")
+        self.assertEqual(claims["uid"], 42)
+        claims["uid"] = "changed"
+        self.assertEqual(self.cache.get("token-a")["uid"], 42)
+
+        self.now = 1140
+        self.assertIsNone(self.cache.get("token-a"))
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_skips_expiring_tokens_and_evicts_lru(self):
+        self.cache.put("expiring", {"uid": 1, "exp": 1050})
+        self.cache.put("no-exp", {"uid": 1})
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+        for token in ("a", "b"):
+            self.cache.put(token, {"uid": token, "exp": 5000})
+        self.cache.get("a")
+        self.cache.put("c", {"uid": "c", "exp": 5000})
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+
+
+class TestCertificatePrefetcher(unittest.TestCase):
+    def test_refresh_bypasses_cache_before_max_age(self):
+        session = FakeSession("public, max-age=21600, must-revalidate, no-transform")
+        prefetcher = CertificatePrefetcher(session, "https://certs", refresh_margin=300)
+        self.assertEqual(prefetcher.refresh(), 21300)
+        self.assertEqual(session.requests, [("https://certs", {"Cache-Control": "no-cache"})])
+
+        prefetcher.session = FakeSession(None)
+        self.assertEqual(prefetcher.refresh(), prefetcher.min_interval)
+        self.assertIsNone(cache_max_age("no-store"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+import unittest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.knowledge.vector_index import UserVectorIndex, VectorIndexManager, top_k_indices
+from sources.knowledge.embedding_store import MmapEmbeddingStore, MmapRowStore
+
+
+class FakeItem:
+    def __init__(self, id, question=""):
+        self.id = id
+        self.question = question
+
+    def dict(self):
+        return {"id": self.id, "question": self.question}
+
+
+class TestUserVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = UserVectorIndex(capacity=2)
+        self.index.upsert(FakeItem(1, "a"), [1.0, 0.0, 0.0])
+        self.index.upsert(FakeItem(2, "b"), [0.0, 1.0, 0.0])
+        self.index.upsert(FakeItem(3, "c"), [0.7, 0.7, 0.0])
+
+    def test_grows_and_searches(self):
+        self.assertEqual(len(self.index), 3)
+        results = self.index.search([1.0, 0.1, 0.0], top_k=2)
+        self.assertEqual([r["id"] for r in results], [1, 3])
+        self.assertAlmostEqual(results[0]["similarity"], 1.0 / np.sqrt(1.01), places=5)
+
+    def test_threshold(self):
+        results = self.index.search([0.0, 0.0, 1.0], top_k=3, threshold=0.5)
+        self.assertEqual(results, [])
+
+    def test_remove_keeps_matrix_contiguous(self):
+        self.assertTrue(self.index.remove(1))
+        self.assertFalse(self.index.remove(1))
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(sorted(self.index.positions), [2, 3])
+        results = self.index.search([1.0, 0.0, 0.0], top_k=3)
+        self.assertEqual(results[0]["id"], 3)
+
+    def test_upsert_replaces_vector_and_metadata(self):
+        self.index.upsert(FakeItem(2, "b2"), [0.0, 0.0, 1.0])
+        self.assertEqual(len(self.index), 3)
+        results = self.index.search([0.0, 0.0, 1.0], top_k=1)
+        self.assertEqual(results[0]["question"], "b2")
+        self.assertTrue(self.index.update_item(FakeItem(2, "b3")))
+        self.assertFalse(self.index.update_item(FakeItem(9, "x")))
+
+    def test_rows_are_normalized(self):
+        self.index.upsert(FakeItem(4), [3.0, 4.0, 0.0])
+        norms = np.linalg.norm(self.index.matrix[:len(self.index)], axis=1)
+        np.testing.assert_allclose(norms, np.ones(4), rtol=1e-6)
+        self.assertEqual(self.index.search([0.0, 0.0, 0.0]), [])
+
+    def test_top_k_indices_matches_full_sort(self):
+        scores = np.random.default_rng(0).standard_normal(1000).astype(np.float32)
+        np.testing.assert_array_equal(top_k_indices(scores, 10), np.argsort(-scores)[:10])
+        self.assertEqual(len(top_k_indices(scores[:3], 10)), 3)
+        self.assertEqual(len(top_k_indices(scores, 0)), 0)
+
+    def test_search_items_and_tool_cache(self):
+        item, similarity = self.index.search_items([1.0, 0.0, 0.0], top_k=1)[0]
+        self.assertEqual(item.question, "a")
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+        self.assertEqual(self.index.get_tool(7), (False, None))
+        self.index.set_tools({7: "tool", 8: None})
+        self.assertEqual(self.index.get_tool(7), (True, "tool"))
+        self.assertEqual(self.index.get_tool(8), (True, None))
+        self.index.drop_tool(7)
+        self.assertEqual(self.index.get_tool(7), (False, None))
+
+    def test_dimension_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.index.upsert(FakeItem(4), [1.0, 0.0])
+
+
+class TestQuantizedVectorIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((500, 64)).astype(np.float32)
+        self.items = [FakeItem(i) for i in range(500)]
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MmapRowStore(os.path.join(self.directory.name, "exact.f32"))
+        self.exact = UserVectorIndex()
+        self.exact.extend(self.items, self.vectors)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_memory_footprint(self):
+        int8 = UserVectorIndex(precision="int8")
+        int8.extend(self.items, self.vectors)
+        float16 = UserVectorIndex(precision="float16")
+        float16.extend(self.items, self.vectors)
+        self.assertLess(int8.matrix.nbytes * 3.9, self.exact.matrix.nbytes)
+        self.assertEqual(float16.matrix.nbytes * 2, self.exact.matrix.nbytes)
+
+    def test_rerank_matches_exact_search(self):
+        index = UserVectorIndex(precision="int8", exact_store=self.store)
+        index.extend(self.items, self.vectors)
+        for query in self.vectors[:20] + 0.5:
+            expected = self.exact.search(query, top_k=5)
+            actual = index.search(query, top_k=5)
+            self.assertEqual([r["id"] for r in actual], [r["id"] for r in expected])
+            self.assertAlmostEqual(actual[0]["similarity"], expected[0]["similarity"], places=5)
+
+    def test_coarse_scores_without_exact_store(self):
+        index = UserVectorIndex(precision="float16")
+        index.extend(self.items, self.vectors)
+        result = index.search(self.vectors[3], top_k=1)[0]
+        self.assertEqual(result["id"], 3)
+        self.assertAlmostEqual(result["similarity"], 1.0, places=2)
+
+    def test_remove_and_release_exact_rows(self):
+        index = UserVectorIndex(precision="int8", exact_store=self.store)
+        index.extend(self.items[:10], self.vectors[:10])
+        index.remove(3)
+        self.assertIsNone(self.store.get_many([3]))
+        self.assertEqual(index.search(self.vectors[9], top_k=1)[0]["id"], 9)
+        ids, vectors = index.export()
+        np.testing.assert_allclose(vectors, self.exact.matrix[ids], rtol=1e-6)
+        index.release()
+        self.assertEqual(len(self.store), 0)
+
+
+class TestVectorIndexManager(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+
+        def loader(user_id):
+            self.loads.append(user_id)
+            index = UserVectorIndex()
+            index.upsert(FakeItem(1), [1.0, 0.0])
+            return index
+
+        self.manager = VectorIndexManager(loader)
+
+    def test_lazy_load_once(self):
+        self.manager.get(42)
+        self.manager.get("42")
+        self.assertEqual(self.loads, ["42"])
+
+    def test_incremental_updates_only_when_loaded(self):
+        self.manager.upsert("7", FakeItem(5), [0.0, 1.0])
+        self.assertFalse(self.manager.is_loaded("7"))
+        index = self.manager.get("7")
+        self.manager.upsert("7", FakeItem(5), [0.0, 1.0])
+        self.manager.remove("7", 1)
+        self.assertEqual(list(index.positions), [5])
+        self.manager.invalidate("7")
+        self.assertFalse(self.manager.is_loaded("7"))
+
+    def test_changes_during_load_are_replayed(self):
+        changes = [lambda: self.manager.upsert("8", FakeItem(6), [0.0, 1.0]),
+                   lambda: self.manager.remove("8", 1)]
+
+        def loader(user_id):
+            self.loads.append(user_id)
+            index = UserVectorIndex()
+            index.upsert(FakeItem(1), [1.0, 0.0])
+            # 模拟加载期间到达的写接口
+            if changes:
+                changes.pop(0)()
+                changes.pop(0)()
+            return index
+
+        self.manager.loader = loader
+        index = self.manager.get("8")
+        self.assertEqual(list(index.positions), [6])
+        self.assertEqual(self.manager.load_locks, {})
+        self.assertEqual(self.manager.pending, {})
+
+    def test_invalidate_during_load_reloads(self):
+        invalidated = []
+
+        def loader(user_id):
+            self.loads.append(user_id)
+            if not invalidated:
+                invalidated.append(True)
+                self.manager.invalidate(user_id)
+            index = UserVectorIndex()
+            index.upsert(FakeItem(len(self.loads)), [1.0, 0.0])
+            return index
+
+        self.manager.loader = loader
+        self.assertEqual(list(self.manager.get("9").positions), [2])
+        self.assertEqual(self.loads, ["9", "9"])
+
+
+class TestVectorIndexResidency(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MmapEmbeddingStore(os.path.join(self.directory.name, "embeddings.f32"))
+        self.loads = []
+        self.page_ins = []
+
+        def loader(user_id):
+            self.loads.append(user_id)
+            index = UserVectorIndex()
+            index.extend([FakeItem(int(user_id) * 10 + i) for i in range(4)], np.eye(4, 8))
+            return index
+
+        def pager(user_id, ids, vectors):
+            self.page_ins.append(user_id)
+            index = UserVectorIndex()
+            index.extend([FakeItem(int(knowledge_id)) for knowledge_id in ids], vectors, normalized=True)
+            return index
+
+        one_user = loader("0").nbytes
+        self.loads.clear()
+        self.manager = VectorIndexManager(loader, store=self.store, memory_budget=one_user * 2, pager=pager)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_lru_eviction_and_page_in(self):
+        self.manager.get("1")
+        self.manager.get("2")
+        self.manager.get("1")
+        self.manager.get("3")
+        self.assertEqual(list(self.manager.indices), ["1", "3"])
+        self.assertIn("2", self.store)
+
+        index = self.manager.get("2")
+        self.assertEqual(self.loads, ["1", "2", "3"])
+        self.assertEqual(self.page_ins, ["2"])
+        self.assertEqual(index.search(np.eye(8)[1], top_k=1)[0]["id"], 21)
+        stats = self.manager.stats()
+        self.assertEqual((stats["evictions"], stats["page_ins"], stats["users"]), (2, 1, 2))
+        self.assertLessEqual(stats["bytes"], self.manager.memory_budget)
+
+    def test_cold_update_discards_segment(self):
+        self.manager.get("1")
+        self.manager.get("2")
+        self.manager.get("3")
+        self.assertIn("1", self.store)
+        self.manager.remove("1", 10)
+        self.assertNotIn("1", self.store)
+        self.manager.get("1")
+        self.assertEqual(self.page_ins, [])
+        self.assertEqual(self.loads, ["1", "2", "3", "1"])
+
+
+if __name__ == '__main__':
+    unittest.main()